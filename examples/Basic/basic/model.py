@@ -1,5 +1,3 @@
-import random
-
 from mesa import Model, Agent
 from mesa.space import SingleGrid
 from mesa.time import RandomActivation
@@ -14,7 +12,8 @@ class Walker(Agent):
 
 
 class ShapesModel(Model):
-    def __init__(self, N, width=20, height=10):
+    def __init__(self, N, width=20, height=10, seed=None):
+        super().__init__(seed)
         self.running = True
         self.N = N    # num of agents
         self.headings = ((1, 0), (0, 1), (-1, 0), (0, -1))  # tuples are fast
@@ -27,10 +26,10 @@ class ShapesModel(Model):
         while True:
             if unique_id == self.N:
                 break
-            x = random.randrange(self.grid.width)
-            y = random.randrange(self.grid.height)
+            x = self.random.randrange(self.grid.width)
+            y = self.random.randrange(self.grid.height)
             pos = (x, y)
-            heading = random.choice(self.headings)
+            heading = self.random.choice(self.headings)
             # heading = (1, 0)
             if self.grid.is_cell_empty(pos):
                 print("Creating agent {2} at ({0}, {1})"
@@ -1,5 +1,3 @@
-import random
-
 from mesa.visualization.modules import CanvasGrid
 from mesa.visualization.ModularVisualization import ModularServer
 
@@ -36,11 +34,10 @@ def launch_basic():
     grid = CanvasGrid(agent_draw, width, height,
                       width * pixel_ratio, height * pixel_ratio)
     server = ModularServer(ShapesModel, [grid], "Basic Example",
-                           num_agents, width, height)
+                           num_agents, width, height, seed=3)
     server.max_steps = 0
     server.port = 8888
     server.launch()
 
 if __name__ == "__main__":
-    random.seed(3)
     launch_basic()
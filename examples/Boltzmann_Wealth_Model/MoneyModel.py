@@ -1,7 +1,8 @@
-import random
+import numpy as np
 
 from mesa import Agent, Model
-from mesa.time import RandomActivation
+from mesa.agentset import AgentSet
+from mesa.time import BaseScheduler, RandomActivation
 from mesa.space import MultiGrid
 from mesa.datacollection import DataCollector
 
@@ -17,7 +18,8 @@ def compute_gini(model):
 class MoneyModel(Model):
     """A model with some number of agents."""
 
-    def __init__(self, N, width, height):
+    def __init__(self, N, width, height, seed=None):
+        super().__init__(seed)
         self.num_agents = N
         self.running = True
         self.grid = MultiGrid(height, width, True)
@@ -31,8 +33,8 @@ class MoneyModel(Model):
             a = MoneyAgent(i, self)
             self.schedule.add(a)
             # Add the agent to a random grid cell
-            x = random.randrange(self.grid.width)
-            y = random.randrange(self.grid.height)
+            x = self.random.randrange(self.grid.width)
+            y = self.random.randrange(self.grid.height)
             self.grid.place_agent(a, (x, y))
 
     def step(self):
@@ -54,13 +56,13 @@ class MoneyAgent(Agent):
         possible_steps = self.model.grid.get_neighborhood(
             self.pos, moore=True, include_center=False
         )
-        new_position = random.choice(possible_steps)
+        new_position = self.random.choice(possible_steps)
         self.model.grid.move_agent(self, new_position)
 
     def give_money(self):
         cellmates = self.model.grid.get_cell_list_contents([self.pos])
         if len(cellmates) > 1:
-            other = random.choice(cellmates)
+            other = self.random.choice(cellmates)
             other.wealth += 1
             self.wealth -= 1
 
@@ -68,3 +70,66 @@ class MoneyAgent(Agent):
         self.move()
         if self.wealth > 0:
             self.give_money()
+
+
+class MoneyAgents(AgentSet):
+    """ All the agents of a MoneyModel, stepped at once with array operations.
+
+    Every agent moves to a random neighboring cell, then every agent with
+    wealth gives one unit to a random agent in its new cell (possibly itself).
+    Unlike MoneyAgent, all the agents move and give simultaneously.
+    """
+    columns = {"wealth": int, "pos": (int, 2)}
+
+    def step(self):
+        n = len(self)
+        rng = self.model.rng
+        width, height = self.model.width, self.model.height
+        pos = self["pos"]
+        # Move to one of the 8 surrounding cells, on a torus.
+        moves = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)
+                          if dx or dy])
+        pos += moves[rng.integers(len(moves), size=n)]
+        pos %= (width, height)
+        # Pick a random cellmate for each agent, by grouping rows by cell.
+        cells = pos[:, 0] * height + pos[:, 1]
+        order = np.argsort(cells, kind="stable")
+        counts = np.bincount(cells, minlength=width * height)
+        starts = np.cumsum(counts) - counts
+        givers = np.flatnonzero((self["wealth"] > 0) & (counts[cells] > 1))
+        picks = (starts[cells[givers]] +
+                 (rng.random(len(givers)) *
+                  counts[cells[givers]]).astype(int))
+        self["wealth"][givers] -= 1
+        np.add.at(self["wealth"], order[picks], 1)
+
+
+class VectorizedMoneyModel(Model):
+    """ A MoneyModel whose agents are stored in columns, in a MoneyAgents set.
+    """
+
+    def __init__(self, N, width, height, seed=None):
+        super().__init__(seed)
+        self.num_agents = N
+        self.width = width
+        self.height = height
+        self.running = True
+        self.schedule = BaseScheduler(self)
+        self.datacollector = DataCollector(
+            model_reporters={"Gini": compute_gini},
+            agent_reporters={"Wealth": "wealth"}
+        )
+        self.agents = MoneyAgents(self, capacity=N)
+        for i in range(self.num_agents):
+            x = self.random.randrange(width)
+            y = self.random.randrange(height)
+            self.agents.add(i, wealth=1, pos=(x, y))
+        self.schedule.add(self.agents)
+
+    def step(self):
+        self.datacollector.collect(self)
+        self.schedule.step()
+
+    def run_model(self, n):
+        for i in range(n):
+            self.step()
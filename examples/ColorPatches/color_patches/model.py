@@ -3,7 +3,6 @@ The model - a 2D lattice where agents live and have an opinion
 """
 
 
-import random
 from collections import Counter
 
 from mesa import Model, Agent
@@ -56,7 +55,7 @@ class ColorCell(Agent):
             if neighbor[1] == polled_opinions[0][1]:
                 tied_opinions.append(neighbor)
 
-        self._next_state = random.choice(tied_opinions)[0]
+        self._next_state = self.random.choice(tied_opinions)[0]
 
     def advance(self):
         '''
@@ -70,11 +69,12 @@ class ColorPatchModel(Model):
     represents a 2D lattice where agents live
     '''
 
-    def __init__(self, width, height):
+    def __init__(self, width, height, seed=None):
         '''
         Create a 2D lattice with strict borders where agents live
         The agents next state is first determined before updating the grid
         '''
+        super().__init__(seed)
 
         self._grid = Grid(width, height, torus=False)
         self._schedule = SimultaneousActivation(self)
@@ -86,7 +86,7 @@ class ColorPatchModel(Model):
         # replaced content with _ to appease linter
         for (_, row, col) in self._grid.coord_iter():
             cell = ColorCell((row, col), self,
-                             ColorCell.OPINIONS[random.randrange(0, 16)])
+                             ColorCell.OPINIONS[self.random.randrange(0, 16)])
             self._grid.place_agent(cell, (row, col))
             self._schedule.add(cell)
 
@@ -130,3 +130,10 @@ class ColorPatchModel(Model):
         AttributeError: 'NoneType' object has no attribute 'steps'
         """
         return self._schedule
+
+    @schedule.setter
+    def schedule(self, schedule):
+        """
+        Model.__init__ sets Model.schedule.
+        """
+        self._schedule = schedule
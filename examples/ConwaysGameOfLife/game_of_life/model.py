@@ -1,5 +1,3 @@
-from random import random
-
 from mesa import Model
 from mesa.time import SimultaneousActivation
 from mesa.space import Grid
@@ -13,10 +11,11 @@ class GameOfLife(Model):
     Game of Life.
     '''
 
-    def __init__(self, height, width):
+    def __init__(self, height, width, seed=None):
         '''
         Create a new playing area of (height, width) cells.
         '''
+        super().__init__(seed)
 
         # Set up the grid and schedule.
 
@@ -33,7 +32,7 @@ class GameOfLife(Model):
         # ALIVE and some to DEAD.
         for (contents, x, y) in self.grid.coord_iter():
             cell = Cell((x, y), self)
-            if random() < .1:
+            if self.random.random() < .1:
                 cell.state = cell.ALIVE
             self.grid.place_agent(cell, (x, y))
             self.schedule.add(cell)
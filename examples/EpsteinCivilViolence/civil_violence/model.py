@@ -1,5 +1,3 @@
-import random
-
 from mesa import Model
 from mesa.time import RandomActivation
 from mesa.space import Grid
@@ -38,8 +36,8 @@ class CivilViolenceModel(Model):
     def __init__(self, height, width, citizen_density, cop_density,
                  citizen_vision, cop_vision, legitimacy,
                  max_jail_term, active_threshold=.1, arrest_prob_constant=2.3,
-                 movement=True, max_iters=1000):
-        super().__init__()
+                 movement=True, max_iters=1000, seed=None):
+        super().__init__(seed)
         self.height = height
         self.width = width
         self.citizen_density = citizen_density
@@ -76,17 +74,17 @@ class CivilViolenceModel(Model):
             raise ValueError(
                 'Cop density + citizen density must be less than 1')
         for (contents, x, y) in self.grid.coord_iter():
-            if random.random() < self.cop_density:
+            if self.random.random() < self.cop_density:
                 cop = Cop(unique_id, self, (x, y), vision=self.cop_vision)
                 unique_id += 1
                 self.grid[y][x] = cop
                 self.schedule.add(cop)
-            elif random.random() < (
+            elif self.random.random() < (
                     self.cop_density + self.citizen_density):
                 citizen = Citizen(unique_id, self, (x, y),
-                                  hardship=random.random(),
+                                  hardship=self.random.random(),
                                   regime_legitimacy=self.legitimacy,
-                                  risk_aversion=random.random(),
+                                  risk_aversion=self.random.random(),
                                   threshold=self.active_threshold,
                                   vision=self.citizen_vision)
                 unique_id += 1
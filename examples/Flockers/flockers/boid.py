@@ -36,7 +36,7 @@ class Boid(Agent):
         if heading is not None:
             self.heading = heading
         else:
-            self.heading = np.random.random(2)
+            self.heading = self.model.rng.random(2)
             self.heading /= np.linalg.norm(self.heading)
         self.vision = vision
         self.separation = separation
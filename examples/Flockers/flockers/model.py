@@ -6,7 +6,6 @@ Uses numpy arrays to represent vectors.
 '''
 
 
-import random
 import numpy as np
 
 from mesa import Model
@@ -21,7 +20,8 @@ class BoidModel(Model):
     Flocker model class. Handles agent creation, placement and scheduling.
     '''
 
-    def __init__(self, N, width, height, speed, vision, separation):
+    def __init__(self, N, width, height, speed, vision, separation,
+                 seed=None):
         '''
         Create a new Flockers model.
 
@@ -32,7 +32,9 @@ class BoidModel(Model):
             vision: How far around should each Boid look for its neighbors
             separtion: What's the minimum distance each Boid will attempt to
                        keep from any other
+            seed: Seed for the model's random number generators.
         '''
+        super().__init__(seed)
         self.N = N
         self.vision = vision
         self.speed = speed
@@ -48,10 +50,10 @@ class BoidModel(Model):
         Create N agents, with random positions and starting headings.
         '''
         for i in range(self.N):
-            x = random.random() * self.space.x_max
-            y = random.random() * self.space.y_max
+            x = self.random.random() * self.space.x_max
+            y = self.random.random() * self.space.y_max
             pos = (x, y)
-            heading = np.random.random(2) * 2 - np.array((1, 1))
+            heading = self.rng.random(2) * 2 - np.array((1, 1))
             heading /= np.linalg.norm(heading)
             boid = Boid(i, self, pos, self.speed, heading, self.vision,
                         self.separation)
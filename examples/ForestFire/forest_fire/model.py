@@ -1,5 +1,3 @@
-import random
-
 from mesa import Model
 from mesa.datacollection import DataCollector
 from mesa.space import Grid
@@ -12,14 +10,16 @@ class ForestFire(Model):
     """
     Simple Forest Fire model.
     """
-    def __init__(self, height, width, density):
+    def __init__(self, height, width, density, seed=None):
         """
         Create a new forest fire model.
 
         Args:
             height, width: The size of the grid to model
             density: What fraction of grid cells have a tree in them.
+            seed: Seed for the model's random number generators.
         """
+        super().__init__(seed)
         # Initialize model parameters
         self.height = height
         self.width = width
@@ -36,13 +36,13 @@ class ForestFire(Model):
 
         # Place a tree in each cell with Prob = density
         for (contents, x, y) in self.grid.coord_iter():
-            if random.random() < self.density:
+            if self.random.random() < self.density:
                 # Create a tree
                 new_tree = TreeCell((x, y), self)
                 # Set all trees in the first column on fire.
                 if x == 0:
                     new_tree.condition = "On Fire"
-                self.grid._place_agent((x, y), new_tree)
+                self.grid.place_agent(new_tree, (x, y))
                 self.schedule.add(new_tree)
         self.running = True
 
@@ -53,8 +53,9 @@ class ForestFire(Model):
         self.schedule.step()
         self.datacollector.collect(self)
 
-        # Halt if no more fire
-        if self.count_type(self, "On Fire") == 0:
+        # Halt if no more fire; the data collector has just counted the
+        # trees on fire, so there is no need to count them again.
+        if self.datacollector.model_vars["On Fire"][-1] == 0:
             self.running = False
 
     @staticmethod
@@ -7,8 +7,6 @@ with all of their neighbors simultaneously; an agent can either be Cooperating
 or Defecting.
 '''
 
-import random
-
 from mesa import Agent, Model
 from mesa.datacollection import DataCollector
 from mesa.time import BaseScheduler, RandomActivation, SimultaneousActivation
@@ -32,7 +30,7 @@ class PD_Agent(Agent):
         if starting_move:
             self.move = starting_move
         else:
-            self.move = random.choice(["C", "D"])
+            self.move = self.random.choice(["C", "D"])
         self.next_move = None
 
     def step(self):
@@ -77,7 +75,8 @@ class PD_Model(Model):
               ("D", "C"): 1.6,
               ("D", "D"): 0}
 
-    def __init__(self, height, width, schedule_type, payoffs=None):
+    def __init__(self, height, width, schedule_type, payoffs=None,
+                 seed=None):
         '''
         Create a new Spatial Prisoners' Dilemma Model.
 
@@ -86,7 +85,9 @@ class PD_Model(Model):
             schedule_type: Can be "Sequential", "Random", or "Simultaneous".
                            Determines the agent activation regime.
             payoffs: (optional) Dictionary of (move, neighbor_move) payoffs.
+            seed: (optional) Seed for the model's random number generators.
         '''
+        super().__init__(seed)
         self.running = True
         self.grid = SingleGrid(height, width, torus=True)
         self.schedule_type = schedule_type
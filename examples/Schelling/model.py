@@ -1,5 +1,3 @@
-import random
-
 from mesa import Model, Agent
 from mesa.time import RandomActivation
 from mesa.space import SingleGrid
@@ -41,9 +39,11 @@ class SchellingModel(Model):
     Model class for the Schelling segregation model.
     '''
 
-    def __init__(self, height, width, density, minority_pc, homophily):
+    def __init__(self, height, width, density, minority_pc, homophily,
+                 seed=None):
         '''
         '''
+        super().__init__(seed)
 
         self.height = height
         self.width = width
@@ -69,8 +69,8 @@ class SchellingModel(Model):
         for cell in self.grid.coord_iter():
             x = cell[1]
             y = cell[2]
-            if random.random() < self.density:
-                if random.random() < self.minority_pc:
+            if self.random.random() < self.density:
+                if self.random.random() < self.minority_pc:
                     agent_type = 1
                 else:
                     agent_type = 0
@@ -1,6 +1,4 @@
-import random
-
-from mesa import Agent
+from mesa.agent import SlottedAgent
 
 from wolf_sheep.random_walk import RandomWalker
 
@@ -14,8 +12,8 @@ class Sheep(RandomWalker):
 
     energy = None
 
-    def __init__(self, pos, model, moore, energy=None):
-        super().__init__(pos, model, moore=moore)
+    def __init__(self, unique_id, pos, model, moore, energy=None):
+        super().__init__(unique_id, pos, model, moore=moore)
         self.energy = energy
 
     def step(self):
@@ -39,15 +37,17 @@ class Sheep(RandomWalker):
 
             # Death
             if self.energy < 0:
-                self.model.grid._remove_agent(self.pos, self)
+                self.model.grid.remove_agent(self)
                 self.model.schedule.remove(self)
                 living = False
 
-        if living and random.random() < self.model.sheep_reproduce:
+        if living and self.random.random() < self.model.sheep_reproduce:
             # Create a new sheep:
             if self.model.grass:
                 self.energy /= 2
-            lamb = Sheep(self.pos, self.model, self.moore, self.energy)
+            lamb = self.model.create_agent(
+                Sheep, self.model.next_id(), self.pos, self.model,
+                self.moore, self.energy)
             self.model.grid.place_agent(lamb, self.pos)
             self.model.schedule.add(lamb)
 
@@ -59,8 +59,8 @@ class Wolf(RandomWalker):
 
     energy = None
 
-    def __init__(self, pos, model, moore, energy=None):
-        super().__init__(pos, model, moore=moore)
+    def __init__(self, unique_id, pos, model, moore, energy=None):
+        super().__init__(unique_id, pos, model, moore=moore)
         self.energy = energy
 
     def step(self):
@@ -72,32 +72,37 @@ class Wolf(RandomWalker):
         this_cell = self.model.grid.get_cell_list_contents([self.pos])
         sheep = [obj for obj in this_cell if isinstance(obj, Sheep)]
         if len(sheep) > 0:
-            sheep_to_eat = random.choice(sheep)
+            sheep_to_eat = self.random.choice(sheep)
             self.energy += self.model.wolf_gain_from_food
 
             # Kill the sheep
-            self.model.grid._remove_agent(self.pos, sheep_to_eat)
+            self.model.grid.remove_agent(sheep_to_eat)
             self.model.schedule.remove(sheep_to_eat)
 
         # Death or reproduction
         if self.energy < 0:
-            self.model.grid._remove_agent(self.pos, self)
+            self.model.grid.remove_agent(self)
             self.model.schedule.remove(self)
         else:
-            if random.random() < self.model.wolf_reproduce:
+            if self.random.random() < self.model.wolf_reproduce:
                 # Create a new wolf cub
                 self.energy /= 2
-                cub = Wolf(self.pos, self.model, self.moore, self.energy)
+                cub = self.model.create_agent(
+                    Wolf, self.model.next_id(), self.pos, self.model,
+                    self.moore, self.energy)
                 self.model.grid.place_agent(cub, cub.pos)
                 self.model.schedule.add(cub)
 
 
-class GrassPatch(Agent):
+class GrassPatch(SlottedAgent):
     '''
     A patch of grass that grows at a fixed rate and it is eaten by sheep
+
+    There is a patch in every cell, so patches are slotted, to save memory.
     '''
+    _fields = ("fully_grown", "countdown")
 
-    def __init__(self, pos, model, fully_grown, countdown):
+    def __init__(self, unique_id, pos, model, fully_grown, countdown):
         '''
         Creates a new patch of grass
 
@@ -105,7 +110,7 @@ class GrassPatch(Agent):
             grown: (boolean) Whether the patch of grass is fully grown or not
             countdown: Time for the patch of grass to be fully grown again
         '''
-        super().__init__(pos, model)
+        super().__init__(unique_id, model)
         self.fully_grown = fully_grown
         self.countdown = countdown
 
@@ -9,14 +9,12 @@ Replication of the model found in NetLogo:
     Northwestern University, Evanston, IL.
 '''
 
-import random
-
 from mesa import Model
 from mesa.space import MultiGrid
 from mesa.datacollection import DataCollector
+from mesa.time import RandomActivationByBreed
 
 from wolf_sheep.agents import Sheep, Wolf, GrassPatch
-from wolf_sheep.schedule import RandomActivationByBreed
 
 
 class WolfSheepPredation(Model):
@@ -45,7 +43,8 @@ class WolfSheepPredation(Model):
                  initial_sheep=100, initial_wolves=50,
                  sheep_reproduce=0.04, wolf_reproduce=0.05,
                  wolf_gain_from_food=20,
-                 grass=False, grass_regrowth_time=30, sheep_gain_from_food=4):
+                 grass=False, grass_regrowth_time=30, sheep_gain_from_food=4,
+                 seed=None):
         '''
         Create a new Wolf-Sheep model with the given parameters.
 
@@ -59,7 +58,9 @@ class WolfSheepPredation(Model):
             grass_regrowth_time: How long it takes for a grass patch to regrow
                                  once it is eaten
             sheep_gain_from_food: Energy sheep gain from grass, if enabled.
+            seed: Seed for the model's random number generators.
         '''
+        super().__init__(seed)
 
         # Set parameters
         self.height = height
@@ -74,6 +75,9 @@ class WolfSheepPredation(Model):
         self.sheep_gain_from_food = sheep_gain_from_food
 
         self.schedule = RandomActivationByBreed(self)
+        # Sheep and wolves are born and die all the time; reuse dead ones.
+        self.enable_pool(Sheep)
+        self.enable_pool(Wolf)
         self.grid = MultiGrid(self.height, self.width, torus=True)
         self.datacollector = DataCollector(
             {"Wolves": lambda m: m.schedule.get_breed_count(Wolf),
@@ -81,19 +85,19 @@ class WolfSheepPredation(Model):
 
         # Create sheep:
         for i in range(self.initial_sheep):
-            x = random.randrange(self.width)
-            y = random.randrange(self.height)
-            energy = random.randrange(2 * self.sheep_gain_from_food)
-            sheep = Sheep((x, y), self, True, energy)
+            x = self.random.randrange(self.width)
+            y = self.random.randrange(self.height)
+            energy = self.random.randrange(2 * self.sheep_gain_from_food)
+            sheep = Sheep(self.next_id(), (x, y), self, True, energy)
             self.grid.place_agent(sheep, (x, y))
             self.schedule.add(sheep)
 
         # Create wolves
         for i in range(self.initial_wolves):
-            x = random.randrange(self.width)
-            y = random.randrange(self.height)
-            energy = random.randrange(2 * self.wolf_gain_from_food)
-            wolf = Wolf((x, y), self, True, energy)
+            x = self.random.randrange(self.width)
+            y = self.random.randrange(self.height)
+            energy = self.random.randrange(2 * self.wolf_gain_from_food)
+            wolf = Wolf(self.next_id(), (x, y), self, True, energy)
             self.grid.place_agent(wolf, (x, y))
             self.schedule.add(wolf)
 
@@ -101,14 +105,15 @@ class WolfSheepPredation(Model):
         if self.grass:
             for agent, x, y in self.grid.coord_iter():
 
-                fully_grown = random.choice([True, False])
+                fully_grown = self.random.choice([True, False])
 
                 if fully_grown:
                     countdown = self.grass_regrowth_time
                 else:
-                    countdown = random.randrange(self.grass_regrowth_time)
+                    countdown = self.random.randrange(self.grass_regrowth_time)
 
-                patch = GrassPatch((x, y), self, fully_grown, countdown)
+                patch = GrassPatch(self.next_id(), (x, y), self,
+                                   fully_grown, countdown)
                 self.grid.place_agent(patch, (x, y))
                 self.schedule.add(patch)
 
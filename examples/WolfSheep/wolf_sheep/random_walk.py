@@ -2,8 +2,6 @@
 Generalized behavior for random walking, one grid cell at a time.
 '''
 
-import random
-
 from mesa import Agent
 
 
@@ -21,15 +19,16 @@ class RandomWalker(Agent):
     y = None
     moore = True
 
-    def __init__(self, pos, model, moore=True):
+    def __init__(self, unique_id, pos, model, moore=True):
         '''
+        unique_id: The agent's id, e.g. from model.next_id().
         grid: The MultiGrid object in which the agent lives.
         x: The agent's current x coordinate
         y: The agent's current y coordinate
         moore: If True, may move in all 8 directions.
                 Otherwise, only up, down, left, right.
         '''
-        super().__init__(pos, model)
+        super().__init__(unique_id, model)
         self.pos = pos
         self.moore = moore
 
@@ -39,6 +38,6 @@ class RandomWalker(Agent):
         '''
         # Pick the next cell from the adjacent cells.
         next_moves = self.model.grid.get_neighborhood(self.pos, self.moore, True)
-        next_move = random.choice(next_moves)
+        next_move = self.random.choice(next_moves)
         # Now move:
         self.model.grid.move_agent(self, next_move)
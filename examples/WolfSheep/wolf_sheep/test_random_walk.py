@@ -3,8 +3,6 @@ Testing the RandomWalker by having an ABM composed only of random walker
 agents.
 '''
 
-import random
-
 from mesa import Model
 from mesa.space import MultiGrid
 from mesa.time import RandomActivation
@@ -29,14 +27,16 @@ class WalkerWorld(Model):
     height = 10
     width = 10
 
-    def __init__(self, height, width, agent_count):
+    def __init__(self, height, width, agent_count, seed=None):
         '''
         Create a new WalkerWorld.
 
         Args:
             height, width: World size.
             agent_count: How many agents to create.
+            seed: Seed for the model's random number generators.
         '''
+        super().__init__(seed)
         self.height = height
         self.width = width
         self.grid = MultiGrid(self.height, self.width, torus=True)
@@ -45,9 +45,9 @@ class WalkerWorld(Model):
         self.schedule = RandomActivation(self)
         # Create agents
         for i in range(self.agent_count):
-            x = random.randrange(self.width)
-            y = random.randrange(self.height)
-            a = WalkerAgent((x, y), self, True)
+            x = self.random.randrange(self.width)
+            y = self.random.randrange(self.height)
+            a = WalkerAgent(i, (x, y), self, True)
             self.schedule.add(a)
             self.grid.place_agent(a, (x, y))
 
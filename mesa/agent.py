@@ -2,18 +2,217 @@
 """
 The agent class for Mesa framework.
 
-Core Objects: Agent
+Core Objects: Agent, SlottedAgent, AgentPool
+
+An Agent keeps its attributes in a per-instance dictionary, like any Python
+object. A SlottedAgent keeps them in __slots__ instead, which takes much less
+memory per agent, at the price of declaring the fields up front, in a _fields
+tuple of names, or of (name, default) pairs:
+
+    class Sheep(SlottedAgent):
+        _fields = (("energy", 0), ("moore", True), "name")
+
+Each field becomes a slot, initialized to its default (if it has one) when the
+agent is created. Defaults are shared between agents, as for function
+arguments, so mutable values should be set in __init__ instead. On Python 3.6
+and later, fields can also be declared as annotated class attributes
+(energy: float = 0); annotations of typing.ClassVar are left as they are.
+Subclasses of a SlottedAgent are slotted too, unless they declare __slots__
+themselves (e.g. __slots__ = ("__dict__",) to allow other attributes).
+
+Models in which many agents are born and die can recycle them through an
+AgentPool (see Model.enable_pool()), rather than allocate new ones: agents
+removed from the schedule are kept, and reinitialized by their reset() method
+when an agent of their class is next created.
 
 """
+import functools
 
 
-class Agent:
-    """ Base class for a model agent. """
+class BaseAgent:
+    """ Behavior shared by Agent and SlottedAgent. """
+    __slots__ = ()
+
     def __init__(self, unique_id, model):
         """ Create a new agent. """
         self.unique_id = unique_id
         self.model = model
 
+    @property
+    def random(self):
+        """ The random.Random instance of the agent's model. """
+        return self.model.random
+
     def step(self):
         """ A single step of the agent. """
         pass
+
+    def reset(self, *args, **kwargs):
+        """ Reinitialize an agent taken from a pool, to be reused as a new
+        one. Takes the same arguments as the class.
+
+        By default, the agent's attributes are deleted and __init__ is
+        called again; override to reuse more of the old state (e.g. lists,
+        emptied in place).
+
+        """
+        for name in _field_slots(type(self)):
+            try:
+                object.__delattr__(self, name)
+            except AttributeError:
+                pass  # An empty slot.
+        getattr(self, "__dict__", {}).clear()
+        self.__init__(*args, **kwargs)
+
+    def sleep(self, until):
+        """ Stop being activated by the model's schedule until a given step.
+
+        Args:
+            until: Step number (as counted by the schedule) at which to be
+                   activated again.
+
+        """
+        self.model.schedule.sleep(self, until)
+
+    def sleep_until_woken(self):
+        """ Stop being activated by the model's schedule until wake() is
+        called.
+
+        """
+        self.model.schedule.sleep(self)
+
+    def wake(self):
+        """ Be activated by the model's schedule again, from the next step
+        on.
+
+        """
+        self.model.schedule.wake(self)
+
+
+class Agent(BaseAgent):
+    """ Base class for a model agent. """
+
+
+class _SlottedAgentType(type):
+    """ Metaclass turning the fields declared by a SlottedAgent subclass (in
+    _fields, or as annotated class attributes) into slots.
+
+    """
+    def __new__(mcs, name, bases, namespace, **kwargs):
+        defaults = {}
+        for base in reversed(bases):
+            defaults.update(getattr(base, "_field_defaults", {}))
+        declared = namespace.pop("_fields", ())
+        if "__slots__" not in namespace:
+            fields = []
+            for field in declared:
+                if not isinstance(field, str):
+                    field, default = field
+                    defaults[field] = default
+                fields.append(field)
+            fields.extend(field for field, annotation in
+                          namespace.get("__annotations__", {}).items()
+                          if not str(annotation).startswith(
+                              ("ClassVar", "typing.ClassVar")))
+            inherited = set()
+            for base in bases:
+                for klass in base.__mro__:
+                    inherited.update(_slots_of(klass))
+            for field in fields:
+                if field in namespace:
+                    defaults[field] = namespace.pop(field)
+            namespace["__slots__"] = tuple(field for field in fields
+                                           if field not in inherited)
+        namespace["_field_defaults"] = defaults
+        return super().__new__(mcs, name, bases, namespace, **kwargs)
+
+
+@functools.lru_cache(maxsize=None)
+def _field_slots(cls):
+    """ Return the names of the slots of a class and of its bases, which hold
+    attributes.
+
+    """
+    names = []
+    for klass in cls.__mro__:
+        for name in _slots_of(klass):
+            if name not in ("__dict__", "__weakref__") and name not in names:
+                names.append(name)
+    return tuple(names)
+
+
+def _slots_of(klass):
+    """ Return the names declared in the __slots__ of a class (not of its
+    bases).
+
+    """
+    slots = klass.__dict__.get("__slots__", ())
+    return (slots,) if isinstance(slots, str) else tuple(slots)
+
+
+class SlottedAgent(BaseAgent, metaclass=_SlottedAgentType):
+    """ Base class for a model agent which stores its attributes in slots
+    rather than in a dictionary.
+
+    Like spaces, it has a pos attribute, which is None until the agent is
+    placed. It can be weakly referenced.
+
+    """
+    __slots__ = ("unique_id", "model", "pos", "__weakref__")
+
+    def __init__(self, unique_id, model):
+        """ Create a new agent, with its fields set to their defaults. """
+        super().__init__(unique_id, model)
+        self.pos = None
+        for name, value in self._field_defaults.items():
+            setattr(self, name, value)
+
+
+class AgentPool:
+    """ Agents of one class which were removed from their model, kept to be
+    reused in place of new agents; see Model.enable_pool().
+
+    Attributes:
+        agent_class: The class of the agents.
+        max_size: Maximum number of agents kept; None for no limit.
+        hits: Number of agents created by reusing a pooled one.
+        misses: Number of agents created anew, as the pool was empty.
+        released: Number of agents put in the pool.
+
+    """
+    def __init__(self, agent_class, max_size=None):
+        self.agent_class = agent_class
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.released = 0
+        self._free = []
+
+    def __len__(self):
+        return len(self._free)
+
+    def acquire(self, *args, **kwargs):
+        """ Return an agent created with the given arguments, reusing a
+        pooled one (reinitialized by its reset() method) if there is any.
+
+        """
+        if self._free:
+            self.hits += 1
+            agent = self._free.pop()
+            agent.reset(*args, **kwargs)
+            return agent
+        self.misses += 1
+        return self.agent_class(*args, **kwargs)
+
+    def release(self, agent):
+        """ Put an agent in the pool, unless it is full.
+
+        Returns:
+            True if the agent was pooled.
+
+        """
+        if self.max_size is not None and len(self._free) >= self.max_size:
+            return False
+        self._free.append(agent)
+        self.released += 1
+        return True
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Mesa Agent Set Module
+=====================
+
+Columnar storage for large numbers of homogeneous agents.
+
+Core Objects: AgentSet, AgentView
+
+An AgentSet stores each agent attribute as a NumPy array (a column), with one
+row per agent, instead of holding one Python object per agent. Agents are
+exposed as lightweight AgentView objects, which read and write their row, so
+that code written for ordinary agents (e.g. DataCollector reporters) keeps
+working. The point, however, is to define a vectorized step() on an AgentSet
+subclass, which updates all of its agents at once with array operations; a
+scheduler calls it once per step, in place of a step() call per agent.
+
+For example, a set of agents that each earn a random amount every step:
+
+    class Earners(AgentSet):
+        columns = {"wealth": float}
+
+        def step(self):
+            self["wealth"] += self.model.rng.random(len(self))
+
+"""
+import numpy as np
+
+
+class AgentSet:
+    """ A columnar container of homogeneous agents.
+
+    Columns are declared in the class-level `columns` dictionary (or passed
+    to the constructor), mapping each attribute name to a NumPy dtype, or to
+    a (dtype, length) tuple for vector attributes such as positions.
+
+    Rows are kept packed: removing an agent moves the last row into its
+    place, so the order of the rows is not stable, but adding and removing
+    agents take (amortized) constant time. Every agent has a unique_id, by
+    which it is looked up.
+
+    """
+    columns = {}
+    pos = None  # A set takes its turn as a whole, outside of any space.
+
+    def __init__(self, model, columns=None, capacity=16):
+        """ Create a new, empty agent set.
+
+        Args:
+            model: The model the agents belong to.
+            columns: Dictionary of extra columns, as for the class attribute.
+            capacity: Number of rows to allocate up front.
+
+        """
+        self.model = model
+        spec = dict(self.columns)
+        spec.update(columns or {})
+        self._spec = {}
+        for name, dtype in spec.items():
+            shape = ()
+            if isinstance(dtype, tuple):
+                dtype, length = dtype
+                shape = (length,)
+            self._spec[name] = (np.dtype(dtype), shape)
+        self._size = 0
+        self._ids = np.zeros(capacity, dtype=object)
+        self._data = {name: np.zeros((capacity,) + shape, dtype=dtype)
+                      for name, (dtype, shape) in self._spec.items()}
+        self._rows = {}
+        self._next_id = 0
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self):
+        """ Iterate over views of the agents, in row order. """
+        return (AgentView(self, unique_id) for unique_id in self.ids)
+
+    def __contains__(self, unique_id):
+        return unique_id in self._rows
+
+    def __getitem__(self, name):
+        """ Return a column, as a writable array view of the live rows. """
+        return self._data[name][:self._size]
+
+    def __setitem__(self, name, values):
+        """ Overwrite a column of the live rows. """
+        self._data[name][:self._size] = values
+
+    @property
+    def ids(self):
+        """ A list of the agents' unique_ids, in row order. """
+        return self._ids[:self._size].tolist()
+
+    def values(self, name):
+        """ Return a column as a list of Python values, in row order, with
+        the rows of vector columns as tuples.
+
+        """
+        values = self[name].tolist()
+        if self._data[name].ndim > 1:
+            return [tuple(value) for value in values]
+        return values
+
+    def get(self, unique_id):
+        """ Return a view of the agent with the given unique_id. """
+        if unique_id not in self._rows:
+            raise KeyError(unique_id)
+        return AgentView(self, unique_id)
+
+    def add(self, unique_id=None, **values):
+        """ Add an agent, and return a view of it.
+
+        Args:
+            unique_id: Identifier for the agent; by default a new id from
+                       the model's next_id(), or, if the model has none, the
+                       set numbers its agents from 0, which is only unique
+                       within it.
+            values: Initial values for the agent's columns; others are zero.
+
+        """
+        if unique_id is None:
+            next_id = getattr(self.model, "next_id", None)
+            unique_id = self._next_id if next_id is None else next_id()
+        if unique_id in self._rows:
+            raise ValueError("Duplicate unique_id: {}".format(unique_id))
+        if isinstance(unique_id, int):
+            self._next_id = max(self._next_id, unique_id + 1)
+        if self._size == len(self._ids):
+            self._grow()
+        row = self._size
+        self._ids[row] = unique_id
+        for name, column in self._data.items():
+            column[row] = values.pop(name, 0)
+        if values:
+            raise AttributeError("Unknown columns: {}".format(
+                ", ".join(values)))
+        self._rows[unique_id] = row
+        self._size += 1
+        return AgentView(self, unique_id)
+
+    def remove(self, agent):
+        """ Remove an agent, given its view or its unique_id. """
+        unique_id = agent.unique_id if isinstance(agent, AgentView) else agent
+        row = self._rows.pop(unique_id)
+        last = self._size - 1
+        if row != last:
+            moved = self._ids[last]
+            self._ids[row] = moved
+            for column in self._data.values():
+                column[row] = column[last]
+            self._rows[moved] = row
+        self._ids[last] = None
+        self._size = last
+
+    def remove_where(self, mask):
+        """ Remove all the agents for which mask is True, in one pass.
+
+        Args:
+            mask: Boolean array with one entry per live row.
+
+        """
+        keep = ~np.asarray(mask, dtype=bool)
+        count = int(keep.sum())
+        self._ids[:count] = self._ids[:self._size][keep]
+        self._ids[count:self._size] = None
+        for column in self._data.values():
+            column[:count] = column[:self._size][keep]
+        self._size = count
+        self._rows = {unique_id: row
+                      for row, unique_id in enumerate(self.ids)}
+
+    def step(self):
+        """ Step all the agents at once. Override with a vectorized update.
+        """
+        pass
+
+    def advance(self):
+        """ Apply staged changes, for simultaneous activation. Override if
+        needed.
+
+        """
+        pass
+
+    def _grow(self):
+        """ Double the number of allocated rows. """
+        capacity = 2 * len(self._ids)
+        ids = np.zeros(capacity, dtype=object)
+        ids[:self._size] = self._ids[:self._size]
+        self._ids = ids
+        for name, column in self._data.items():
+            grown = np.zeros((capacity,) + column.shape[1:],
+                             dtype=column.dtype)
+            grown[:self._size] = column[:self._size]
+            self._data[name] = grown
+
+
+class AgentView:
+    """ A lightweight view of one agent (row) of an AgentSet.
+
+    Reading or writing one of the set's columns as an attribute of the view
+    reads or writes the agent's row. Vector columns are read as tuples. Views
+    compare equal when they refer to the same agent of the same set. Once the
+    agent is removed from the set, its view has no attributes left but
+    agentset, unique_id and model.
+
+    """
+    __slots__ = ("agentset", "unique_id")
+
+    def __init__(self, agentset, unique_id):
+        object.__setattr__(self, "agentset", agentset)
+        object.__setattr__(self, "unique_id", unique_id)
+
+    @property
+    def model(self):
+        return self.agentset.model
+
+    def __getattr__(self, name):
+        agentset = self.agentset
+        try:
+            column = agentset._data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+        try:
+            row = agentset._rows[self.unique_id]
+        except KeyError:
+            raise AttributeError("Agent {!r} was removed from its AgentSet"
+                                 .format(self.unique_id)) from None
+        value = column[row]
+        if column.ndim > 1:
+            return tuple(value.tolist())
+        return value.item()
+
+    def __setattr__(self, name, value):
+        agentset = self.agentset
+        if name not in agentset._data:
+            raise AttributeError("AgentSet has no column {}".format(name))
+        try:
+            row = agentset._rows[self.unique_id]
+        except KeyError:
+            raise AttributeError("Agent {!r} was removed from its AgentSet"
+                                 .format(self.unique_id)) from None
+        agentset._data[name][row] = value
+
+    def __eq__(self, other):
+        return (isinstance(other, AgentView) and
+                self.agentset is other.agentset and
+                self.unique_id == other.unique_id)
+
+    def __hash__(self):
+        return hash((id(self.agentset), self.unique_id))
+
+    def __repr__(self):
+        return "<AgentView {!r} of {}>".format(
+            self.unique_id, type(self.agentset).__name__)
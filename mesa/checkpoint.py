@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+"""
+Mesa Checkpoint Module
+======================
+
+Saving the state of a running model to a file, and restoring it, e.g. to
+resume a long run after it was interrupted, or to start several runs from the
+same warm state.
+
+Core Objects: snapshot, restore (also available as Model.snapshot() and
+Model.restore())
+
+A snapshot is a NumPy .npz file, which holds:
+    * The agents, grouped by class. Each attribute of the agents of a class
+      (held in their __dict__ or in slots) is stored as an array (a column)
+      when its values are simple: booleans, numbers, strings, tuples of
+      numbers (such as positions), or references to other agents, which are
+      stored as agent indices. Other values are pickled.
+    * The state of each component of the model, i.e. each attribute with
+      get_state() and set_state() methods: schedules, spaces and data
+      collectors. Their state refers to the agents they contain.
+    * The other attributes of the model which can be pickled; attributes
+      which cannot, such as functions defined in place, are left out, as
+      are the event subscriptions, which the model sets up when created.
+    * Which of the agents are registered with the model by unique_id.
+    * The states of the random number generators: the model's own (its
+      random attribute is saved with the other attributes), and the global
+      ones of the random module and of NumPy.
+
+Wherever pickling is used, references to the agents, the model and its
+components are replaced by ids, so nothing is saved twice.
+
+To restore a snapshot, create the model with the same parameters, then call
+restore() on it: the agents are recreated (without calling their __init__),
+and the components and attributes are restored in place.
+
+"""
+from collections import OrderedDict
+import importlib
+import io
+import os
+import pickle
+import random
+
+import numpy as np
+
+from .agent import _field_slots
+
+
+class _Missing:
+    """ Marker for an attribute which some agents of a class lack. """
+
+
+_MISSING = _Missing()
+
+_SIMPLE_TYPES = {
+    "bool": (bool, np.bool_),
+    "int": (int, np.integer),
+    "float": (float, np.floating),
+    "str": (str,),
+}
+
+
+def snapshot(model, path, compress=False):
+    """ Save the state of a model to a file.
+
+    Args:
+        model: The model to save.
+        path: Name of the file to write, or a writable binary file object.
+              A named file is replaced in one go, once fully written.
+        compress: If True, compress the arrays (smaller, but slower).
+
+    """
+    components = OrderedDict(
+        (name, value) for name, value in vars(model).items()
+        if _is_component(value))
+    states = OrderedDict(
+        (name, component.get_state())
+        for name, component in components.items())
+
+    agents = []
+    index = {}
+    for state in states.values():
+        for agent in state.get("agents", ()):
+            if id(agent) not in index:
+                index[id(agent)] = len(agents)
+                agents.append(agent)
+
+    by_class = OrderedDict()
+    for i, agent in enumerate(agents):
+        by_class.setdefault(type(agent), []).append(i)
+    arrays = {}
+    classes = []
+    object_columns = []
+    for number, (cls, members) in enumerate(by_class.items()):
+        arrays["agents.{}".format(number)] = np.array(members, dtype=np.int64)
+        fields = [_attributes(agents[i]) for i in members]
+        names = OrderedDict()
+        for attributes in fields:
+            names.update(dict.fromkeys(attributes))
+        columns = []
+        for name in names:
+            values = [attributes.get(name, _MISSING) for attributes in fields]
+            kind, array = _encode_column(values, index, agents)
+            if kind == "object":
+                object_columns.append((number, name, values))
+            else:
+                arrays["column.{}.{}".format(number, name)] = array
+            columns.append((name, kind))
+        classes.append((cls.__module__, cls.__qualname__, columns))
+
+    registry = getattr(model, "_agent_registry", {})
+    registered = [i for i, agent in enumerate(agents)
+                  if registry.get(getattr(agent, "unique_id", None)) is agent]
+
+    attributes = {}
+    for name, value in vars(model).items():
+        if name in components or name in (
+                "rng", "_agent_registry", "_event_handlers"):
+            continue
+        try:
+            attributes[name] = _dumps(value, model, components, index,
+                                      agents)
+        except Exception:
+            continue  # Not picklable; left as it is in the restored model.
+
+    rng = getattr(model, "rng", None)
+    meta = {
+        "object_columns": object_columns,
+        "components": states,
+        "registered": registered,
+        "attributes": attributes,
+        "random": random.getstate(),
+        "numpy_random": np.random.get_state(),
+        "rng": None if rng is None else rng.bit_generator.state,
+    }
+    arrays["classes"] = _to_bytes(pickle.dumps(
+        (len(agents), classes), protocol=pickle.HIGHEST_PROTOCOL))
+    arrays["components"] = _to_bytes(pickle.dumps(
+        list(components), protocol=pickle.HIGHEST_PROTOCOL))
+    arrays["meta"] = _to_bytes(_dumps(meta, model, components, index,
+                                      agents))
+
+    save = np.savez_compressed if compress else np.savez
+    if hasattr(path, "write"):
+        save(path, **arrays)
+        return
+    temporary = "{}.tmp".format(path)
+    with open(temporary, "wb") as f:
+        save(f, **arrays)
+    os.replace(temporary, path)
+
+
+def restore(model, path):
+    """ Restore the state of a model from a file written by snapshot().
+
+    Args:
+        model: A model of the same class as the one saved, created with the
+               same parameters; it is modified in place.
+        path: Name of the file to read, or a readable binary file object.
+
+    Returns:
+        The model.
+
+    """
+    with np.load(path) as data:
+        arrays = {name: data[name] for name in data.files}
+    count, classes = pickle.loads(arrays["classes"].tobytes())
+
+    agents = [None] * count
+    for number, (module, qualname, _) in enumerate(classes):
+        cls = importlib.import_module(module)
+        for part in qualname.split("."):
+            cls = getattr(cls, part)
+        for i in arrays["agents.{}".format(number)].tolist():
+            agents[i] = cls.__new__(cls)
+
+    components = {name: value for name, value in vars(model).items()
+                  if _is_component(value)}
+    meta_components = pickle.loads(arrays["components"].tobytes())
+    missing = [name for name in meta_components if name not in components]
+    if missing:
+        raise ValueError("The model has no {} to restore; create it as the "
+                         "saved model was created.".format(", ".join(missing)))
+    meta = _loads(arrays["meta"].tobytes(), model, components, agents)
+
+    objects = {(number, name): values
+               for number, name, values in meta["object_columns"]}
+    for number, (_, _, columns) in enumerate(classes):
+        members = arrays["agents.{}".format(number)].tolist()
+        slots = _field_slots(type(agents[members[0]]))
+        for name, kind in columns:
+            if kind == "object":
+                values = objects[number, name]
+            else:
+                values = _decode_column(
+                    kind, arrays["column.{}.{}".format(number, name)],
+                    agents)
+            for i, value in zip(members, values):
+                if value is _MISSING:
+                    continue
+                if name in slots:
+                    object.__setattr__(agents[i], name, value)
+                else:
+                    vars(agents[i])[name] = value
+
+    for name, state in meta["components"].items():
+        components[name].set_state(state)
+    for name, value in meta["attributes"].items():
+        setattr(model, name, _loads(value, model, components, agents))
+    if hasattr(model, "register_agent"):
+        model._registry().clear()
+        for i in meta["registered"]:
+            model.register_agent(agents[i])
+
+    random.setstate(meta["random"])
+    np.random.set_state(meta["numpy_random"])
+    if meta["rng"] is not None:
+        rng = getattr(model, "rng", None)
+        if rng is None:
+            rng = model.rng = np.random.default_rng()
+        rng.bit_generator.state = meta["rng"]
+    return model
+
+
+def _is_component(value):
+    """ Whether a model attribute saves and restores its own state. """
+    return (not isinstance(value, type) and
+            callable(getattr(value, "get_state", None)) and
+            callable(getattr(value, "set_state", None)))
+
+
+def _attributes(agent):
+    """ Return a dictionary of the attributes of an agent, whether they are
+    held in slots or in its __dict__.
+
+    """
+    attributes = OrderedDict()
+    for name in _field_slots(type(agent)):
+        try:
+            attributes[name] = object.__getattribute__(agent, name)
+        except AttributeError:
+            pass  # An empty slot.
+    attributes.update(getattr(agent, "__dict__", {}))
+    return attributes
+
+
+def _encode_column(values, index, agents):
+    """ Return the kind of a column of attribute values, and the array to
+    store it as (None for object columns, which are pickled).
+
+    """
+    first = values[0]
+    for kind, types in _SIMPLE_TYPES.items():
+        if isinstance(first, types) and all(
+                isinstance(value, types) and
+                (kind == "bool" or not isinstance(value, (bool, np.bool_)))
+                for value in values):
+            try:
+                return kind, np.array(values, dtype=_dtype(kind))
+            except OverflowError:
+                return "object", None
+    if isinstance(first, tuple) and first:
+        length = len(first)
+        if all(isinstance(value, tuple) and len(value) == length
+               for value in values):
+            items = [item for value in values for item in value]
+            for kind in ("int", "float"):
+                types = _SIMPLE_TYPES[kind]
+                if all(isinstance(item, types) and
+                       not isinstance(item, (bool, np.bool_))
+                       for item in items):
+                    try:
+                        array = np.array(items, dtype=_dtype(kind))
+                    except OverflowError:
+                        break
+                    return kind + "_tuple", array.reshape(-1, length)
+    refs = []
+    for value in values:
+        if value is None:
+            refs.append(-1)
+            continue
+        i = index.get(id(value))
+        if i is None or agents[i] is not value:
+            return "object", None
+        refs.append(i)
+    if all(ref == -1 for ref in refs):
+        return "object", None
+    return "ref", np.array(refs, dtype=np.int64)
+
+
+def _decode_column(kind, array, agents):
+    """ Return the list of attribute values stored in a column. """
+    if kind == "ref":
+        return [agents[i] if i >= 0 else None for i in array.tolist()]
+    if kind.endswith("_tuple"):
+        return [tuple(row) for row in array.tolist()]
+    return array.tolist()
+
+
+def _dtype(kind):
+    return {"bool": bool, "int": np.int64, "float": np.float64,
+            "str": str}[kind]
+
+
+def _to_bytes(data):
+    """ Wrap bytes in an array, to store in an .npz file. """
+    return np.frombuffer(data, dtype=np.uint8)
+
+
+class _Pickler(pickle.Pickler):
+    """ Pickler which replaces the agents, the model and its components by
+    ids.
+
+    """
+    def __init__(self, file, model, components, index, agents):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.model = model
+        self.components = {id(value): name
+                           for name, value in components.items()}
+        self.index = index
+        self.agents = agents
+
+    def persistent_id(self, obj):
+        if obj is self.model:
+            return ("model",)
+        if obj is _MISSING:
+            return ("missing",)
+        key = id(obj)
+        i = self.index.get(key)
+        if i is not None and self.agents[i] is obj:
+            return ("agent", i)
+        if key in self.components:
+            return ("component", self.components[key])
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    """ Unpickler which resolves the ids written by _Pickler. """
+    def __init__(self, file, model, components, agents):
+        super().__init__(file)
+        self.model = model
+        self.components = components
+        self.agents = agents
+
+    def persistent_load(self, pid):
+        kind = pid[0]
+        if kind == "model":
+            return self.model
+        if kind == "missing":
+            return _MISSING
+        if kind == "agent":
+            return self.agents[pid[1]]
+        if kind == "component":
+            return self.components[pid[1]]
+        raise pickle.UnpicklingError("Unknown id: {}".format(pid))
+
+
+def _dumps(obj, model, components, index, agents):
+    f = io.BytesIO()
+    _Pickler(f, model, components, index, agents).dump(obj)
+    return f.getvalue()
+
+
+def _loads(data, model, components, agents):
+    return _Unpickler(io.BytesIO(data), model, components, agents).load()
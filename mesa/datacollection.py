@@ -14,7 +14,10 @@ agent-level data; a third dictionary provides table names and columns.
 When the collect() method is called, each model-level function is called, with
 the model as the argument, and the results associated with the relevant
 variable. Then the agent-level functions are called on each
-agent in the model scheduler.
+agent in the model scheduler. An agent-level reporter may also be given as the
+name of an attribute, which is read from each agent; the values of the agents
+in an AgentSet are then read from its column directly, without a call per
+agent.
 
 Additionally, other objects can write directly to tables by passing in an
 appropriate dictionary object for a table row.
@@ -67,6 +70,8 @@ class DataCollector:
         If there was only one agent-level reporter (e.g. the agent's energy),
         it might look like this:
             {"energy": lambda a: a.energy}
+        or, naming the attribute to collect, like this:
+            {"energy": "energy"}
 
         The tables arg accepts a dictionary mapping names of tables to lists of
         columns. For example, if we want to allow agents to write their age
@@ -113,7 +118,8 @@ class DataCollector:
         Args:
             reporter_name: Name of the agent-level variable to collect.
             reporter_function: Function object that returns the variable when
-                               given an agent object.
+                               given an agent object, or the name of the
+                               agent attribute to collect.
 
         """
         self.agent_reporters[reporter_name] = reporter_function
@@ -138,9 +144,13 @@ class DataCollector:
 
         if self.agent_reporters:
             for var, reporter in self.agent_reporters.items():
-                agent_records = []
-                for agent in model.schedule.agents:
-                    agent_records.append((agent.unique_id, reporter(agent)))
+                if isinstance(reporter, str):
+                    agent_records = model.schedule.get_agent_values(reporter)
+                else:
+                    agent_records = []
+                    for agent in model.schedule.agents:
+                        agent_records.append((agent.unique_id,
+                                              reporter(agent)))
                 self.agent_vars[var].append(agent_records)
 
     def add_table_row(self, table_name, row, ignore_missing=False):
@@ -164,6 +174,23 @@ class DataCollector:
             else:
                 raise Exception("Could not insert row with missing column")
 
+    def get_state(self):
+        """ Return the data collected so far, for snapshots (see
+        mesa.checkpoint).
+
+        """
+        return {"model_vars": self.model_vars, "agent_vars": self.agent_vars,
+                "tables": self.tables}
+
+    def set_state(self, state):
+        """ Replace the data collected so far with that of a state returned by
+        get_state().
+
+        """
+        self.model_vars = state["model_vars"]
+        self.agent_vars = state["agent_vars"]
+        self.tables = state["tables"]
+
     def get_model_vars_dataframe(self):
         """ Create a pandas DataFrame from the model variables.
 
@@ -5,8 +5,18 @@ The model class for Mesa framework.
 Core Objects: Model
 
 """
+import copy
 import datetime as dt
+import multiprocessing
+import os
 import random
+import time
+import weakref
+
+import numpy as np
+
+from . import checkpoint, profiling
+from .agent import AgentPool
 
 
 class Model:
@@ -16,29 +26,446 @@ class Model:
         start the model.
 
         Args:
-            seed: seed for the random number generator
+            seed: seed for the random number generators
 
         Attributes:
             schedule: schedule object
             running: a bool indicating if the model should continue running
+            random: random.Random instance owned by the model, seeded with
+                    the seed (from fresh entropy if None), for the model, its
+                    agents and its spaces to draw from in place of the random
+                    module
+            rng: NumPy random Generator owned by the model, seeded likewise,
+                 which the schedulers draw activation orders from
+
+        The model also keeps a registry of its agents by unique_id, which
+        schedules and spaces register the agents they are given with; see
+        get_agent() and next_id().
+
+        Agents of some classes can be recycled rather than allocated anew;
+        see enable_pool().
+
+        Callbacks can subscribe to the events of the model, e.g. to keep
+        statistics up to date as agents come and go rather than scanning
+        them; see subscribe().
 
         """
         if seed is None:
             self.seed = dt.datetime.now()
         else:
             self.seed = seed
-        random.seed(seed)
+        self.random = random.Random(seed)
+        if seed is None or (isinstance(seed, int) and seed >= 0):
+            self._seed_sequence = np.random.SeedSequence(seed)
+        else:
+            # NumPy only takes non-negative integer seeds; derive one from
+            # the seeded random.Random instead.
+            self._seed_sequence = np.random.SeedSequence(
+                self.random.getrandbits(64))
+        self.rng = np.random.default_rng(self._seed_sequence)
         self.running = True
         self.schedule = None
+        self._agent_registry = weakref.WeakValueDictionary()
+        self._next_unique_id = 0
+        self._agent_pools = {}
+        self._event_handlers = {}
+
+    def next_id(self):
+        """ Return a new unique_id for an agent: the lowest integer above
+        those returned before which no registered agent has, so that ids
+        are dense.
+
+        """
+        registry = self._registry()
+        unique_id = getattr(self, "_next_unique_id", 0)
+        while unique_id in registry:
+            unique_id += 1
+        self._next_unique_id = unique_id + 1
+        return unique_id
+
+    def register_agent(self, agent):
+        """ Register an agent by its unique_id. Schedules and spaces call this
+        when an agent is added to them, so it is seldom needed directly.
+
+        The registry only holds weak references: an agent which is no longer
+        referenced anywhere else is dropped from it.
+
+        Raises:
+            ValueError: if another agent is registered with the same
+                        unique_id.
+
+        """
+        registry = self._registry()
+        registered = registry.get(agent.unique_id)
+        if registered is agent:
+            return
+        if registered is not None:
+            raise ValueError("Duplicate unique_id: {}".format(
+                agent.unique_id))
+        registry[agent.unique_id] = agent
+
+    def deregister_agent(self, agent):
+        """ Remove an agent from the registry, if it is registered, e.g. to
+        reuse its unique_id while it is still referenced somewhere.
+
+        """
+        registry = self._registry()
+        if registry.get(agent.unique_id) is agent:
+            del registry[agent.unique_id]
+
+    def get_agent(self, unique_id):
+        """ Return the registered agent with the given unique_id.
+
+        Raises:
+            KeyError: if no such agent is registered.
+
+        """
+        return self._registry()[unique_id]
+
+    def _registry(self):
+        """ Return the registry of agents, creating it if Model.__init__ was
+        not called.
+
+        """
+        try:
+            return self._agent_registry
+        except AttributeError:
+            self._agent_registry = weakref.WeakValueDictionary()
+            return self._agent_registry
+
+    def enable_pool(self, agent_class, max_size=None):
+        """ Recycle the agents of a class: agents removed from the schedule
+        (once the removal is applied, and if they are not placed in a space)
+        are kept in a pool, and create_agent() reuses them, through their
+        reset() method, in place of new ones.
+
+        Pooled agents must not be used after they are removed, as they may
+        be reused as other agents; subclasses are not pooled with the class.
+
+        Args:
+            agent_class: The class of the agents to pool.
+            max_size: Maximum number of agents to keep; None for no limit.
+
+        Returns:
+            The AgentPool of the class, whose hits and misses count the
+            agents reused and created.
+
+        """
+        pools = self._pools()
+        if agent_class not in pools:
+            pools[agent_class] = AgentPool(agent_class, max_size)
+        return pools[agent_class]
+
+    def create_agent(self, agent_class, *args, **kwargs):
+        """ Return a new agent of a class, created with the given arguments,
+        or reused from the pool of the class if it has one (see
+        enable_pool()).
+
+        """
+        pool = self._pools().get(agent_class)
+        if pool is None:
+            return agent_class(*args, **kwargs)
+        return pool.acquire(*args, **kwargs)
+
+    def release_agent(self, agent):
+        """ Put an agent which was removed from the model in the pool of its
+        class, if it has one and the agent is not placed in a space. The
+        schedules call this when a removal is applied.
+
+        Returns:
+            True if the agent was pooled.
+
+        """
+        pool = self._pools().get(type(agent))
+        if pool is None or getattr(agent, "pos", None) is not None:
+            return False
+        if pool.release(agent):
+            self.deregister_agent(agent)
+            return True
+        return False
+
+    def _pools(self):
+        """ Return the agent pools by class, creating them if Model.__init__
+        was not called.
+
+        """
+        try:
+            return self._agent_pools
+        except AttributeError:
+            self._agent_pools = {}
+            return self._agent_pools
+
+    def subscribe(self, event, handler):
+        """ Call a handler whenever an event is emitted. The schedules and
+        spaces emit:
+
+            agent_added: handler(agent), when an agent is added to a
+                         schedule (AgentSets are not reported);
+            agent_removed: handler(agent), when an agent is removed from a
+                           schedule;
+            agent_moved: handler(agent, old_pos, new_pos), when a space
+                         moves an agent;
+            step_end: handler(model), when a schedule has finished a step,
+                      before its step count is increased.
+
+        Models can emit events of their own with emit(). Events without
+        subscribers cost next to nothing.
+
+        Args:
+            event: Name of the event.
+            handler: Callable, called with the arguments of the event.
+
+        Returns:
+            The handler, so that on_agent_added() and the like can be used
+            as decorators.
+
+        """
+        handlers = self._handlers()
+        # Replace the list rather than append to it, so that handlers can
+        # subscribe while an event is being emitted.
+        handlers[event] = handlers.get(event, []) + [handler]
+        return handler
+
+    def unsubscribe(self, event, handler):
+        """ Stop calling a handler subscribed to an event. """
+        handlers = self._handlers()
+        remaining = [h for h in handlers.get(event, []) if h != handler]
+        if remaining:
+            handlers[event] = remaining
+        else:
+            handlers.pop(event, None)
+
+    def emit(self, event, *args):
+        """ Call the handlers subscribed to an event with the given
+        arguments, in the order they subscribed.
+
+        """
+        for handler in self._handlers().get(event, ()):
+            handler(*args)
 
-    def run_model(self):
-        """ Run the model until the end condition is reached. Overload as
-        needed.
+    def on_agent_added(self, handler):
+        """ Subscribe a handler to the agent_added event; see subscribe(). """
+        return self.subscribe("agent_added", handler)
+
+    def on_agent_removed(self, handler):
+        """ Subscribe a handler to the agent_removed event; see subscribe().
+
+        """
+        return self.subscribe("agent_removed", handler)
+
+    def on_agent_moved(self, handler):
+        """ Subscribe a handler to the agent_moved event; see subscribe(). """
+        return self.subscribe("agent_moved", handler)
+
+    def on_step_end(self, handler):
+        """ Subscribe a handler to the step_end event; see subscribe(). """
+        return self.subscribe("step_end", handler)
+
+    def _handlers(self):
+        """ Return the event handlers, creating them if Model.__init__ was
+        not called.
+
+        """
+        try:
+            return self._event_handlers
+        except AttributeError:
+            self._event_handlers = {}
+            return self._event_handlers
+
+    def spawn_seeds(self, n):
+        """ Return seeds for independent random streams, e.g. for parallel
+        workers. The seeds only depend on the model's seed and on the number
+        of seeds spawned before, and spawning them does not draw from the
+        model's own generators.
+
+        Args:
+            n: Number of seeds.
+
+        Returns:
+            A list of n NumPy SeedSequences, to pass to reseed() or to
+            numpy.random.default_rng().
+
+        """
+        if not hasattr(self, "_seed_sequence"):
+            # Model.__init__ was not called; use fresh entropy.
+            self._seed_sequence = np.random.SeedSequence()
+        return self._seed_sequence.spawn(n)
+
+    def reseed(self, seed):
+        """ Replace the model's random and rng generators with new ones,
+        seeded from a seed returned by spawn_seeds().
+
+        """
+        self._seed_sequence = seed
+        self.random = random.Random(
+            seed.generate_state(2, np.uint64).tolist()[0])
+        self.rng = np.random.default_rng(seed)
+
+    def snapshot(self, path, compress=False):
+        """ Save the state of the model (its agents, schedule, spaces and
+        random number generators) to a file; see mesa.checkpoint.
+
+        Args:
+            path: Name of the file to write, or a binary file object.
+            compress: If True, compress the file.
+
+        """
+        checkpoint.snapshot(self, path, compress)
+
+    def restore(self, path):
+        """ Restore the state of the model from a file written by snapshot().
+        The model should have been created with the same parameters as the
+        one saved.
+
+        Args:
+            path: Name of the file to read, or a binary file object.
+
+        """
+        return checkpoint.restore(self, path)
+
+    def memory_report(self):
+        """ Estimate the memory taken by the agents in the schedule, per
+        agent class; see mesa.profiling.memory_report().
+
+        Returns:
+            A pandas DataFrame indexed by agent class name, with columns
+            "Agents", "Bytes" and "Bytes per agent".
+
+        """
+        return profiling.memory_report(self)
+
+    def fork(self, n, function, processes=None):
+        """ Run several independent continuations of the model from its
+        current state, e.g. to try out interventions without re-running the
+        steps so far, and return their results.
+
+        Where processes can be forked, each continuation runs in a forked
+        child process, which shares the memory of the model until it writes
+        to it (copy-on-write), so no copy is made up front. Otherwise, each
+        continuation runs on a deep copy of the model, one after another.
+        Either way, the model itself is left as it is.
+
+        Each continuation gets its own random streams: the model's generators
+        (see reseed()), the random module and NumPy's global generator are
+        reseeded from seeds from spawn_seeds(), so forking a model in the
+        same state gives the same results.
+
+        Args:
+            n: Number of continuations.
+            function: Function called as function(model, i) for the i-th
+                      continuation, which runs the model as needed and
+                      returns the result (which must be picklable).
+            processes: Maximum number of processes to run at once; defaults
+                       to the number of CPUs. 0 runs the continuations on
+                       copies in this process.
+
+        Returns:
+            The list of the results of the n continuations, in order.
 
         """
+        seeds = self.spawn_seeds(n)
+        if processes is None:
+            processes = os.cpu_count() or 1
+        if (processes == 0 or n == 0 or
+                "fork" not in multiprocessing.get_all_start_methods()):
+            return [_run_copy(self, function, i, seed)
+                    for i, seed in enumerate(seeds)]
+
+        global _FORKED_MODEL
+        _FORKED_MODEL = (self, function)
+        try:
+            context = multiprocessing.get_context("fork")
+            # One task per child, so that each continuation starts from the
+            # state of the model at the time of the call.
+            with context.Pool(min(processes, n), maxtasksperchild=1) as pool:
+                return pool.map(_run_forked_model, list(enumerate(seeds)),
+                                chunksize=1)
+        finally:
+            _FORKED_MODEL = None
+
+    def run_model(self, max_steps=None, max_seconds=None, stop=None,
+                  check_every=1, on_step=None):
+        """ Run the model until the end condition is reached, i.e. until
+        running is False, or until a limit is reached. Overload as needed.
+
+        Args:
+            max_steps: Maximum number of steps to run in this call.
+            max_seconds: Wall-clock time after which no further step is
+                         started; the step running at that time finishes.
+            stop: Function called as stop(model) after every check_every
+                  steps, which returns True once the model has ended; running
+                  is then set to False. Use it for end conditions too costly
+                  to check every step.
+            check_every: How many steps to run between calls to stop.
+            on_step: Function called as on_step(model, seconds) after each
+                     step, with the time the step took, e.g. to log timings.
+
+        Returns:
+            The number of steps run. Reaching max_steps or max_seconds leaves
+            running as it is, so the run can be continued.
+
+        """
+        if check_every < 1:
+            raise ValueError("check_every must be at least 1.")
+        deadline = None
+        if max_seconds is not None:
+            deadline = time.perf_counter() + max_seconds
+        steps = 0
         while self.running:
-            self.step()
+            if max_steps is not None and steps >= max_steps:
+                break
+            if deadline is not None and time.perf_counter() >= deadline:
+                break
+            if on_step is None:
+                self.step()
+            else:
+                start = time.perf_counter()
+                self.step()
+                on_step(self, time.perf_counter() - start)
+            steps += 1
+            if (stop is not None and steps % check_every == 0 and
+                    stop(self)):
+                self.running = False
+        return steps
 
     def step(self):
         """ A single step. Fill in here. """
         pass
+
+
+# Model and function shared with forked child processes.
+_FORKED_MODEL = None
+
+
+def _reseed(model, seed):
+    """ Reseed the model's generators and the global ones from a NumPy
+    SeedSequence, for a continuation of the model.
+
+    """
+    model.reseed(seed)
+    state = seed.generate_state(4, np.uint64).tolist()
+    random.seed(state[2])
+    np.random.seed(state[3] % 2 ** 32)
+
+
+def _run_forked_model(task):
+    """ Run a continuation of the model in a forked child process. """
+    i, seed = task
+    model, function = _FORKED_MODEL
+    _reseed(model, seed)
+    return function(model, i)
+
+
+def _run_copy(model, function, i, seed):
+    """ Run a continuation on a copy of the model, leaving the global random
+    states as they were.
+
+    """
+    states = random.getstate(), np.random.get_state()
+    try:
+        model = copy.deepcopy(model)
+        _reseed(model, seed)
+        return function(model, i)
+    finally:
+        random.setstate(states[0])
+        np.random.set_state(states[1])
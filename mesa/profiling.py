@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+"""
+Mesa Profiling Module
+=====================
+
+Instrumentation to find out where the time of a model step goes.
+
+Core Objects: SchedulerProfiler, memory_report
+
+A SchedulerProfiler is attached to a schedule with its enable_profiling()
+method. While it is attached, the schedule times each agent activation and
+adds it up per stage and per agent class, so that e.g. the breed dominating a
+step stands out. Optionally, the change in memory allocated by Python (as
+traced by tracemalloc) is recorded too; this slows the model down
+considerably, so it is off by default.
+
+The records can be retrieved as pandas DataFrames, and a callback can be
+given, to receive a summary at the end of each step. A schedule without a
+profiler only pays for one check per step.
+
+memory_report() (also available as Model.memory_report()) estimates the
+memory taken by the agents of a model, per agent class, e.g. to see how much
+is saved by turning agents into SlottedAgents or into an AgentSet.
+
+"""
+from collections import OrderedDict
+import sys
+from time import perf_counter
+import tracemalloc
+
+import numpy as np
+
+from .agentset import AgentSet
+
+
+class SchedulerProfiler:
+    """ Collects timings of agent activations, per step, stage and agent
+    class.
+
+    Attributes:
+        records: List of dictionaries, one per step, stage and agent class,
+                 with keys "Step", "Stage", "Class", "Calls", "Time" (in
+                 seconds) and "Memory" (in bytes).
+        step_records: List of dictionaries, one per step, with keys "Step",
+                      "Time" and "Memory".
+
+    """
+    def __init__(self, memory=False, callback=None):
+        """ Create a new profiler.
+
+        Args:
+            memory: If True, also record the change in traced memory; this
+                    starts tracemalloc if it is not already tracing.
+            callback: Function called at the end of each step with a summary
+                      dictionary, with the keys of a step record plus
+                      "Classes", which maps (stage, class name) pairs to
+                      dictionaries of calls, time and memory.
+
+        """
+        self.memory = memory
+        self.callback = callback
+        self.records = []
+        self.step_records = []
+        self._tracing = False
+        self._current = {}
+        self._step_start = 0
+        self._step_memory = 0
+
+    def start(self):
+        """ Start tracing memory allocations, if needed. """
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+
+    def stop(self):
+        """ Stop tracing memory allocations, if this profiler started it. """
+        if self._tracing:
+            tracemalloc.stop()
+            self._tracing = False
+
+    def begin_step(self):
+        """ Start timing a step. """
+        self._current = {}
+        self._step_memory = self._traced_memory()
+        self._step_start = perf_counter()
+
+    def end_step(self, step):
+        """ Finish timing a step, and record it.
+
+        Args:
+            step: Number of the step.
+
+        """
+        elapsed = perf_counter() - self._step_start
+        summary = {"Step": step, "Time": elapsed,
+                   "Memory": self._traced_memory() - self._step_memory}
+        self.step_records.append(summary.copy())
+        classes = {}
+        for (stage, name), (calls, time, memory) in self._current.items():
+            self.records.append({"Step": step, "Stage": stage, "Class": name,
+                                 "Calls": calls, "Time": time,
+                                 "Memory": memory})
+            classes[stage, name] = {"Calls": calls, "Time": time,
+                                    "Memory": memory}
+        self._current = {}
+        if self.callback is not None:
+            summary["Classes"] = classes
+            self.callback(summary)
+
+    def run(self, agents, stage, active):
+        """ Call a stage method of each of the agents which are active,
+        timing each call.
+
+        Args:
+            agents: List of agents (or AgentSets).
+            stage: Name of the method to call.
+            active: Container of the agents which should be activated.
+
+        """
+        for agent in agents:
+            if agent in active:
+                self.call(stage, type(agent), getattr(agent, stage))
+
+    def call(self, stage, cls, function, *args):
+        """ Call a function, and add its time to the totals of a stage and
+        class.
+
+        """
+        memory = self._traced_memory()
+        start = perf_counter()
+        function(*args)
+        elapsed = perf_counter() - start
+        memory = self._traced_memory() - memory
+        key = (stage, cls.__name__)
+        totals = self._current.get(key)
+        if totals is None:
+            self._current[key] = [1, elapsed, memory]
+        else:
+            totals[0] += 1
+            totals[1] += elapsed
+            totals[2] += memory
+
+    def get_dataframe(self):
+        """ Create a pandas DataFrame of the records per step, stage and
+        class.
+
+        """
+        import pandas as pd
+        return pd.DataFrame(self.records, columns=[
+            "Step", "Stage", "Class", "Calls", "Time", "Memory"])
+
+    def get_step_dataframe(self):
+        """ Create a pandas DataFrame of the records per step, indexed by
+        step.
+
+        """
+        import pandas as pd
+        df = pd.DataFrame(self.step_records,
+                          columns=["Step", "Time", "Memory"])
+        return df.set_index("Step")
+
+    def _traced_memory(self):
+        """ Return the memory currently traced, or 0 if not tracing. """
+        if self.memory:
+            return tracemalloc.get_traced_memory()[0]
+        return 0
+
+
+def memory_report(model):
+    """ Estimate the memory taken by the agents in a model's schedule, per
+    agent class.
+
+    The estimate for an agent counts the agent object, its __dict__ if it has
+    one, and the values of its attributes, recursing into lists, tuples, sets
+    and dictionaries. The model, its attributes and the agents themselves are
+    not counted as attribute values, and any other object referred to by
+    several agents is only counted once. An AgentSet counts its arrays, as
+    one entry whose agents are the rows.
+
+    Args:
+        model: A model with a schedule.
+
+    Returns:
+        A pandas DataFrame indexed by agent class name, with columns
+        "Agents", "Bytes" and "Bytes per agent", largest first.
+
+    """
+    import pandas as pd
+    entries = model.schedule._entries()
+    seen = {id(model)}
+    seen.update(id(value) for value in vars(model).values())
+    seen.update(id(entry) for entry in entries)
+    totals = OrderedDict()
+    for entry in entries:
+        if isinstance(entry, AgentSet):
+            count = len(entry)
+            size = sys.getsizeof(entry) + sys.getsizeof(entry._rows)
+            for array in [entry._ids] + list(entry._data.values()):
+                size += array.nbytes
+        else:
+            count = 1
+            size = _size(entry, seen, shallow=True)
+        totals.setdefault(type(entry).__name__, [0, 0])
+        totals[type(entry).__name__][0] += count
+        totals[type(entry).__name__][1] += size
+    records = [{"Class": name, "Agents": count, "Bytes": size,
+                "Bytes per agent": size / count if count else 0}
+               for name, (count, size) in totals.items()]
+    df = pd.DataFrame(records,
+                      columns=["Class", "Agents", "Bytes", "Bytes per agent"])
+    return df.set_index("Class").sort_values("Bytes", ascending=False)
+
+
+def _size(obj, seen, shallow=False):
+    """ Return the size of an object, and of the objects it holds, except for
+    those already seen. With shallow=True, obj itself may have been seen
+    (e.g. an agent), but its attributes are measured.
+
+    """
+    if not shallow:
+        if id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, np.ndarray):
+        return size
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return size + sum(_size(item, seen) for item in obj)
+    if isinstance(obj, dict):
+        return size + sum(_size(key, seen) + _size(value, seen)
+                          for key, value in obj.items())
+    if not shallow:
+        return size
+    # An agent: add its attributes.
+    attributes = getattr(obj, "__dict__", None)
+    if attributes is not None:
+        size += _size(attributes, seen)
+    for klass in type(obj).__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        for name in (slots,) if isinstance(slots, str) else slots:
+            if name in ("__dict__", "__weakref__"):
+                continue
+            try:
+                value = object.__getattribute__(obj, name)
+            except AttributeError:
+                continue
+            size += _size(value, seen)
+    return size
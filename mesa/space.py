@@ -8,16 +8,22 @@ Objects used to add a spatial component to a model.
 Grid: base grid, a simple list-of-lists.
 SingleGrid: grid which strictly enforces one object per cell.
 MultiGrid: extension to Grid where each cell is a set of objects.
+Grid3D, MultiGrid3D: three-dimensional counterparts of Grid and MultiGrid.
+ContinuousSpace: continuous two-dimensional space.
+ContinuousSpace3D: continuous three-dimensional space.
 
 """
 # Instruction for PyLint to suppress variable name errors, since we have a
 # good reason to use one-character variable names for x and y.
 # pylint: disable=invalid-name
 
+from collections import OrderedDict
 import itertools
 import random
 import math
 
+import numpy as np
+
 # TODO: fix the global variables, they shouldn't be needed.
 RANDOM = -1
 X = 0
@@ -25,19 +31,146 @@ Y = 1
 
 
 def accept_tuple_argument(wrapped_function):
-    """ Decorator to allow grid methods that take a list of (x, y) position tuples
+    """ Decorator to allow grid methods that take a list of position tuples
     to also handle a single position, by automatically wrapping tuple in
     single-item list rather than forcing user to do it.
 
+    A single position is a tuple of coordinates, e.g. (x, y) or (x, y, z);
+    a tuple of position tuples is treated as a list of positions.
+
     """
     def wrapper(*args):
-        if isinstance(args[1], tuple) and len(args[1]) == 2:
+        if (isinstance(args[1], tuple) and args[1] and
+                not isinstance(args[1][0], tuple)):
             return wrapped_function(args[0], [args[1]])
         else:
             return wrapped_function(*args)
     return wrapper
 
 
+class _PositionIndex:
+    """ Reverse index from the agents in a space to their positions.
+
+    Positions are kept per agent object, so that an agent can be found and
+    removed without trusting its pos attribute, and also per unique_id, so
+    they can be looked up and exported in bulk. While the unique_ids seen are
+    dense non-negative integers, the latter live in a NumPy array indexed by
+    id; otherwise the index falls back to a dictionary.
+
+    """
+    def __init__(self, ndim, dtype):
+        self.ndim = ndim
+        self.dtype = dtype
+        self._positions = {}
+        self._array = np.zeros((16, ndim), dtype=dtype)
+        self._present = np.zeros(16, dtype=bool)
+        self._by_id = None
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, agent):
+        return agent in self._positions
+
+    def get(self, agent, default=None):
+        """ Return the position of an agent, or default if not indexed. """
+        return self._positions.get(agent, default)
+
+    def add(self, agent, pos):
+        """ Index an agent at a position, replacing any previous entry. A new
+        agent is registered with its model, if it has one (see
+        Model.register_agent()).
+
+        """
+        if agent not in self._positions:
+            register = getattr(getattr(agent, "model", None),
+                               "register_agent", None)
+            if register is not None:
+                register(agent)
+        self._positions[agent] = pos
+        uid = agent.unique_id
+        if self._by_id is None:
+            if self._is_dense(uid):
+                if uid >= len(self._present):
+                    self._grow(uid)
+                self._array[uid] = pos
+                self._present[uid] = True
+                return
+            self._use_dict()
+        self._by_id[uid] = pos
+
+    def pop(self, agent, default=None):
+        """ Remove an agent from the index and return its position. """
+        if agent not in self._positions:
+            return default
+        uid = agent.unique_id
+        if self._by_id is None:
+            self._present[uid] = False
+        else:
+            self._by_id.pop(uid, None)
+        return self._positions.pop(agent)
+
+    def position_of(self, unique_id):
+        """ Return the position of the agent with a given unique_id. """
+        if self._by_id is not None:
+            return self._by_id[unique_id]
+        if not (self._is_dense(unique_id) and
+                unique_id < len(self._present) and
+                self._present[unique_id]):
+            raise KeyError(unique_id)
+        return tuple(self._array[unique_id].tolist())
+
+    def positions_of(self, ids):
+        """ Return an array with one row per unique_id in ids. """
+        if self._by_id is not None:
+            rows = [self._by_id[uid] for uid in ids]
+            return np.array(rows, dtype=self.dtype).reshape(-1, self.ndim)
+        ids = np.asarray(ids)
+        if ids.size == 0:
+            return np.empty((0, self.ndim), dtype=self.dtype)
+        if ids.dtype.kind not in "iu":
+            raise KeyError("unique_ids are not indexed: {}".format(ids))
+        known = (ids >= 0) & (ids < len(self._present))
+        known[known] = self._present[ids[known]]
+        if not known.all():
+            raise KeyError("unique_ids are not indexed: {}".format(
+                ids[~known]))
+        return self._array[ids]
+
+    def export(self):
+        """ Return an array of unique_ids, and an array of their positions. """
+        if self._by_id is None:
+            ids = np.flatnonzero(self._present)
+            return ids, self._array[ids]
+        ids = np.empty(len(self._by_id), dtype=object)
+        ids[:] = list(self._by_id)
+        positions = np.array(list(self._by_id.values()), dtype=self.dtype)
+        return ids, positions.reshape(-1, self.ndim)
+
+    def _is_dense(self, uid):
+        """ Whether a unique_id can be used as an index into the array. """
+        return (isinstance(uid, (int, np.integer)) and
+                not isinstance(uid, bool) and
+                0 <= uid <= 8 * len(self._positions) + 1024)
+
+    def _grow(self, uid):
+        """ Grow the array so that it can hold the given unique_id. """
+        size = max(uid + 1, 2 * len(self._present))
+        array = np.zeros((size, self.ndim), dtype=self.dtype)
+        present = np.zeros(size, dtype=bool)
+        array[:len(self._array)] = self._array
+        present[:len(self._present)] = self._present
+        self._array = array
+        self._present = present
+
+    def _use_dict(self):
+        """ Switch the unique_id index from the array to a dictionary. """
+        self._by_id = {agent.unique_id: pos
+                       for agent, pos in self._positions.items()}
+        self._array = None
+        self._present = None
+
+
 class Grid:
     """ Base class for a square grid.
 
@@ -70,6 +203,22 @@ class Grid:
         identified in cell_list.
         remove_agent: Removes an agent from the grid.
         is_cell_empty: Returns a bool of the contents of a cell.
+        contains: Whether an agent has been placed on the grid.
+        position_of: Returns the position of an agent, by unique_id.
+        positions_of: Returns an array of positions for many unique_ids.
+        get_all_positions: Returns arrays of all unique_ids and positions.
+        pos_to_index, index_to_pos: Convert between positions and flat
+        cell indices.
+        neighbors_idx: Returns the flat indices of a neighborhood.
+        contents_at: Returns the contents of cells given by flat indices.
+
+    Cells can also be addressed by a flat index, x * height + y, which is the
+    order coord_iter visits them in. The flat index methods work on int32
+    NumPy arrays throughout, so hot loops don't need to build tuples.
+
+    Agents placed through place_agent (or position_agent / move_to_empty on
+    a SingleGrid) are tracked in a reverse index from agent to position, so
+    that they can be found and removed without passing their position.
 
     """
     def __init__(self, width, height, torus):
@@ -83,6 +232,10 @@ class Grid:
         self.height = height
         self.width = width
         self.torus = torus
+        self._shape = (width, height)
+        self._offsets = {}
+        self._offset_arrays = {}
+        self._index = _PositionIndex(2, int)
 
         self.grid = []
 
@@ -174,6 +327,41 @@ class Grid:
                     coordinates.add(coords)
                     yield coords
 
+    def neighborhood_offsets(self, moore, include_center=False, radius=1):
+        """ Return the relative offsets making up a neighborhood.
+
+        The offsets follow the same rules as iter_neighborhood: a Von Neumann
+        neighborhood only extends along the axes, and a Moore neighborhood
+        with a radius above 1 is cut off at that distance. The result is
+        computed once per combination of arguments and cached.
+
+        Args:
+            moore: If True, use the Moore neighborhood (including diagonals)
+                   If False, use the Von Neumann neighborhood
+            include_center: If True, include the zero offset as well.
+            radius: radius, in cells, of the neighborhood.
+
+        Returns:
+            A list of offset tuples, with one entry per grid dimension.
+
+        """
+        key = (moore, include_center, radius)
+        if key not in self._offsets:
+            offsets = []
+            span = range(-radius, radius + 1)
+            for offset in itertools.product(span, repeat=len(self._shape)):
+                nonzero = sum(d != 0 for d in offset)
+                if nonzero == 0 and not include_center:
+                    continue
+                if not moore and nonzero > 1:
+                    continue
+                if (moore and radius > 1 and
+                        sum(d ** 2 for d in offset) ** .5 > radius):
+                    continue
+                offsets.append(offset)
+            self._offsets[key] = offsets
+        return self._offsets[key]
+
     def get_neighborhood(self, pos, moore,
                          include_center=False, radius=1):
         """ Return a list of cells that are in the neighborhood of a
@@ -260,6 +448,106 @@ class Grid:
         x, y = pos
         return x < 0 or x >= self.width or y < 0 or y >= self.height
 
+    def pos_to_index(self, pos):
+        """ Convert positions to flat cell indices.
+
+        Args:
+            pos: A single coordinate tuple, or an array-like of them with one
+                 row per position.
+
+        Returns:
+            The flat index of the position, or an int32 array of them.
+
+        """
+        return np.dot(np.asarray(pos, dtype=np.int32),
+                      self._strides()).astype(np.int32)
+
+    def index_to_pos(self, idx):
+        """ Convert flat cell indices to positions.
+
+        Args:
+            idx: A flat cell index, or an array-like of them.
+
+        Returns:
+            An int32 array of coordinates, with one row per index if an array
+            was given.
+
+        """
+        coords = np.unravel_index(np.asarray(idx, dtype=np.int32),
+                                  self._shape)
+        return np.stack(coords, axis=-1).astype(np.int32)
+
+    def neighbors_idx(self, idx, moore=True, include_center=False, radius=1):
+        """ Return the flat indices of the neighborhood of cells.
+
+        Uses the same neighborhoods as iter_neighborhood, computed by adding
+        the cached offset table to the cells' coordinates.
+
+        Args:
+            idx: A flat cell index, or an array-like of them.
+            moore: If True, use the Moore neighborhood (including diagonals)
+                   If False, use the Von Neumann neighborhood
+            include_center: If True, include the cell itself as well.
+            radius: radius, in cells, of neighborhood to get.
+
+        Returns:
+            For a single index, an int32 array of the indices of the cells in
+            its neighborhood. For an array of N indices, an (N, K) int32 array
+            where each row holds the neighborhood of one cell, padded with -1
+            for offsets that fall off a non-toroidal grid. On a toroidal grid
+            smaller than the neighborhood, rows may repeat cells.
+
+        """
+        key = (moore, include_center, radius)
+        if key not in self._offset_arrays:
+            self._offset_arrays[key] = np.array(
+                self.neighborhood_offsets(moore, include_center, radius),
+                dtype=np.int32).reshape(-1, len(self._shape))
+        offsets = self._offset_arrays[key]
+
+        idx = np.asarray(idx, dtype=np.int32)
+        shape = np.array(self._shape, dtype=np.int32)
+        coords = np.stack(np.unravel_index(idx, self._shape), axis=-1)
+        cells = coords[..., np.newaxis, :] + offsets
+        if self.torus:
+            cells %= shape
+            neighbors = np.dot(cells, self._strides()).astype(np.int32)
+            if idx.ndim == 0 and 2 * radius + 1 > shape.min():
+                _, first = np.unique(neighbors, return_index=True)
+                neighbors = neighbors[np.sort(first)]
+            return neighbors
+        valid = ((cells >= 0) & (cells < shape)).all(axis=-1)
+        neighbors = np.dot(cells, self._strides()).astype(np.int32)
+        if idx.ndim == 0:
+            return neighbors[valid]
+        neighbors[~valid] = -1
+        return neighbors
+
+    def contents_at(self, idx):
+        """ Return the contents of the cells at the given flat indices.
+
+        Args:
+            idx: Array-like of flat cell indices, e.g. as returned by
+                 neighbors_idx. Negative (padding) indices are skipped.
+
+        Returns:
+            A list of the contents of the non-empty cells.
+
+        """
+        return [cell for cell in self._cells_at(idx) if cell is not None]
+
+    def _cells_at(self, idx):
+        """ Return the cells at the given flat indices, skipping padding. """
+        idx = np.asarray(idx, dtype=np.int32).ravel()
+        xs, ys = np.divmod(idx[idx >= 0], self.height)
+        grid = self.grid
+        return [grid[x][y] for x, y in zip(xs.tolist(), ys.tolist())]
+
+    def _strides(self):
+        """ Return the flat index step along each axis. """
+        strides = np.cumprod((self._shape[1:] + (1,))[::-1])[::-1]
+        return strides.astype(np.int32)
+
     @accept_tuple_argument
     def iter_cell_list_contents(self, cell_list):
         """
@@ -290,20 +578,94 @@ class Grid:
         Move an agent from its current position to a new position.
 
         Args:
-            agent: Agent object to move. Assumed to have its current location
-                   stored in a 'pos' tuple.
+            agent: Agent object to move. If it was not placed through
+                   place_agent, assumed to have its current location stored
+                   in a 'pos' tuple.
             pos: Tuple of new position to move the agent to.
 
+        Emits the agent_moved event of the agent's model (see
+        Model.subscribe()).
+
         """
-        self._remove_agent(agent.pos, agent)
+        old_pos = self._index.get(agent, agent.pos)
+        self._remove_agent(old_pos, agent)
         self._place_agent(pos, agent)
+        self._index.add(agent, pos)
         agent.pos = pos
+        _emit_moved(agent, old_pos, pos)
 
     def place_agent(self, agent, pos):
         """ Position an agent on the grid, and set its pos variable. """
         self._place_agent(pos, agent)
+        self._index.add(agent, pos)
         agent.pos = pos
 
+    def remove_agent(self, agent):
+        """ Remove an agent from the grid, and set its pos variable to None.
+
+        Args:
+            agent: Agent object to remove. If it was not placed through
+                   place_agent, assumed to have its current location stored
+                   in a 'pos' tuple.
+
+        """
+        self._remove_agent(self._index.pop(agent, agent.pos), agent)
+        agent.pos = None
+
+    def contains(self, agent):
+        """ Return True if the agent was placed on the grid. """
+        return agent in self._index
+
+    def position_of(self, unique_id):
+        """ Return the position of the agent with the given unique_id.
+
+        Raises a KeyError if no such agent was placed on the grid.
+
+        """
+        return self._index.position_of(unique_id)
+
+    def positions_of(self, ids):
+        """ Return the positions of many agents at once.
+
+        Args:
+            ids: Iterable of agent unique_ids.
+
+        Returns:
+            A NumPy array with one row of coordinates per unique_id. Raises a
+            KeyError if any of the agents was not placed on the grid.
+
+        """
+        return self._index.positions_of(ids)
+
+    def get_all_positions(self):
+        """ Return the positions of all the agents placed on the grid.
+
+        Returns:
+            A tuple of a NumPy array of unique_ids, and a NumPy array with the
+            matching row of coordinates for each of them.
+
+        """
+        return self._index.export()
+
+    def get_state(self):
+        """ Return the agents placed on the grid and their positions, for
+        snapshots (see mesa.checkpoint).
+
+        """
+        return {"agents": list(self._index._positions),
+                "positions": np.array(list(self._index._positions.values()),
+                                      dtype=int).reshape(-1, len(self._shape))}
+
+    def set_state(self, state):
+        """ Replace the agents on the grid with those of a state returned by
+        get_state().
+
+        """
+        for agent in list(self._index._positions):
+            self.remove_agent(agent)
+        for agent, pos in zip(state["agents"], state["positions"].tolist()):
+            self.place_agent(agent, tuple(pos))
+
     def _place_agent(self, pos, agent):
         """ Place the agent at the correct location. """
         x, y = pos
@@ -320,6 +682,34 @@ class Grid:
         return True if self.grid[x][y] == self.default_val() else False
 
 
+def _random_of(agent):
+    """ Return the random generator of an agent's model, or None. """
+    return getattr(getattr(agent, "model", None), "random", None)
+
+
+def _segment_dist_sq(point, delta, length_sq):
+    """ Squared distance from a point, relative to the start of a segment,
+    to the segment.
+
+    """
+    if length_sq > 0:
+        t = sum(p * d for p, d in zip(point, delta))
+        t = min(max(t / length_sq, 0), 1)
+    else:
+        t = 0
+    return sum((p - t * d) ** 2 for p, d in zip(point, delta))
+
+
+def _emit_moved(agent, old_pos, pos):
+    """ Emit the agent_moved event of an agent's model, if anything
+    subscribed to it.
+
+    """
+    model = getattr(agent, "model", None)
+    if getattr(model, "_event_handlers", None):
+        model.emit("agent_moved", agent, old_pos, pos)
+
+
 class SingleGrid(Grid):
     """ Grid where each cell contains exactly at most one object. """
     empties = []
@@ -338,20 +728,33 @@ class SingleGrid(Grid):
                             *(range(self.width), range(self.height))))
 
     def move_to_empty(self, agent):
-        """ Moves agent to a random empty cell, vacating agent's old cell. """
-        pos = agent.pos
-        new_pos = self.find_empty()
+        """ Moves agent to a random empty cell, vacating agent's old cell.
+        The cell is drawn from the random generator of the agent's model.
+        Emits the agent_moved event of the model.
+
+        """
+        pos = self._index.get(agent, agent.pos)
+        new_pos = self.find_empty(_random_of(agent))
         if new_pos is None:
             raise Exception("ERROR: No empty cells")
         else:
             self._place_agent(new_pos, agent)
+            self._index.add(agent, new_pos)
             agent.pos = new_pos
             self._remove_agent(pos, agent)
+            _emit_moved(agent, pos, new_pos)
+
+    def find_empty(self, generator=None):
+        """ Pick a random empty cell.
 
-    def find_empty(self):
-        """ Pick a random empty cell. """
+        Args:
+            generator: random.Random instance to draw the cell from, such as
+                       a model's random attribute; defaults to the random
+                       module.
+
+        """
         if self.exists_empty_cells():
-            pos = random.choice(self.empties)
+            pos = (generator or random).choice(self.empties)
             return pos
         else:
             return None
@@ -371,13 +774,14 @@ class SingleGrid(Grid):
 
         """
         if x == RANDOM or y == RANDOM:
-            coords = self.find_empty()
+            coords = self.find_empty(_random_of(agent))
             if coords is None:
                 raise Exception("ERROR: Grid full")
         else:
             coords = (x, y)
         agent.pos = coords
         self._place_agent(coords, agent)
+        self._index.add(agent, coords)
 
     def _place_agent(self, pos, agent):
         if self.is_cell_empty(pos):
@@ -398,7 +802,11 @@ class MultiGrid(Grid):
     bottom-left and [width-1][height-1] is the top-right. If a grid is
     toroidal, the top and bottom, and left and right, edges wrap to each other.
 
-    Each grid cell holds a set object.
+    Each grid cell holds an OrderedDict whose keys are the objects in it,
+    used as a set which keeps the order in which they were placed, so that
+    iterating over a cell does not depend on memory addresses, and runs with
+    the same seed are reproducible. Cells are not sets: use
+    cell.keys() for set operations.
 
     Properties:
         width, height: The grid's width and height.
@@ -413,17 +821,17 @@ class MultiGrid(Grid):
     @staticmethod
     def default_val():
         """ Default value for new cell elements. """
-        return set()
+        return OrderedDict()
 
     def _place_agent(self, pos, agent):
         """ Place the agent at the correct location. """
         x, y = pos
-        self.grid[x][y].add(agent)
+        self.grid[x][y][agent] = None
 
     def _remove_agent(self, pos, agent):
         """ Remove the agent from the given location. """
         x, y = pos
-        self.grid[x][y].remove(agent)
+        del self.grid[x][y][agent]
 
     @accept_tuple_argument
     def iter_cell_list_contents(self, cell_list):
@@ -438,13 +846,217 @@ class MultiGrid(Grid):
         return itertools.chain.from_iterable(
             self[x][y] for x, y in cell_list if not self.is_cell_empty((x, y)))
 
+    def contents_at(self, idx):
+        """ Return the contents of the cells at the given flat indices.
+
+        Args:
+            idx: Array-like of flat cell indices, e.g. as returned by
+                 neighbors_idx. Negative (padding) indices are skipped.
+
+        Returns:
+            A list of the objects in the cells.
+
+        """
+        return list(itertools.chain.from_iterable(self._cells_at(idx)))
+
+
+class Grid3D(Grid):
+    """ Base class for a three-dimensional grid.
+
+    Grid cells are indexed by [x][y][z], where [0][0][0] is assumed to be the
+    bottom-left-front corner and [width-1][height-1][depth-1] the top-right-
+    back one. If a grid is toroidal, opposite faces wrap to each other.
+
+    The API mirrors Grid, with positions given as (x, y, z) tuples, and the
+    flat index of cell (x, y, z) being (x * height + y) * depth + z. The
+    relative offsets making up each kind of neighborhood are computed once and
+    cached, so neighborhood lookups only add and wrap precomputed offsets.
+
+    Properties:
+        width, height, depth: The grid's size along the x, y and z axes.
+        torus: Boolean which determines whether to treat the grid as a torus.
+        grid: Internal list-of-lists-of-lists which holds the grid cells.
+
+    """
+    def __init__(self, width, height, depth, torus):
+        """ Create a new three-dimensional grid.
+
+        Args:
+            width, height, depth: The size of the grid along each axis.
+            torus: Boolean whether the grid wraps or not.
+
+        """
+        self.height = height
+        self.width = width
+        self.depth = depth
+        self.torus = torus
+        self._shape = (width, height, depth)
+        self._offsets = {}
+        self._offset_arrays = {}
+        self._index = _PositionIndex(3, int)
+
+        self.grid = []
+
+        for x in range(self.width):
+            col = []
+            for y in range(self.height):
+                col.append([self.default_val() for z in range(self.depth)])
+            self.grid.append(col)
+
+    def __iter__(self):
+        # chain all the columns of the grid together as if one list:
+        return itertools.chain.from_iterable(
+            itertools.chain.from_iterable(self.grid))
+
+    def coord_iter(self):
+        """ An iterator that returns coordinates as well as cell contents. """
+        for x in range(self.width):
+            for y in range(self.height):
+                for z in range(self.depth):
+                    yield self.grid[x][y][z], x, y, z    # agent, x, y, z
+
+    def iter_neighborhood(self, pos, moore,
+                          include_center=False, radius=1):
+        """ Return an iterator over cell coordinates that are in the
+        neighborhood of a certain point.
+
+        Args:
+            pos: (x, y, z) coordinate tuple for the neighborhood to get.
+            moore: If True, return Moore neighborhood
+                        (including diagonals)
+                   If False, return Von Neumann neighborhood
+                        (exclude diagonals)
+            include_center: If True, return the (x, y, z) cell as well.
+                            Otherwise, return surrounding cells only.
+            radius: radius, in cells, of neighborhood to get.
+
+        Returns:
+            An iterator of coordinate tuples representing the neighborhood;
+            With radius 1, at most 27 if Moore, 7 if Von Neumann (26 and 6
+            if not including the center).
+
+        """
+        x, y, z = pos
+        width, height, depth = self.width, self.height, self.depth
+        coordinates = set()
+        for dx, dy, dz in self.neighborhood_offsets(moore, include_center,
+                                                    radius):
+            px, py, pz = x + dx, y + dy, z + dz
+            if self.torus:
+                coords = (px % width, py % height, pz % depth)
+            elif (0 <= px < width and 0 <= py < height and
+                  0 <= pz < depth):
+                coords = (px, py, pz)
+            else:
+                continue
+            if coords not in coordinates:
+                coordinates.add(coords)
+                yield coords
+
+    def out_of_bounds(self, pos):
+        """
+        Determines whether position is off the grid, returns the out of
+        bounds coordinate.
+        """
+        x, y, z = pos
+        return (x < 0 or x >= self.width or y < 0 or y >= self.height or
+                z < 0 or z >= self.depth)
+
+    def _cells_at(self, idx):
+        """ Return the cells at the given flat indices, skipping padding. """
+        idx = np.asarray(idx, dtype=np.int32).ravel()
+        xs, ys, zs = np.unravel_index(idx[idx >= 0], self._shape)
+        grid = self.grid
+        return [grid[x][y][z]
+                for x, y, z in zip(xs.tolist(), ys.tolist(), zs.tolist())]
+
+    @accept_tuple_argument
+    def iter_cell_list_contents(self, cell_list):
+        """
+        Args:
+            cell_list: Array-like of (x, y, z) tuples, or single tuple.
+
+        Returns:
+            An iterator of the contents of the cells identified in cell_list
+
+        """
+        return (self.grid[x][y][z] for x, y, z in cell_list
+                if not self.is_cell_empty((x, y, z)))
+
+    def _place_agent(self, pos, agent):
+        """ Place the agent at the correct location. """
+        x, y, z = pos
+        self.grid[x][y][z] = agent
+
+    def _remove_agent(self, pos, agent):
+        """ Remove the agent from the given location. """
+        x, y, z = pos
+        self.grid[x][y][z] = None
+
+    def is_cell_empty(self, pos):
+        """ Returns a bool of the contents of a cell. """
+        x, y, z = pos
+        return self.grid[x][y][z] == self.default_val()
+
+
+class MultiGrid3D(Grid3D):
+    """ Three-dimensional grid where each cell can contain more than one
+    object.
+
+    Each grid cell holds an OrderedDict used as an ordered set, as in
+    MultiGrid.
+
+    """
+    @staticmethod
+    def default_val():
+        """ Default value for new cell elements. """
+        return OrderedDict()
+
+    def _place_agent(self, pos, agent):
+        """ Place the agent at the correct location. """
+        x, y, z = pos
+        self.grid[x][y][z][agent] = None
+
+    def _remove_agent(self, pos, agent):
+        """ Remove the agent from the given location. """
+        x, y, z = pos
+        del self.grid[x][y][z][agent]
+
+    @accept_tuple_argument
+    def iter_cell_list_contents(self, cell_list):
+        """
+        Args:
+            cell_list: Array-like of (x, y, z) tuples, or single tuple.
+
+        Returns:
+            A iterator of the contents of the cells identified in cell_list
+
+        """
+        return itertools.chain.from_iterable(
+            self.grid[x][y][z] for x, y, z in cell_list
+            if not self.is_cell_empty((x, y, z)))
+
+    def contents_at(self, idx):
+        """ Return the contents of the cells at the given flat indices.
+
+        Args:
+            idx: Array-like of flat cell indices, e.g. as returned by
+                 neighbors_idx. Negative (padding) indices are skipped.
+
+        Returns:
+            A list of the objects in the cells.
+
+        """
+        return list(itertools.chain.from_iterable(self._cells_at(idx)))
+
 
 class ContinuousSpace:
     """ Continuous space where each agent can have an arbitrary position.
 
     Assumes that all agents are point objects, and have a pos property storing
     their position as an (x, y) tuple. This class uses a MultiGrid internally
-    to store agent objects, to speed up neighborhood lookups.
+    to store agent objects, to speed up neighborhood lookups, and keeps a
+    reverse index from agent to position like Grid does.
 
     """
     _grid = None
@@ -478,6 +1090,7 @@ class ContinuousSpace:
         self.cell_height = (self.y_max - self.y_min) / grid_height
 
         self._grid = MultiGrid(grid_width, grid_height, torus)
+        self._index = _PositionIndex(2, float)
 
     def place_agent(self, agent, pos):
         """ Place a new agent in the space.
@@ -489,6 +1102,7 @@ class ContinuousSpace:
         """
         pos = self.torus_adj(pos)
         self._place_agent(pos, agent)
+        self._index.add(agent, pos)
         agent.pos = pos
 
     def move_agent(self, agent, pos):
@@ -498,11 +1112,82 @@ class ContinuousSpace:
             agent: The agent object to move.
             pos: Coordinate tuple to move the agent to.
 
+        Emits the agent_moved event of the agent's model (see
+        Model.subscribe()).
+
         """
         pos = self.torus_adj(pos)
-        self._remove_agent(agent.pos, agent)
+        old_pos = self._index.get(agent, agent.pos)
+        self._remove_agent(old_pos, agent)
         self._place_agent(pos, agent)
+        self._index.add(agent, pos)
         agent.pos = pos
+        _emit_moved(agent, old_pos, pos)
+
+    def remove_agent(self, agent):
+        """ Remove an agent from the space, and set its pos variable to None.
+
+        Args:
+            agent: The agent object to remove.
+
+        """
+        self._remove_agent(self._index.pop(agent, agent.pos), agent)
+        agent.pos = None
+
+    def contains(self, agent):
+        """ Return True if the agent was placed in the space. """
+        return agent in self._index
+
+    def position_of(self, unique_id):
+        """ Return the position of the agent with the given unique_id.
+
+        Raises a KeyError if no such agent was placed in the space.
+
+        """
+        return self._index.position_of(unique_id)
+
+    def positions_of(self, ids):
+        """ Return the positions of many agents at once.
+
+        Args:
+            ids: Iterable of agent unique_ids.
+
+        Returns:
+            A NumPy array with one row of coordinates per unique_id. Raises a
+            KeyError if any of the agents was not placed in the space.
+
+        """
+        return self._index.positions_of(ids)
+
+    def get_all_positions(self):
+        """ Return the positions of all the agents placed in the space.
+
+        Returns:
+            A tuple of a NumPy array of unique_ids, and a NumPy array with the
+            matching row of coordinates for each of them.
+
+        """
+        return self._index.export()
+
+    def get_state(self):
+        """ Return the agents placed in the space and their positions, for
+        snapshots (see mesa.checkpoint).
+
+        """
+        ndim = self._index.ndim
+        return {"agents": list(self._index._positions),
+                "positions": np.array(list(self._index._positions.values()),
+                                      dtype=float).reshape(-1, ndim)}
+
+    def set_state(self, state):
+        """ Replace the agents in the space with those of a state returned by
+        get_state().
+
+        """
+        for agent in list(self._index._positions):
+            self.remove_agent(agent)
+        for agent, pos in zip(state["agents"], state["positions"].tolist()):
+            self.place_agent(agent, tuple(pos))
 
     def _place_agent(self, pos, agent):
         """ Place an agent at a given point, and update the internal grid. """
@@ -559,6 +1244,115 @@ class ContinuousSpace:
             dy = min(d_y, self.height - d_y)
         return math.sqrt(dx ** 2 + dy ** 2)
 
+    def query_segment(self, p0, p1, width):
+        """ Get all objects within a certain distance of a line segment.
+
+        Only the internal grid cells that the segment (widened by the given
+        distance) passes through are searched, so the cost grows with the
+        length of the segment rather than with the area of a circle enclosing
+        it. This makes swept-volume collision checks for fast-moving agents
+        cheap. On a toroidal space the segment follows the shortest path from
+        p0 to p1, as get_distance does.
+
+        Args:
+            p0, p1: Coordinate tuples for the start and end of the segment.
+            width: Get all the objects within this distance of the segment.
+
+        """
+        p0 = self.torus_adj(p0)
+        p1 = self.torus_adj(p1)
+        axes = self._axes()
+        delta = [self._axis_offset(b - a, size)
+                 for a, b, (_, size, _, _) in zip(p0, p1, axes)]
+
+        # Walk the cells under the segment, then widen each by the radius.
+        start = [(a - lo) / cell for a, (lo, _, cell, _) in zip(p0, axes)]
+        end = [s + d / cell for s, d, (_, _, cell, _) in
+               zip(start, delta, axes)]
+        radii = [math.ceil(width / cell) for _, _, cell, _ in axes]
+        cells = set()
+        for cell in self._iter_segment_cells(start, end):
+            ranges = []
+            for c, r, (_, _, _, n_cells) in zip(cell, radii, axes):
+                if self.torus:
+                    ranges.append({i % n_cells
+                                   for i in range(c - r, c + r + 1)})
+                else:
+                    ranges.append(range(max(c - r, 0),
+                                        min(c + r + 1, n_cells)))
+            cells.update(itertools.product(*ranges))
+
+        # Measure candidates against the segment, centered on its midpoint
+        # so that toroidal wrapping picks the nearest image of each point.
+        # When the segment and width span over half the space on an axis,
+        # the nearest image to the midpoint may not be the nearest to the
+        # segment, so the images on either side are measured too.
+        mid = [a + d / 2 for a, d in zip(p0, delta)]
+        half = [d / 2 for d in delta]
+        length_sq = sum(d ** 2 for d in delta)
+        shifts = [(0, -size, size)
+                  if self.torus and abs(h) + width > size / 2 else (0,)
+                  for h, (_, size, _, _) in zip(half, axes)]
+        found = []
+        for obj in self._grid.iter_cell_list_contents(list(cells)):
+            rel = [self._axis_offset(q - m, size) for q, m, (_, size, _, _)
+                   in zip(obj.pos, mid, axes)]
+            for shift in itertools.product(*shifts):
+                image = [r + h + s for r, h, s in zip(rel, half, shift)]
+                if _segment_dist_sq(image, delta, length_sq) <= width ** 2:
+                    found.append(obj)
+                    break
+        return found
+
+    def _axes(self):
+        """ Return (min, size, cell size, cell count) for each axis. """
+        return [(self.x_min, self.width, self.cell_width, self._grid.width),
+                (self.y_min, self.height, self.cell_height,
+                 self._grid.height)]
+
+    def _axis_offset(self, offset, size):
+        """ Shortest offset along one axis, accounting for toroidal space. """
+        if self.torus:
+            offset %= size
+            if offset > size / 2:
+                offset -= size
+        return offset
+
+    @staticmethod
+    def _iter_segment_cells(start, end):
+        """ Iterate over the (unwrapped) cells a segment passes through.
+
+        Uses a grid traversal in the style of Amanatides and Woo, visiting
+        each crossed cell exactly once.
+
+        Args:
+            start, end: End points of the segment, in units of cells.
+
+        """
+        cell = [math.floor(s) for s in start]
+        last = [math.floor(e) for e in end]
+        steps, t_max, t_delta = [], [], []
+        for s, e, c in zip(start, end, cell):
+            d = e - s
+            if d > 0:
+                steps.append(1)
+                t_max.append((c + 1 - s) / d)
+                t_delta.append(1 / d)
+            elif d < 0:
+                steps.append(-1)
+                t_max.append((c - s) / d)
+                t_delta.append(-1 / d)
+            else:
+                steps.append(0)
+                t_max.append(math.inf)
+                t_delta.append(math.inf)
+        yield tuple(cell)
+        for _ in range(sum(abs(e - c) for e, c in zip(last, cell))):
+            axis = t_max.index(min(t_max))
+            cell[axis] += steps[axis]
+            t_max[axis] += t_delta[axis]
+            yield tuple(cell)
+
     def torus_adj(self, pos):
         """ Adjust coordinates to handle torus looping.
 
@@ -594,3 +1388,143 @@ class ContinuousSpace:
         x, y = pos
         return (x < self.x_min or x > self.x_max or
                 y < self.y_min or y > self.y_max)
+
+
+class ContinuousSpace3D(ContinuousSpace):
+    """ Continuous three-dimensional space where each agent can have an
+    arbitrary position.
+
+    Assumes that all agents are point objects, and have a pos property storing
+    their position as an (x, y, z) tuple. This class uses a MultiGrid3D
+    internally as a bucket index, to speed up neighborhood lookups.
+
+    """
+    def __init__(self, x_max, y_max, z_max, torus, x_min=0, y_min=0, z_min=0,
+                 grid_width=20, grid_height=20, grid_depth=20):
+        """ Create a new continuous three-dimensional space.
+
+        Args:
+            x_max, y_max, z_max: Maximum x, y and z coordinates for the space.
+            torus: Boolean for whether the edges loop around.
+            x_min, y_min, z_min: (default 0) If provided, set the minimum
+                                 coordinates for the space. Below them, values
+                                 loop to the other edge (if torus=True) or
+                                 raise an exception.
+            grid_width, _height, _depth: (default 20) Determine the size of
+                                         the internal storage grid.
+
+        """
+        self.x_min = x_min
+        self.x_max = x_max
+        self.width = x_max - x_min
+        self.y_min = y_min
+        self.y_max = y_max
+        self.height = y_max - y_min
+        self.z_min = z_min
+        self.z_max = z_max
+        self.depth = z_max - z_min
+        self.torus = torus
+
+        self.cell_width = self.width / grid_width
+        self.cell_height = self.height / grid_height
+        self.cell_depth = self.depth / grid_depth
+
+        self._grid = MultiGrid3D(grid_width, grid_height, grid_depth, torus)
+        self._index = _PositionIndex(3, float)
+
+    def get_neighbors(self, pos, radius, include_center=True):
+        """ Get all objects within a certain radius.
+
+        Args:
+            pos: (x, y, z) coordinate tuple to center the search at.
+            radius: Get all the objects within this distance of the center.
+            include_center: If True, include an object at the *exact* provided
+                            coordinates. i.e. if you are searching for the
+                            neighbors of a given agent, True will include that
+                            agent in the results.
+
+        """
+        # Get candidate objects from the block of cells around the center.
+        ranges = []
+        for c, (_, _, cell, n_cells) in zip(self._point_to_cell(pos),
+                                            self._axes()):
+            r = math.ceil(radius / cell)
+            if self.torus:
+                ranges.append({i % n_cells for i in range(c - r, c + r + 1)})
+            else:
+                ranges.append(range(max(c - r, 0), min(c + r + 1, n_cells)))
+        possible_objs = self._grid.iter_cell_list_contents(
+            list(itertools.product(*ranges)))
+        neighbors = []
+        # Iterate over candidates and check actual distance.
+        for obj in possible_objs:
+            dist = self.get_distance(pos, obj.pos)
+            if dist <= radius and (include_center or dist > 0):
+                neighbors.append(obj)
+        return neighbors
+
+    def get_distance(self, pos_1, pos_2):
+        """ Get the distance between two point, accounting for toroidal space.
+
+        Args:
+            pos_1, pos_2: Coordinate tuples for both points.
+
+        """
+        x1, y1, z1 = pos_1
+        x2, y2, z2 = pos_2
+        if not self.torus:
+            dx = x1 - x2
+            dy = y1 - y2
+            dz = z1 - z2
+        else:
+            d_x = abs(x1 - x2)
+            d_y = abs(y1 - y2)
+            d_z = abs(z1 - z2)
+            dx = min(d_x, self.width - d_x)
+            dy = min(d_y, self.height - d_y)
+            dz = min(d_z, self.depth - d_z)
+        return math.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
+
+    def _axes(self):
+        """ Return (min, size, cell size, cell count) for each axis. """
+        return super()._axes() + [(self.z_min, self.depth, self.cell_depth,
+                                   self._grid.depth)]
+
+    def torus_adj(self, pos):
+        """ Adjust coordinates to handle torus looping.
+
+        If the coordinate is out-of-bounds and the space is toroidal, return
+        the corresponding point within the space. If the space is not toroidal,
+        raise an exception.
+
+        Args:
+            pos: Coordinate tuple to convert.
+
+        """
+        if not self.out_of_bounds(pos):
+            return pos
+        elif not self.torus:
+            raise Exception("Point out of bounds, and space non-toroidal.")
+        else:
+            x = self.x_min + ((pos[0] - self.x_min) % self.width)
+            y = self.y_min + ((pos[1] - self.y_min) % self.height)
+            z = self.z_min + ((pos[2] - self.z_min) % self.depth)
+            return (x, y, z)
+
+    def _point_to_cell(self, pos):
+        """ Get the cell coordinates that a given x,y,z point falls in. """
+        if self.out_of_bounds(pos):
+            raise Exception("Point out of bounds.")
+
+        x, y, z = pos
+        cell_x = math.floor((x - self.x_min) / self.cell_width)
+        cell_y = math.floor((y - self.y_min) / self.cell_height)
+        cell_z = math.floor((z - self.z_min) / self.cell_depth)
+        return (cell_x, cell_y, cell_z)
+
+    def out_of_bounds(self, pos):
+        """ Check if a point is out of bounds. """
+        x, y, z = pos
+        return (x < self.x_min or x > self.x_max or
+                y < self.y_min or y > self.y_max or
+                z < self.z_min or z > self.z_max)
@@ -19,14 +19,32 @@ Key concepts:
 
     Time: Some models may simulate a continuous 'clock' instead of discrete
     steps. However, by default, the Time is equal to the number of steps the
-    model has taken.
+    model has taken. The DiscreteEventScheduler instead jumps the clock from
+    one scheduled event to the next.
 
 
-TODO: Have the schedulers use the model's randomizer, to keep random number
-seeds consistent and allow for replication.
+Schedulers draw activation orders from the model's own random number
+generators (its rng and random attributes), so that runs can be replicated
+from the model's seed, and several models can run side by side with
+independent streams. Models which do not have them fall back on the random
+module.
 
 """
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import heapq
+import multiprocessing
+from operator import itemgetter, methodcaller
+import os
 import random
+from types import FunctionType
+import weakref
+
+import numpy as np
+
+from .agentset import AgentSet
+from .profiling import SchedulerProfiler
 
 
 class BaseScheduler:
@@ -37,49 +55,449 @@ class BaseScheduler:
 
     (This is explicitly meant to replicate the scheduler in MASON).
 
+    Agents are kept in an insertion-ordered dictionary, so adding, removing
+    and checking for an agent take constant time, while iteration follows the
+    order agents were added in. Each agent can be in the schedule only once.
+
+    Agents added or removed while the schedule is stepping are not applied to
+    it straight away. A removed agent is flagged as dead, so it is skipped if
+    its turn comes later in the step, and an added agent waits; both changes
+    are applied in one pass when the step ends, so new agents are first
+    activated in the following step.
+
+    Agents which have nothing to do can be put to sleep, either until a given
+    step or until they are woken up, e.g. by another agent. Sleeping agents
+    stay in the schedule, but are not iterated over, so a step only costs time
+    for the agents that are awake. Timed wake-ups are kept on a hierarchical
+    timer wheel. An agent woken during a step is activated from the next step
+    on; agents keep their usual place in the activation order.
+
+    Agents which only need to act every so often can be given an activation
+    period and phase, when added or as (class) attributes activation_period
+    and activation_phase. Such an agent is activated in the steps whose
+    number modulo its period equals its phase, and sleeps in between, so it
+    costs nothing in the other steps.
+
+    Removed agents whose class is pooled by the model are handed back to it,
+    once the removal is applied, to be reused (see Model.enable_pool()).
+
+    Adding and removing agents, and finishing a step, emit the model's
+    agent_added, agent_removed and step_end events (see Model.subscribe()).
+
+    Steps can be profiled, by calling enable_profiling(); the time (and
+    optionally memory) spent activating agents is then recorded per step,
+    stage and agent class.
+
+    An AgentSet can be added like an agent: it takes a single turn, in which
+    its vectorized step() updates all of its agents at once. The agents list
+    and agent count include the individual agents of each set, as views.
+
     """
     model = None
     steps = 0
     time = 0
-    agents = []
+    profiler = None
 
     def __init__(self, model):
         """ Create a new, empty BaseScheduler. """
         self.model = model
         self.steps = 0
         self.time = 0
-        self.agents = []
+        self._agents = OrderedDict()  # agent -> False once removed mid-step
+        self._stepping = False
+        self._pending = []
+        self._pending_added = set()  # agents added during the step
+        self._dead = 0
+        self._agentsets = OrderedDict()
+        self._active = OrderedDict()  # awake agent -> insertion number
+        self._inserted = 0
+        self._asleep = {}  # agent -> (wake-up step or None, insertion number)
+        self._wheel = _TimerWheel()
+        self._woken = []  # agents woken since the order was last restored
+        self._periods = {}  # agent -> (period, phase), for periodic agents
+        self._periodic_awake = []
+        self._periodic_due = []
+        self.profiler = None
 
-    def add(self, agent):
+    @property
+    def agents(self):
+        """ A list of the agents in the schedule, in the order they were
+        added, with the agents of each AgentSet in its place.
+
+        """
+        entries = self._entries()
+        if not self._agentsets:
+            return entries
+        agents = []
+        for entry in entries:
+            if isinstance(entry, AgentSet):
+                agents.extend(entry)
+            else:
+                agents.append(entry)
+        return agents
+
+    def add(self, agent, period=None, phase=None):
         """ Add an Agent object to the schedule.
 
         Args:
             agent: An Agent to be added to the schedule. NOTE: The agent must
             have a step() method.
+            period: Activate the agent only every period steps; defaults to
+                    the agent's activation_period attribute, if any, or 1.
+            phase: Activate the agent in the steps whose number modulo the
+                   period equals phase; defaults to the agent's
+                   activation_phase attribute, if any, or 0.
+
+        The agent is registered with the model by its unique_id (see
+        Model.register_agent()).
 
         """
-        self.agents.append(agent)
+        if period is None:
+            period = getattr(agent, "activation_period", 1)
+        if phase is None:
+            phase = getattr(agent, "activation_phase", 0)
+        if period < 1:
+            raise ValueError("Activation periods must be at least 1.")
+        is_agent = not isinstance(agent, AgentSet)
+        register = getattr(self.model, "register_agent", None)
+        if register is not None and is_agent:
+            register(agent)
+        added = (is_agent and not self.contains(agent) and
+                 agent not in self._pending_added)
+        if self._stepping:
+            self._pending.append((agent, (period, phase % period)))
+            if added:
+                self._pending_added.add(agent)
+        else:
+            self._insert(agent, period, phase % period)
+        if added:
+            self._emit("agent_added", agent)
 
     def remove(self, agent):
-        """ Remove all instances of a given agent from the schedule.
+        """ Remove an agent from the schedule, if present.
 
         Args:
             agent: An agent object.
 
         """
-        while agent in self.agents:
-            self.agents.remove(agent)
+        if not self._stepping:
+            if agent in self._agents:
+                self._discard(agent)
+                if not isinstance(agent, AgentSet):
+                    self._emit("agent_removed", agent)
+                self._release(agent)
+            return
+        if self._agents.get(agent):
+            self._agents[agent] = False
+            self._dead += 1
+            self._active.pop(agent, None)
+            if not isinstance(agent, AgentSet):
+                self._emit("agent_removed", agent)
+        elif agent in self._pending_added:
+            # Added earlier in the step; its addition is cancelled.
+            self._pending_added.discard(agent)
+            self._emit("agent_removed", agent)
+        self._pending.append((agent, None))
+
+    def contains(self, agent):
+        """ Return True if the agent is in the schedule (and, during a step,
+        has not been removed from it).
+
+        """
+        return self._agents.get(agent, False)
+
+    def sleep(self, agent, until=None):
+        """ Stop activating an agent in the schedule for a while.
+
+        Args:
+            agent: An agent in the schedule.
+            until: Step number (as counted by steps) at which the agent is
+                   activated again; if None, the agent sleeps until it is
+                   woken up by wake(). A step which has already started
+                   leaves the agent awake.
+
+        """
+        if until is not None and until <= self.steps:
+            return
+        if agent in self._active:
+            self._asleep[agent] = (until, self._active.pop(agent))
+        elif agent in self._asleep:
+            self._asleep[agent] = (until, self._asleep[agent][1])
+        else:
+            return
+        if until is not None:
+            self._wheel.add(agent, until)
+
+    def wake(self, agent):
+        """ Wake up a sleeping agent, to be activated again from the next
+        step on (or from the current one, if it has not started yet).
+
+        """
+        if agent in self._asleep:
+            self._active[agent] = self._asleep.pop(agent)[1]
+            self._woken.append(agent)
+            if agent in self._periods:
+                self._periodic_awake.append(agent)
+
+    def is_asleep(self, agent):
+        """ Return True if the agent is in the schedule and sleeping. """
+        return agent in self._asleep
 
     def step(self):
         """ Execute the step of all the agents, one at a time. """
-        for agent in self.agents:
-            agent.step()
+        self._begin_step()
+        agents = self._active_entries()
+        self._activate(agents)
+        self._end_step()
         self.steps += 1
         self.time += 1
 
+    def _activate(self, agents, stage="step"):
+        """ Call a stage method of each of the agents which are still awake,
+        through the profiler if there is one.
+
+        """
+        active = self._active
+        if self.profiler is not None:
+            self.profiler.run(agents, stage, active)
+        elif stage == "step":
+            for agent in agents:
+                if agent in active:
+                    agent.step()
+        else:
+            for agent in agents:
+                if agent in active:
+                    getattr(agent, stage)()
+
+    def enable_profiling(self, memory=False, callback=None):
+        """ Start profiling the schedule's steps, replacing any previous
+        profiler.
+
+        Args:
+            memory: If True, also record changes in traced memory (slow).
+            callback: Function to call with a summary after each step.
+
+        Returns:
+            The SchedulerProfiler, which holds the records.
+
+        """
+        self.disable_profiling()
+        self.profiler = SchedulerProfiler(memory, callback)
+        self.profiler.start()
+        return self.profiler
+
+    def disable_profiling(self):
+        """ Stop profiling, and return the profiler (or None). """
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler.stop()
+        return profiler
+
     def get_agent_count(self):
         """ Returns the current number of agents in the queue. """
-        return len(self.agents)
+        count = len(self._agents) - self._dead
+        for agentset in self._agentsets:
+            if self._agents[agentset]:
+                count += len(agentset) - 1
+        return count
+
+    def get_state(self):
+        """ Return the state of the schedule, for snapshots (see
+        mesa.checkpoint). The agents themselves are not copied.
+
+        """
+        return {"agents": self._entries(),
+                "steps": self.steps,
+                "time": self.time,
+                "periods": dict(self._periods),
+                "asleep": {agent: until
+                           for agent, (until, _) in self._asleep.items()}}
+
+    def set_state(self, state):
+        """ Replace the agents and clock of the schedule with those of a
+        state returned by get_state().
+
+        """
+        for agent in list(self._agents):
+            self._discard(agent)
+        self._stepping = False
+        self._pending = []
+        self._pending_added = set()
+        self._dead = 0
+        self.steps = state["steps"]
+        self.time = state["time"]
+        self._wheel = _TimerWheel(start=self.steps)
+        self._periodic_awake = []
+        self._periodic_due = []
+        periods = state["periods"]
+        for agent in state["agents"]:
+            self._insert(agent, *periods.get(agent, (1, 0)))
+        for agent, until in state["asleep"].items():
+            self.sleep(agent, until)
+
+    def get_agent_values(self, name):
+        """ Return a list of (unique_id, value) pairs of an attribute of
+        all the agents, in schedule order. The values for an AgentSet are read
+        from its column directly.
+
+        Args:
+            name: Name of the attribute.
+
+        """
+        records = []
+        for entry in self._entries():
+            if isinstance(entry, AgentSet):
+                records.extend(zip(entry.ids, entry.values(name)))
+            else:
+                records.append((entry.unique_id, getattr(entry, name)))
+        return records
+
+    def _entries(self):
+        """ Return the live entries (agents and AgentSets) of the schedule,
+        in order.
+
+        """
+        if self._dead:
+            return [agent for agent, alive in self._agents.items() if alive]
+        return list(self._agents)
+
+    def _shuffled(self, agents):
+        """ Return a list of the agents in random order, leaving the given
+        list as it is.
+
+        The order is drawn as an index permutation from the model's NumPy
+        Generator (its rng attribute), so that each model has its own
+        reproducible stream; models without one fall back on their random
+        attribute, or the random module.
+
+        """
+        rng = getattr(self.model, "rng", None)
+        if rng is None:
+            agents = list(agents)
+            self._random().shuffle(agents)
+            return agents
+        return [agents[i] for i in rng.permutation(len(agents))]
+
+    def _random(self):
+        """ Return the model's random.Random, or the random module if the
+        model has none.
+
+        """
+        return getattr(self.model, "random", random)
+
+    def _active_entries(self):
+        """ Return the entries which are awake, in order. """
+        if self._woken:
+            # Agents woken up were appended at the end; merge them back into
+            # the insertion order, which the other agents are still in.
+            active = self._active
+            woken = set(agent for agent in self._woken if agent in active)
+            self._woken = []
+            rest = ((number, agent) for agent, number in active.items()
+                    if agent not in woken)
+            merged = heapq.merge(
+                rest, sorted(((active[agent], agent) for agent in woken),
+                             key=itemgetter(0)),
+                key=itemgetter(0))
+            self._active = OrderedDict(
+                (agent, number) for number, agent in merged)
+        return list(self._active)
+
+    def _insert(self, agent, period=1, phase=0, start=None):
+        """ Add an agent or AgentSet to the schedule right away; a periodic
+        agent is first activated in the step it is due in from start on
+        (by default, the current step).
+
+        """
+        if agent in self._agents:
+            return
+        self._agents[agent] = True
+        self._active[agent] = self._inserted
+        self._inserted += 1
+        if isinstance(agent, AgentSet):
+            self._agentsets[agent] = True
+        if period > 1:
+            self._periods[agent] = (period, phase)
+            if start is None:
+                start = self.steps
+            due = self._next_due(agent, start)
+            if due == start:
+                self._periodic_awake.append(agent)
+            else:
+                self.sleep(agent, due)
+
+    def _next_due(self, agent, start):
+        """ Return the first step from start on in which a periodic agent
+        is due.
+
+        """
+        period, phase = self._periods[agent]
+        return start + (phase - start) % period
+
+    def _discard(self, agent):
+        """ Remove an agent or AgentSet from the schedule right away. """
+        self._agents.pop(agent, None)
+        self._agentsets.pop(agent, None)
+        self._active.pop(agent, None)
+        self._asleep.pop(agent, None)
+        self._periods.pop(agent, None)
+
+    def _begin_step(self):
+        """ Wake the agents due this step, and start buffering additions and
+        removals until _end_step.
+
+        """
+        if self.profiler is not None:
+            self.profiler.begin_step()
+        for agent, until in self._wheel.pop_due(self.steps):
+            # Skip stale entries, for agents woken or put back to sleep.
+            if self._asleep.get(agent, (None,))[0] == until:
+                self.wake(agent)
+        # Periodic agents are put back to sleep until they are next due once
+        # this step ends.
+        self._periodic_due = self._periodic_awake
+        self._periodic_awake = []
+        self._stepping = True
+
+    def _end_step(self):
+        """ Apply the additions and removals made since _begin_step, in the
+        order they were made.
+
+        """
+        self._stepping = False
+        removed = []
+        for agent in self._periodic_due:
+            if agent in self._active and agent in self._periods:
+                self.sleep(agent, self._next_due(agent, self.steps + 1))
+        self._periodic_due = []
+        for agent, timing in self._pending:
+            if timing is None:
+                if agent in self._agents:
+                    self._discard(agent)
+                    removed.append(agent)
+            else:
+                # Agents added during the step wait for the next one.
+                self._insert(agent, *timing, start=self.steps + 1)
+        self._pending = []
+        self._pending_added = set()
+        self._dead = 0
+        for agent in removed:
+            if agent not in self._agents:  # Not added back.
+                self._release(agent)
+        if self.profiler is not None:
+            self.profiler.end_step(self.steps)
+        self._emit("step_end", self.model)
+
+    def _emit(self, event, *args):
+        """ Emit an event of the model, if anything subscribed to one. """
+        if getattr(self.model, "_event_handlers", None):
+            self.model.emit(event, *args)
+
+    def _release(self, agent):
+        """ Hand a removed agent back to the model, to be pooled. """
+        release = getattr(self.model, "release_agent", None)
+        if release is not None and not isinstance(agent, AgentSet):
+            release(agent)
 
 
 class RandomActivation(BaseScheduler):
@@ -97,12 +515,172 @@ class RandomActivation(BaseScheduler):
         random order.
 
         """
-        random.shuffle(self.agents)
-        for agent in self.agents:
-            agent.step()
+        self._begin_step()
+        agents = self._shuffled(self._active_entries())
+        self._activate(agents)
+        self._end_step()
+        self.steps += 1
+        self.time += 1
+
+
+class RandomActivationByBreed(RandomActivation):
+    """ A scheduler which activates each breed (type) of agent in turn, with
+    the agents of each breed activated once per step, in random order.
+
+    This is equivalent to the NetLogo 'ask breed...'.
+
+    Agents are also kept in a container per breed, so adding, removing and
+    counting the agents of a breed take constant time; in particular, breed
+    counts can be reported to a DataCollector every step without scanning
+    the agents. The awake agents of each breed are kept apart too, so that
+    sleeping agents cost nothing in a step.
+
+    Assumes that all agents have a step() method.
+
+    """
+    def __init__(self, model, breed_order=None, breed_of=type):
+        """ Create an empty Random Activation By Breed schedule.
+
+        Args:
+            model: Model object associated with the schedule.
+            breed_order: Order to activate the breeds in: None for the order
+                         they were first added in; a list of breeds, which
+                         come first, in that order; or "random", to shuffle
+                         the breeds every step.
+            breed_of: Function returning the breed of an agent; by default,
+                      its class.
+
+        """
+        super().__init__(model)
+        self.breed_order = breed_order
+        self.breed_of = breed_of
+        self.agents_by_breed = OrderedDict()  # breed -> OrderedDict of agents
+        self._removed_by_breed = {}
+        # breed -> OrderedDict of awake agent -> insertion number
+        self._awake_by_breed = {}
+        self._woken_breeds = set()  # breeds with agents woken since sorted
+
+    def remove(self, agent):
+        """ Remove an agent from the schedule, if present. """
+        removed = self._stepping and self.contains(agent)
+        if removed:
+            breed = self.breed_of(agent)
+            self._removed_by_breed[breed] = (
+                self._removed_by_breed.get(breed, 0) + 1)
+        super().remove(agent)
+        if removed:
+            self._pop_awake(agent)
+
+    def sleep(self, agent, until=None):
+        """ Stop activating an agent in the schedule for a while (see
+        BaseScheduler.sleep()).
+
+        """
+        super().sleep(agent, until)
+        if agent in self._asleep:
+            self._pop_awake(agent)
+
+    def wake(self, agent):
+        """ Wake up a sleeping agent (see BaseScheduler.wake()). """
+        if agent in self._asleep:
+            super().wake(agent)
+            breed = self.breed_of(agent)
+            awake = self._awake_by_breed.setdefault(breed, OrderedDict())
+            awake[agent] = self._active[agent]
+            self._woken_breeds.add(breed)
+
+    def step(self, by_breed=True):
+        """ Executes the step of each agent breed, one at a time, in random
+        order.
+
+        Args:
+            by_breed: If True, run all agents of a single breed before running
+                      the next one.
+
+        """
+        if not by_breed:
+            super().step()
+            return
+        self._begin_step()
+        for breed in self.get_breed_order():
+            self.step_breed(breed)
+        self._end_step()
         self.steps += 1
         self.time += 1
 
+    def step_breed(self, breed):
+        """ Shuffle order and run all agents of a given breed.
+
+        Args:
+            breed: The breed to run (by default, a class).
+
+        """
+        awake = self._awake_by_breed.get(breed, ())
+        if breed in self._woken_breeds:
+            # Agents woken up were appended at the end; sort them back into
+            # the insertion order.
+            self._woken_breeds.discard(breed)
+            awake = self._awake_by_breed[breed] = OrderedDict(
+                sorted(awake.items(), key=itemgetter(1)))
+        self._activate(self._shuffled(list(awake)))
+
+    def get_breed_order(self):
+        """ Return the list of breeds, in the order to activate them in. """
+        breeds = list(self.agents_by_breed)
+        if self.breed_order == "random":
+            return self._shuffled(breeds)
+        if self.breed_order is None:
+            return breeds
+        first = [breed for breed in self.breed_order
+                 if breed in self.agents_by_breed]
+        return first + [breed for breed in breeds if breed not in first]
+
+    def get_breed_count(self, breed):
+        """ Returns the current number of agents of a certain breed in the
+        queue.
+
+        """
+        return (len(self.agents_by_breed.get(breed, ())) -
+                self._removed_by_breed.get(breed, 0))
+
+    def get_breed_counts(self):
+        """ Returns a dictionary of the current number of agents of each
+        breed.
+
+        """
+        return {breed: self.get_breed_count(breed)
+                for breed in self.agents_by_breed}
+
+    def _insert(self, agent, *args, **kwargs):
+        """ Add an agent to the schedule and its breed right away. """
+        if agent in self._agents:
+            return
+        breed = self.breed_of(agent)
+        self.agents_by_breed.setdefault(breed, OrderedDict())[agent] = True
+        super()._insert(agent, *args, **kwargs)
+        if agent in self._active:  # Periodic agents may not be due yet.
+            awake = self._awake_by_breed.setdefault(breed, OrderedDict())
+            awake[agent] = self._active[agent]
+
+    def _discard(self, agent):
+        """ Remove an agent from the schedule and its breed right away. """
+        if agent in self._agents:
+            breed = self.breed_of(agent)
+            self.agents_by_breed[breed].pop(agent, None)
+            self._awake_by_breed.get(breed, {}).pop(agent, None)
+        super()._discard(agent)
+
+    def _pop_awake(self, agent):
+        """ Take an agent out of the awake agents of its breed. """
+        awake = self._awake_by_breed.get(self.breed_of(agent))
+        if awake:
+            awake.pop(agent, None)
+
+    def _end_step(self):
+        """ Apply the changes made during the step, breed counts included. """
+        self._removed_by_breed = {}
+        super()._end_step()
+
 
 class SimultaneousActivation(BaseScheduler):
     """ A scheduler to simulate the simultaneous activation of all the agents.
@@ -114,14 +692,162 @@ class SimultaneousActivation(BaseScheduler):
     """
     def step(self):
         """ Step all agents, then advance them. """
-        for agent in self.agents:
-            agent.step()
-        for agent in self.agents:
-            agent.advance()
+        self._begin_step()
+        agents = self._active_entries()
+        self._activate(agents)
+        self._activate(agents, "advance")
+        self._end_step()
         self.steps += 1
         self.time += 1
 
 
+class ParallelSimultaneousActivation(SimultaneousActivation):
+    """ A simultaneous activation scheduler which runs the step phase in
+    parallel.
+
+    Since step() may only stage changes without applying them, the agents can
+    be split into chunks and stepped concurrently; advance() then runs in the
+    main process, one agent at a time, as in SimultaneousActivation.
+
+    Two backends are available:
+        thread: Chunks are stepped by a pool of threads sharing the model.
+                This only pays off when step() releases the GIL, e.g. in
+                NumPy-heavy code.
+        process: Each step, worker processes are forked from the current
+                 state of the model and step their chunks of agents. The
+                 values of the agents' staged attributes (which must be
+                 picklable) are sent back and set on the original agents
+                 before advance() is called. Each chunk reseeds the model's
+                 generators (and the random module) in its process, from its
+                 own seed spawned from the model (see Model.spawn_seeds()).
+                 Needs a platform where processes can be forked.
+
+    The thread pool is shut down by close(), at the end of a with block
+    using the schedule, or when the schedule is garbage collected.
+
+    """
+    def __init__(self, model, workers=None, backend="thread", staged=(),
+                 chunks_per_worker=4):
+        """ Create an empty Parallel Simultaneous Activation schedule.
+
+        Args:
+            model: Model object associated with the schedule.
+            workers: Number of threads or processes; defaults to the number
+                     of CPUs.
+            backend: "thread" or "process".
+            staged: Names of the attributes step() stages its changes in,
+                    e.g. ["_next_state"]; needed by the process backend.
+            chunks_per_worker: Number of chunks to split the agents into per
+                               worker, to even out the load.
+
+        """
+        super().__init__(model)
+        if backend not in ("thread", "process"):
+            raise ValueError("Unknown backend: {}".format(backend))
+        if (backend == "process" and
+                "fork" not in multiprocessing.get_all_start_methods()):
+            raise ValueError("The process backend needs os.fork().")
+        self.workers = workers or os.cpu_count() or 1
+        self.backend = backend
+        self.staged = tuple(staged)
+        self.chunks_per_worker = chunks_per_worker
+        self._executor = None
+        self._finalizer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def step(self):
+        """ Step all agents in parallel, then advance them. """
+        self._begin_step()
+        agents = self._active_entries()
+        n_chunks = max(1, min(len(agents),
+                              self.workers * self.chunks_per_worker))
+        bounds = [(len(agents) * i // n_chunks,
+                   len(agents) * (i + 1) // n_chunks)
+                  for i in range(n_chunks)]
+        if self.backend == "thread":
+            self._step_threads(agents, bounds)
+        else:
+            self._step_processes(agents, bounds)
+        self._activate(agents, "advance")
+        self._end_step()
+        self.steps += 1
+        self.time += 1
+
+    def close(self):
+        """ Shut down the worker threads, if any. """
+        if self._executor is not None:
+            self._finalizer.detach()
+            self._executor.shutdown()
+            self._executor = None
+
+    def _step_threads(self, agents, bounds):
+        """ Step chunks of agents on the thread pool. """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+            # Shut the threads down if the schedule is dropped unclosed.
+            self._finalizer = weakref.finalize(
+                self, self._executor.shutdown, wait=False)
+        futures = [self._executor.submit(_step_agents, agents[start:end])
+                   for start, end in bounds]
+        for future in futures:
+            future.result()
+
+    def _step_processes(self, agents, bounds):
+        """ Step chunks of agents in forked processes, and copy the staged
+        attributes back.
+
+        """
+        global _FORKED_AGENTS
+        spawn_seeds = getattr(self.model, "spawn_seeds", None)
+        if spawn_seeds is None:
+            seeds = np.random.SeedSequence(
+                self._random().getrandbits(64)).spawn(len(bounds))
+        else:
+            seeds = spawn_seeds(len(bounds))
+        _FORKED_AGENTS = (self.model, agents, self.staged)
+        try:
+            context = multiprocessing.get_context("fork")
+            with context.Pool(min(self.workers, len(bounds))) as pool:
+                results = pool.map(_step_forked_agents,
+                                   [b + (seed,) for b, seed in
+                                    zip(bounds, seeds)])
+        finally:
+            _FORKED_AGENTS = None
+        for (start, end), staged_values in zip(bounds, results):
+            for agent, values in zip(agents[start:end], staged_values):
+                for name, value in zip(self.staged, values):
+                    setattr(agent, name, value)
+
+
+# Model, agents and staged attribute names shared with forked worker
+# processes.
+_FORKED_AGENTS = None
+
+
+def _step_agents(agents):
+    """ Call step() on each agent. """
+    for agent in agents:
+        agent.step()
+
+
+def _step_forked_agents(task):
+    """ Step a chunk of the forked agents, and return their staged values. """
+    start, end, seed = task
+    model, agents, staged = _FORKED_AGENTS
+    if hasattr(model, "reseed"):
+        model.reseed(seed)
+    random.seed(seed.generate_state(3, np.uint64).tolist()[2])
+    chunk = agents[start:end]
+    _step_agents(chunk)
+    return [tuple(getattr(agent, name) for name in staged)
+            for agent in chunk]
+
+
 class StagedActivation(BaseScheduler):
     """ A scheduler which allows agent activation to be divided into several
     stages instead of a single `step` method. All agents execute one stage
@@ -130,6 +856,18 @@ class StagedActivation(BaseScheduler):
     Agents must have all the stage methods implemented. Stage methods take a
     model object as their only argument.
 
+    Stage methods are looked up once per agent class and stage, and cached
+    until agents are next added; stages set on an agent itself
+    (agent.stage_one = ...) are looked up once, when the agent is added, and
+    take precedence over its class's. After patching the stages of a class,
+    or setting stages on agents already in the schedule, call
+    clear_stage_cache() for the changes to apply.
+
+    A class can also implement a stage as a classmethod, which takes a list
+    of all the agents of that class; it is called once per stage, after the
+    stage has run for the agents with ordinary stage methods, so the work for
+    the whole class can be batched.
+
     This schedule tracks steps and time separately. Time advances in fractional
     increments of 1 / (# of stages), meaning that 1 step = 1 unit of time.
 
@@ -158,16 +896,671 @@ class StagedActivation(BaseScheduler):
         self.shuffle = shuffle
         self.shuffle_between_stages = shuffle_between_stages
         self.stage_time = 1 / len(self.stage_list)
+        self._stage_methods = {}
+        self._own_stages = {}
+
+    def clear_stage_cache(self):
+        """ Look the stage methods up again, for the classes and agents whose
+        stages have changed since they were cached.
+
+        """
+        self._stage_methods = {}
+        self._own_stages = {}
+        for agent in self._agents:
+            self._cache_own_stages(agent)
 
     def step(self):
         """ Executes all the stages for all agents. """
+        self._begin_step()
+        agents = self._active_entries()
+        active = self._active
+        own_stages = self._own_stages
+        profiler = self.profiler
         if self.shuffle:
-            random.shuffle(self.agents)
+            agents = self._shuffled(agents)
         for stage in self.stage_list:
-            for agent in self.agents:
-                getattr(agent, stage)()  # Run stage
+            calls = {}
+            batches = OrderedDict()
+            for agent in agents:
+                if agent in active:
+                    if own_stages and stage in own_stages.get(agent, ()):
+                        # Set on the agent itself.
+                        method = own_stages[agent][stage]
+                        if profiler is not None:
+                            profiler.call(stage, type(agent), method)
+                        else:
+                            method()
+                        continue
+                    cls = type(agent)
+                    try:
+                        call = calls[cls]
+                    except KeyError:
+                        call = calls[cls] = self._stage_call(stage, cls,
+                                                             batches)
+                    call(agent)  # Run stage
+            methods = self._stage_methods.get(stage, {})
+            for cls, batch in batches.items():
+                batch = [agent for agent in batch if agent in active]
+                if profiler is not None:
+                    profiler.call(stage, cls, methods[cls][0], batch)
+                else:
+                    methods[cls][0](batch)
             if self.shuffle_between_stages:
-                random.shuffle(self.agents)
+                agents = self._shuffled(agents)
             self.time += self.stage_time
+        self._end_step()
 
         self.steps += 1
+
+    def _stage_call(self, stage, cls, batches):
+        """ Return the function to call with each agent of a class to run a
+        stage: the stage method, or, for a classmethod, one which adds the
+        agent to the class's batch.
+
+        """
+        methods = self._stage_methods.setdefault(stage, {})
+        if cls not in methods:
+            methods[cls] = _stage_method(cls, stage)
+        method, batched = methods[cls]
+        if batched:
+            return batches.setdefault(cls, []).append
+        if self.profiler is not None:
+            return partial(self.profiler.call, stage, cls, method)
+        return method
+
+    def _insert(self, agent, *args, **kwargs):
+        """ Add an agent to the schedule right away, caching the stages set
+        on the agent itself; the stages of its class are looked up again, in
+        case they changed since they were cached.
+
+        """
+        if agent not in self._agents:
+            self._stage_methods = {}
+            self._cache_own_stages(agent)
+        super()._insert(agent, *args, **kwargs)
+
+    def _discard(self, agent):
+        """ Remove an agent from the schedule right away, and its stages from
+        the cache.
+
+        """
+        self._own_stages.pop(agent, None)
+        super()._discard(agent)
+
+    def _cache_own_stages(self, agent):
+        """ Cache the stages set on an agent itself, if any. """
+        own = getattr(agent, "__dict__", None)
+        if own:
+            stages = {stage: own[stage] for stage in self.stage_list
+                      if stage in own}
+            if stages:
+                self._own_stages[agent] = stages
+
+
+def _stage_method(cls, stage):
+    """ Return a class's implementation of a stage, and whether it is a
+    classmethod taking a list of agents.
+
+    """
+    for klass in cls.__mro__:
+        if stage in klass.__dict__:
+            attribute = klass.__dict__[stage]
+            if isinstance(attribute, classmethod):
+                return getattr(cls, stage), True
+            if isinstance(attribute, FunctionType):
+                return attribute, False
+            break
+    # Not a plain method of the class; look it up on each agent.
+    return methodcaller(stage), False
+
+
+class SpatialActivation(BaseScheduler):
+    """ A scheduler which activates agents in the order of a space-filling
+    curve through their positions, so that consecutive agents tend to touch
+    neighboring cells (and neighboring memory).
+
+    Agents are sorted every step, since they may have moved. Optionally, the
+    space can be divided into square tiles which are visited in curve order,
+    with the agents in each tile shuffled; this keeps most of the locality
+    while avoiding a fixed activation order.
+
+    Assumes that all agents have a step() method and a pos attribute, which
+    may be None for agents outside the space; those are activated last, in
+    the order they were added.
+
+    """
+    def __init__(self, model, curve="morton", cell_size=1, tile_size=None):
+        """ Create an empty Spatial Activation schedule.
+
+        Args:
+            model: Model object associated with the schedule.
+            curve: Space-filling curve to order agents by; either "morton"
+                   (Z-order, any number of dimensions) or "hilbert" (two
+                   dimensions only, with better locality).
+            cell_size: Positions are divided by this and rounded down before
+                       ordering, e.g. to bucket continuous positions.
+            tile_size: If given, order agents by the tile of tile_size cells
+                       across that they fall in, shuffling them within each
+                       tile every step.
+
+        """
+        super().__init__(model)
+        if curve not in ("morton", "hilbert"):
+            raise ValueError("Unknown curve: {}".format(curve))
+        self.curve = curve
+        self.cell_size = cell_size
+        self.tile_size = tile_size
+
+    def step(self):
+        """ Executes the step of all agents, one at a time, in space-filling
+        curve order.
+
+        """
+        self._begin_step()
+        agents = self.spatial_order()
+        self._activate(agents)
+        self._end_step()
+        self.steps += 1
+        self.time += 1
+
+    def spatial_order(self):
+        """ Return the awake agents, sorted along the space-filling curve.
+        """
+        agents = self._active_entries()
+        placed = [agent for agent in agents if agent.pos is not None]
+        unplaced = [agent for agent in agents if agent.pos is None]
+        if not placed:
+            return unplaced
+        coords = np.floor(np.array([agent.pos for agent in placed],
+                                   dtype=float) / self.cell_size)
+        coords = (coords - coords.min(axis=0)).astype(np.int64)
+        if self.tile_size is None:
+            order = np.argsort(self._curve_keys(coords), kind="stable")
+        else:
+            tiles = self._curve_keys(coords // self.tile_size)
+            rng = getattr(self.model, "rng", None)
+            if rng is None:
+                jitter = [self._random().random() for _ in placed]
+            else:
+                jitter = rng.random(len(placed))
+            order = np.lexsort((jitter, tiles))
+        return [placed[i] for i in order] + unplaced
+
+    def _curve_keys(self, coords):
+        """ Return the curve index of each row of non-negative coordinates. """
+        if self.curve == "hilbert":
+            return hilbert_keys(coords)
+        return morton_keys(coords)
+
+
+class DiscreteEventScheduler(BaseScheduler):
+    """ A scheduler which activates agents at the times they are scheduled
+    for, rather than activating every agent every step.
+
+    Events are kept in a heap of (time, priority, sequence number, target)
+    entries, where the target is either an agent in the schedule, whose step()
+    method is called, or any other callable, which is called without
+    arguments. Events at the same time run in order of priority (lowest
+    first), then in the order they were scheduled. The clock jumps straight
+    from one event time to the next, so the cost of a run depends on the
+    number of events rather than on the number of agents.
+
+    Cancelled events, and events for agents removed from the schedule, are
+    left in the heap and skipped when they come up. Adding and removing
+    agents takes effect immediately, even while events are running. Agents
+    are only activated by their events, so putting them to sleep has no
+    effect. Removed agents are not pooled (see Model.enable_pool()).
+
+    """
+    def __init__(self, model):
+        """ Create an empty Discrete Event schedule.
+
+        Args:
+            model: Model object associated with the schedule.
+
+        """
+        super().__init__(model)
+        self._queue = []
+        self._sequence = 0
+        self._cancelled = 0
+
+    def schedule_at(self, time, target, priority=0):
+        """ Schedule an event at a given time.
+
+        Args:
+            time: When the event should happen; not before the current time.
+            target: An agent in the schedule, to be stepped, or a callable.
+            priority: Events at the same time run lowest priority first.
+
+        Returns:
+            A handle which can be passed to cancel().
+
+        """
+        if time < self.time:
+            raise ValueError("Cannot schedule an event in the past.")
+        event = [time, priority, self._sequence, target]
+        self._sequence += 1
+        heapq.heappush(self._queue, event)
+        return event
+
+    def schedule_in(self, delay, target, priority=0):
+        """ Schedule an event a given amount of time from now.
+
+        Args:
+            delay: How long from the current time the event should happen.
+            target: An agent in the schedule, to be stepped, or a callable.
+            priority: Events at the same time run lowest priority first.
+
+        Returns:
+            A handle which can be passed to cancel().
+
+        """
+        return self.schedule_at(self.time + delay, target, priority)
+
+    def cancel(self, event):
+        """ Cancel a scheduled event, given the handle returned for it.
+        Cancelling an event which has already run does nothing.
+
+        """
+        if event[3] is not None:
+            event[3] = None
+            self._cancelled += 1
+            # Rebuild the heap once it is mostly made of cancelled events.
+            if self._cancelled > len(self._queue) // 2:
+                self._queue = [e for e in self._queue if e[3] is not None]
+                heapq.heapify(self._queue)
+                self._cancelled = 0
+
+    def get_state(self):
+        """ Return the state of the schedule, including pending events.
+        Callable targets must be picklable to be saved.
+
+        """
+        state = super().get_state()
+        state["events"] = [list(event) for event in self._queue
+                           if event[3] is not None]
+        state["sequence"] = self._sequence
+        return state
+
+    def set_state(self, state):
+        """ Restore a state returned by get_state(). """
+        super().set_state(state)
+        self._queue = [list(event) for event in state["events"]]
+        heapq.heapify(self._queue)
+        self._sequence = state["sequence"]
+        self._cancelled = 0
+
+    def _release(self, agent):
+        """ Keep removed agents out of the model's pools: their events left
+        in the heap would activate them once reused.
+
+        """
+
+    def next_time(self):
+        """ Return the time of the next pending event, or None. """
+        queue = self._queue
+        while queue and queue[0][3] is None:
+            heapq.heappop(queue)
+            self._cancelled -= 1
+        return queue[0][0] if queue else None
+
+    def step(self):
+        """ Advance the clock to the next event time, and run all the events
+        scheduled for it (including any scheduled for it while running).
+
+        """
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin_step()
+        time = self.next_time()
+        if time is not None:
+            self.time = time
+            queue = self._queue
+            while queue and queue[0][0] == time:
+                event = heapq.heappop(queue)
+                target, event[3] = event[3], None  # Cancelling it is a no-op.
+                if target is None:
+                    self._cancelled -= 1
+                elif target in self._agents:
+                    if profiler is None:
+                        target.step()
+                    else:
+                        profiler.call("step", type(target), target.step)
+                elif callable(target):
+                    if profiler is None:
+                        target()
+                    else:
+                        profiler.call("event", type(target), target)
+        if profiler is not None:
+            profiler.end_step(self.steps)
+        self._emit("step_end", self.model)
+        self.steps += 1
+
+    def run_until(self, time):
+        """ Run all the events up to and including the given time, then set
+        the clock to it.
+
+        """
+        next_time = self.next_time()
+        while next_time is not None and next_time <= time:
+            self.step()
+            next_time = self.next_time()
+        self.time = max(self.time, time)
+
+
+class PoissonActivation(BaseScheduler):
+    """ A scheduler which activates agents at random times, each agent
+    following its own Poisson process.
+
+    Each agent has an activation rate, the mean number of times it is
+    activated per step; with the default rate of 1, each agent is activated
+    *on average* once per step, in no fixed order. Activations are drawn from
+    the combined process of all the agents: the time to the next one is
+    exponentially distributed, and the agent is picked with probability
+    proportional to its rate. The rates live in a Fenwick tree, so each pick
+    and each change of rate takes O(log N) time even when rates differ.
+
+    Agents added during a step can be activated during the rest of it, and
+    removed agents stop being activated straight away. To stop activating an
+    agent for a while, set its rate to 0; putting it to sleep has no effect.
+
+    """
+    def __init__(self, model, default_rate=1):
+        """ Create an empty Poisson Activation schedule.
+
+        Args:
+            model: Model object associated with the schedule.
+            default_rate: Rate for agents added without one.
+
+        """
+        super().__init__(model)
+        self.default_rate = default_rate
+        self._slots = {}
+        self._slot_agents = []
+        self._rates = []
+        self._free = []
+        self._tree = _FenwickTree([])
+        self._updates = 0
+
+    def add(self, agent, rate=None):
+        """ Add an Agent object to the schedule.
+
+        Args:
+            agent: An Agent to be added to the schedule.
+            rate: Mean number of activations per step; defaults to the
+                  schedule's default_rate.
+
+        """
+        if agent in self._slots:
+            self.set_rate(agent, rate)
+            return
+        super().add(agent)
+        if self._free:
+            slot = self._free.pop()
+            self._slot_agents[slot] = agent
+        else:
+            slot = len(self._slot_agents)
+            self._slot_agents.append(agent)
+            self._rates.append(0)
+        self._slots[agent] = slot
+        self.set_rate(agent, rate)
+
+    def remove(self, agent):
+        """ Remove an agent from the schedule, if present. """
+        super().remove(agent)
+        if agent in self._slots:
+            self.set_rate(agent, 0)
+            slot = self._slots.pop(agent)
+            self._slot_agents[slot] = None
+            self._free.append(slot)
+
+    def get_state(self):
+        """ Return the state of the schedule, including the rates. """
+        state = super().get_state()
+        state["rates"] = {agent: self._rates[slot]
+                          for agent, slot in self._slots.items()}
+        return state
+
+    def set_state(self, state):
+        """ Restore a state returned by get_state(). """
+        super().set_state(state)
+        rates = state["rates"]
+        self._slot_agents = list(state["agents"])
+        self._slots = {agent: slot
+                       for slot, agent in enumerate(self._slot_agents)}
+        self._rates = [rates[agent] for agent in self._slot_agents]
+        self._free = []
+        self._tree = _FenwickTree(self._rates)
+        self._updates = 0
+
+    def get_rate(self, agent):
+        """ Return the activation rate of an agent in the schedule. """
+        return self._rates[self._slots[agent]]
+
+    def set_rate(self, agent, rate):
+        """ Change the activation rate of an agent in the schedule.
+
+        Args:
+            agent: An agent in the schedule.
+            rate: Mean number of activations per step; defaults to the
+                  schedule's default_rate.
+
+        """
+        if rate is None:
+            rate = self.default_rate
+        if rate < 0:
+            raise ValueError("Activation rates cannot be negative.")
+        slot = self._slots[agent]
+        delta = rate - self._rates[slot]
+        self._rates[slot] = rate
+        if slot >= len(self._tree) or self._updates > len(self._tree):
+            # Rebuild to grow the tree, and to keep rounding errors bounded.
+            self._tree = _FenwickTree(self._rates)
+            self._updates = 0
+        elif delta:
+            self._tree.add(slot, delta)
+            self._updates += 1
+
+    def step(self):
+        """ Run all the activations falling within one unit of time. """
+        rand = self._random()
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.begin_step()
+        elapsed = 0
+        while True:
+            total = self._tree.total()
+            if total <= 0:
+                break
+            elapsed += rand.expovariate(total)
+            if elapsed >= 1:
+                break
+            slot = self._tree.find(rand.random() * total)
+            # Rounding errors may land on an empty slot; just draw again.
+            if slot < len(self._rates) and self._rates[slot] > 0:
+                agent = self._slot_agents[slot]
+                if profiler is None:
+                    agent.step()
+                else:
+                    profiler.call("step", type(agent), agent.step)
+        if profiler is not None:
+            profiler.end_step(self.steps)
+        self._emit("step_end", self.model)
+        self.steps += 1
+        self.time += 1
+
+
+class _FenwickTree:
+    """ Binary indexed tree of non-negative weights, supporting point updates,
+    prefix sums and weighted sampling in O(log N) time.
+
+    """
+    def __init__(self, weights):
+        """ Build a tree over the given weights, with room to spare. """
+        size = 16
+        while size < len(weights):
+            size *= 2
+        tree = [0] + list(weights) + [0] * (size - len(weights))
+        for i in range(1, size + 1):
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def add(self, index, delta):
+        """ Add delta to the weight at a (0-based) index. """
+        tree = self._tree
+        i = index + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def total(self):
+        """ Return the sum of all the weights. """
+        return self.prefix_sum(len(self))
+
+    def prefix_sum(self, count):
+        """ Return the sum of the first count weights. """
+        tree = self._tree
+        result = 0
+        while count > 0:
+            result += tree[count]
+            count -= count & -count
+        return result
+
+    def find(self, value):
+        """ Return the smallest index whose inclusive prefix sum exceeds
+        value, i.e. sample an index when value is uniform in [0, total).
+
+        """
+        tree = self._tree
+        size = len(self)
+        index = 0
+        bit = 1 << (size.bit_length() - 1)
+        while bit:
+            nxt = index + bit
+            if nxt <= size and tree[nxt] <= value:
+                index = nxt
+                value -= tree[nxt]
+            bit >>= 1
+        return index
+
+
+class _TimerWheel:
+    """ Hierarchical timer wheel of items due at integer times (steps).
+
+    The wheel has several levels of `size` slots each (size must be a power
+    of two). Level 0 holds items due in the current block of `size` steps,
+    one slot per step; level 1 holds items due in the current block of
+    size ** 2 steps, one slot per block of size steps; and so on. When the
+    clock enters a new block, the matching slot of the level above is
+    emptied into the level below. Adding an item and collecting the items
+    due at a step thus take (amortized) constant time, however far ahead the
+    items are due. Items due beyond the top level wait in an overflow list,
+    which is swept once per turn of the top level.
+
+    """
+    def __init__(self, size=64, levels=4, start=0):
+        if size < 2 or size & (size - 1):
+            raise ValueError("The wheel size must be a power of two.")
+        self.size = size
+        self._bits = size.bit_length() - 1
+        self._levels = [[[] for _ in range(size)] for _ in range(levels)]
+        self._overflow = []
+        self._now = start
+
+    def add(self, item, due):
+        """ Add an item which is due at a given step. Items due in the past
+        are treated as due at the next step collected.
+
+        """
+        time = max(due, self._now)
+        bits = self._bits
+        for level, slots in enumerate(self._levels):
+            shift = bits * (level + 1)
+            if time >> shift == self._now >> shift:
+                slots[(time >> (shift - bits)) & (self.size - 1)].append(
+                    (item, due))
+                return
+        self._overflow.append((item, due))
+
+    def pop_due(self, now):
+        """ Remove and return the (item, due) pairs due at steps up to now.
+        """
+        due = []
+        level0 = self._levels[0]
+        mask = self.size - 1
+        while self._now <= now:
+            slot = self._now & mask
+            if slot == 0 and self._now:
+                self._cascade(1)
+            due.extend(level0[slot])
+            level0[slot] = []
+            self._now += 1
+        return due
+
+    def _cascade(self, level):
+        """ Move the items of the current slot of a level to the levels below,
+        at the start of a block of that level.
+
+        """
+        if level == len(self._levels):
+            waiting, self._overflow = self._overflow, []
+        else:
+            slot = (self._now >> (self._bits * level)) & (self.size - 1)
+            if slot == 0:
+                self._cascade(level + 1)
+            waiting = self._levels[level][slot]
+            self._levels[level][slot] = []
+        for item, due in waiting:
+            self.add(item, due)
+
+
+def morton_keys(coords):
+    """ Return the Morton (Z-order) index of each row of coordinates.
+
+    Args:
+        coords: Array of non-negative integer coordinates, with one row per
+                point and one column per dimension.
+
+    """
+    coords = np.asarray(coords, dtype=np.int64)
+    n_points, ndim = coords.shape
+    keys = np.zeros(n_points, dtype=np.int64)
+    bits = max(int(coords.max()).bit_length(), 1) if n_points else 1
+    for bit in range(min(bits, 62 // ndim)):
+        for axis in range(ndim):
+            keys |= ((coords[:, axis] >> bit) & 1) << (bit * ndim + axis)
+    return keys
+
+
+def hilbert_keys(coords):
+    """ Return the Hilbert curve index of each row of 2D coordinates.
+
+    Args:
+        coords: Array of non-negative integer coordinates, with one row per
+                point and two columns.
+
+    """
+    coords = np.asarray(coords, dtype=np.int64)
+    if coords.ndim != 2 or coords.shape[1] != 2:
+        raise ValueError("Hilbert ordering needs two-dimensional positions.")
+    x = coords[:, 0].copy()
+    y = coords[:, 1].copy()
+    n = 1 << max(int(coords.max()).bit_length(), 1) if len(coords) else 2
+    keys = np.zeros(len(coords), dtype=np.int64)
+    s = n // 2
+    while s > 0:
+        rx = (x & s) > 0
+        ry = (y & s) > 0
+        keys += s * s * ((3 * rx) ^ ry)
+        # Rotate the quadrant so the curve continues from its entry point.
+        flip = ~ry & rx
+        x = np.where(flip, n - 1 - x, x)
+        y = np.where(flip, n - 1 - y, y)
+        x, y = np.where(~ry, y, x), np.where(~ry, x, y)
+        s //= 2
+    return keys
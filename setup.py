@@ -7,7 +7,7 @@ from codecs import open
 
 requires = [
     'tornado',
-    'numpy',
+    'numpy>=1.17',
     'pandas',
 ]
 
@@ -0,0 +1,188 @@
+'''
+Test the agent base classes.
+'''
+import weakref
+from unittest import TestCase
+
+from mesa import Model, Agent
+from mesa.agent import SlottedAgent
+from mesa.datacollection import DataCollector
+from mesa.space import MultiGrid
+from mesa.time import RandomActivation, DiscreteEventScheduler
+
+
+class Grazer(SlottedAgent):
+    '''
+    Slotted agent which eats whenever it steps.
+    '''
+    _fields = (("energy", 5.0), ("moore", True), "name")
+    hunger = 2
+
+    def step(self):
+        self.energy -= self.hunger
+        self.model.grid.move_agent(self, (self.pos[0] + 1, self.pos[1]))
+
+
+class Calf(Grazer):
+    '''
+    Slotted subclass, which overrides a default and adds a field.
+    '''
+    _fields = (("energy", 1.0), ("mother", None))
+
+
+class Stray(Grazer):
+    '''
+    Subclass which declares nothing.
+    '''
+
+
+class TestSlottedAgent(TestCase):
+    '''
+    Test declaring the fields of slotted agents.
+    '''
+
+    def test_fields(self):
+        '''
+        Test that annotated fields become slots with their defaults.
+        '''
+        calf = Calf(1, None)
+        assert Grazer.__slots__ == ("energy", "moore", "name")
+        assert Calf.__slots__ == ("mother",)
+        assert Stray.__slots__ == ()
+        assert calf.energy == 1.0 and calf.moore and calf.mother is None
+        assert calf.pos is None and calf.hunger == 2
+        with self.assertRaises(AttributeError):
+            calf.name
+        for agent in (calf, Stray(2, None)):
+            assert not hasattr(agent, "__dict__")
+            with self.assertRaises(AttributeError):
+                agent.weight = 10
+        assert weakref.ref(calf)() is calf
+
+    def test_annotations(self):
+        '''
+        Test declaring fields as annotated class attributes.
+        '''
+        # Built without annotation syntax, which Python 3.5 lacks.
+        cls = type(SlottedAgent)("Annotated", (Grazer,), {
+            "__annotations__": {"weight": "float", "energy": "float",
+                                "herd": "typing.ClassVar[int]"},
+            "_fields": ("tag",), "weight": 2.0, "energy": 3.0, "herd": 4})
+        agent = cls(1, None)
+        assert cls.__slots__ == ("tag", "weight")
+        assert (agent.weight, agent.energy, agent.herd) == (2.0, 3.0, 4)
+        assert not hasattr(agent, "tag") and not hasattr(cls, "_fields")
+
+    def test_model(self):
+        '''
+        Test slotted agents in a schedule, a grid and a data collector.
+        '''
+        model = Model(seed=2)
+        model.grid = MultiGrid(5, 5, torus=True)
+        model.schedule = RandomActivation(model)
+        collector = DataCollector(agent_reporters={"energy": "energy"})
+        for i in range(3):
+            agent = Calf(i, model) if i else Grazer(i, model)
+            model.grid.place_agent(agent, (0, i))
+            model.schedule.add(agent)
+        model.schedule.step()
+        collector.collect(model)
+        assert sorted(collector.agent_vars["energy"][0]) == [
+            (0, 3.0), (1, -1.0), (2, -1.0)]
+        assert [agent.pos for agent in model.grid.get_cell_list_contents(
+            [(1, 0), (1, 1), (1, 2)])] == [(1, 0), (1, 1), (1, 2)]
+        report = model.memory_report()
+        assert list(report.index) == ["Calf", "Grazer"]
+        assert list(report["Agents"]) == [2, 1]
+
+
+class Mayfly(Agent):
+    '''
+    Agent which dies on its first step, leaving an egg.
+    '''
+
+    def __init__(self, unique_id, model, generation=0):
+        super().__init__(unique_id, model)
+        self.generation = generation
+        self.eggs = []
+
+    def step(self):
+        self.eggs.append(self.generation)
+        self.model.grid.remove_agent(self)
+        self.model.schedule.remove(self)
+        egg = self.model.create_agent(Mayfly, self.model.next_id(),
+                                      self.model, self.generation + 1)
+        self.model.grid.place_agent(egg, (0, 0))
+        self.model.schedule.add(egg)
+
+
+class TestAgentPool(TestCase):
+    '''
+    Test recycling removed agents.
+    '''
+
+    def setUp(self):
+        self.model = Model()
+        self.model.grid = MultiGrid(3, 3, torus=False)
+        self.model.schedule = RandomActivation(self.model)
+        self.pool = self.model.enable_pool(Mayfly)
+        for _ in range(3):
+            agent = Mayfly(self.model.next_id(), self.model)
+            self.model.grid.place_agent(agent, (1, 1))
+            self.model.schedule.add(agent)
+
+    def test_recycle(self):
+        '''
+        Test that agents removed during a step are reused from the next one,
+        reset and registered under their new ids.
+        '''
+        first = set(self.model.schedule.agents)
+        self.model.schedule.step()
+        assert (self.pool.hits, self.pool.misses, len(self.pool)) == (0, 3, 3)
+        self.model.schedule.step()
+        assert (self.pool.hits, self.pool.misses, len(self.pool)) == (3, 3, 3)
+        agents = self.model.schedule.agents
+        assert set(agents) == first
+        assert [agent.eggs for agent in agents] == [[], [], []]
+        assert sorted(agent.generation for agent in agents) == [2, 2, 2]
+        assert sorted(agent.unique_id for agent in agents) == [6, 7, 8]
+        for agent in agents:
+            assert self.model.get_agent(agent.unique_id) is agent
+        with self.assertRaises(KeyError):
+            self.model.get_agent(0)
+
+    def test_not_pooled(self):
+        '''
+        Test that agents still placed, added back or of other classes are
+        not pooled, and that the pool size is limited.
+        '''
+        agents = self.model.schedule.agents
+        self.model.schedule.remove(agents[0])
+        self.model.grid.remove_agent(agents[1])
+        self.model.schedule.remove(agents[1])
+        assert len(self.pool) == 1
+        stray = Stray(10, self.model)
+        self.model.schedule.add(stray)
+        self.model.schedule.remove(stray)
+        assert len(self.pool) == 1
+        self.pool.max_size = 1
+        self.model.grid.remove_agent(agents[2])
+        self.model.schedule.remove(agents[2])
+        assert len(self.pool) == 1 and self.pool.released == 1
+        slotted = self.model.enable_pool(Calf)
+        calf = self.model.create_agent(Calf, 11, self.model)
+        calf.name = "calf"
+        self.model.schedule.add(calf)
+        self.model.schedule.remove(calf)
+        assert self.model.create_agent(Calf, 12, self.model) is calf
+        assert slotted.hits == 1 and calf.unique_id == 12
+        with self.assertRaises(AttributeError):
+            calf.name
+
+        events = Model()
+        events.enable_pool(Calf)
+        events.schedule = DiscreteEventScheduler(events)
+        calf = Calf(0, events)
+        events.schedule.add(calf)
+        events.schedule.remove(calf)
+        assert len(events.enable_pool(Calf)) == 0
@@ -0,0 +1,186 @@
+'''
+Test the AgentSet and its use in schedulers and data collection.
+'''
+from unittest import TestCase
+
+import numpy as np
+
+from mesa import Model, Agent
+from mesa.agentset import AgentSet, AgentView
+from mesa.datacollection import DataCollector
+from mesa.time import (BaseScheduler, RandomActivation,
+                       SimultaneousActivation, SpatialActivation)
+
+
+class Counters(AgentSet):
+    '''
+    Agent set whose agents each add their step size to a counter.
+    '''
+    columns = {"count": int, "size": int, "pos": (int, 2)}
+
+    def step(self):
+        self["count"] += self["size"]
+
+
+class Staged(AgentSet):
+    '''
+    Agent set which stages its update until advance().
+    '''
+    columns = {"value": float}
+
+    def step(self):
+        self._next = self["value"] * 2
+
+    def advance(self):
+        self["value"] = self._next
+
+
+class CountingAgent(Agent):
+    '''
+    Ordinary agent counting its own steps.
+    '''
+    def __init__(self, unique_id, model):
+        super().__init__(unique_id, model)
+        self.count = 0
+
+    def step(self):
+        self.count += 1
+
+
+class TestAgentSet(TestCase):
+    '''
+    Test adding, removing and viewing the agents of an AgentSet.
+    '''
+
+    def setUp(self):
+        self.agentset = Counters(None, capacity=2)
+        for i in range(5):
+            self.agentset.add(size=i, pos=(i, -i))
+
+    def test_add(self):
+        '''
+        Test that columns grow as agents are added, and ids are assigned.
+        '''
+        assert len(self.agentset) == 5
+        assert self.agentset.ids == [0, 1, 2, 3, 4]
+        assert list(self.agentset["size"]) == [0, 1, 2, 3, 4]
+        view = self.agentset.add(unique_id="a", count=7)
+        assert view.count == 7 and view.size == 0
+        with self.assertRaises(ValueError):
+            self.agentset.add(unique_id="a")
+        with self.assertRaises(AttributeError):
+            self.agentset.add(energy=1)
+
+    def test_views(self):
+        '''
+        Test reading and writing rows through views.
+        '''
+        view = self.agentset.get(3)
+        assert isinstance(view, AgentView)
+        assert view.size == 3
+        assert view.pos == (3, -3)
+        view.size = 10
+        assert self.agentset["size"][3] == 10
+        assert view == self.agentset.get(3)
+        assert len({view, self.agentset.get(3)}) == 1
+        with self.assertRaises(AttributeError):
+            view.energy = 1
+        with self.assertRaises(KeyError):
+            self.agentset.get(99)
+
+    def test_remove(self):
+        '''
+        Test that removal keeps the rows packed and views valid.
+        '''
+        view = self.agentset.get(4)
+        self.agentset.remove(1)
+        assert len(self.agentset) == 4
+        assert 1 not in self.agentset
+        assert sorted(self.agentset.ids) == [0, 2, 3, 4]
+        assert view.size == 4 and view.pos == (4, -4)
+        self.agentset.remove(view)
+        assert sorted(self.agentset.ids) == [0, 2, 3]
+        assert getattr(view, "size", None) is None
+        assert not hasattr(view, "pos") and view.unique_id == 4
+        with self.assertRaises(AttributeError):
+            view.size = 1
+
+    def test_remove_where(self):
+        '''
+        Test removing agents by a mask over the rows.
+        '''
+        self.agentset.remove_where(self.agentset["size"] % 2 == 1)
+        assert self.agentset.ids == [0, 2, 4]
+        assert self.agentset.get(4).size == 4
+        assert self.agentset.values("pos") == [(0, 0), (2, -2), (4, -4)]
+
+
+class TestAgentSetScheduling(TestCase):
+    '''
+    Test that schedulers step an AgentSet as a whole.
+    '''
+
+    def setUp(self):
+        self.model = Model(seed=1)
+        self.agentset = Counters(self.model)
+        for i in range(4):
+            self.agentset.add(unique_id=10 + i, size=i + 1)
+        self.agent = CountingAgent(0, self.model)
+        self.agent.pos = None
+
+    def test_base_scheduler(self):
+        '''
+        Test that the set steps once per step, alongside ordinary agents.
+        '''
+        for schedule_type in (BaseScheduler, RandomActivation,
+                              SpatialActivation):
+            schedule = schedule_type(self.model)
+            schedule.add(self.agent)
+            schedule.add(self.agentset)
+            schedule.step()
+            assert schedule.get_agent_count() == 5
+            agents = schedule.agents
+            assert len(agents) == 5
+            assert set(a.unique_id for a in agents) == {0, 10, 11, 12, 13}
+        assert list(self.agentset["count"]) == [3, 6, 9, 12]
+        assert self.agent.count == 3
+
+    def test_simultaneous(self):
+        '''
+        Test that advance() is called on the set after step().
+        '''
+        staged = Staged(self.model)
+        staged.add(value=1.5)
+        schedule = SimultaneousActivation(self.model)
+        schedule.add(staged)
+        schedule.step()
+        schedule.step()
+        assert staged.values("value") == [6.0]
+
+    def test_remove(self):
+        '''
+        Test removing a set from the schedule.
+        '''
+        schedule = BaseScheduler(self.model)
+        schedule.add(self.agentset)
+        schedule.remove(self.agentset)
+        schedule.step()
+        assert schedule.get_agent_count() == 0
+        assert not np.any(self.agentset["count"])
+
+    def test_datacollector(self):
+        '''
+        Test collecting attributes by name from agents and agent sets.
+        '''
+        schedule = BaseScheduler(self.model)
+        schedule.add(self.agent)
+        schedule.add(self.agentset)
+        self.model.schedule = schedule
+        collector = DataCollector(agent_reporters={
+            "count": "count", "double": lambda a: 2 * a.count})
+        schedule.step()
+        collector.collect(self.model)
+        expected = [(0, 1), (10, 1), (11, 2), (12, 3), (13, 4)]
+        assert collector.agent_vars["count"] == [expected]
+        assert collector.agent_vars["double"] == [
+            [(i, 2 * v) for i, v in expected]]
@@ -0,0 +1,247 @@
+'''
+Test saving and restoring model snapshots.
+'''
+import io
+import os
+import random
+import tempfile
+from unittest import TestCase
+
+import numpy as np
+
+from mesa import Model, Agent
+from mesa.agent import SlottedAgent
+from mesa.agentset import AgentSet
+from mesa.datacollection import DataCollector
+from mesa.space import MultiGrid, ContinuousSpace
+from mesa.time import (RandomActivation, DiscreteEventScheduler,
+                       PoissonActivation)
+
+
+class Walker(Agent):
+    '''
+    Agent which walks around a torus, following its leader if it has one.
+    '''
+
+    def __init__(self, unique_id, model, leader=None):
+        super().__init__(unique_id, model)
+        self.leader = leader
+        self.energy = 10.0
+        self.alive = True
+        self.name = "walker {}".format(unique_id)
+        self.history = []
+
+    def step(self):
+        if self.leader is not None and self.leader.pos is not None:
+            target = self.leader.pos
+        else:
+            target = (self.pos[0] + self.model.rng.integers(-1, 2),
+                      self.pos[1] + self.random.choice([-1, 0, 1]))
+        grid = self.model.grid
+        target = (grid.torus_adj(target[0], grid.width),
+                  grid.torus_adj(target[1], grid.height))
+        self.model.grid.move_agent(self, target)
+        self.energy -= random.random()
+        self.history.append(target)
+
+
+class Sprinter(Walker):
+    '''
+    Walker with an attribute of its own.
+    '''
+
+    def __init__(self, unique_id, model):
+        super().__init__(unique_id, model)
+        self.speed = 2
+
+
+class Stone(SlottedAgent):
+    '''
+    Slotted agent which only sits in its cell.
+    '''
+    _fields = (("energy", 1.0), ("owner", None), "label")
+
+
+class Counters(AgentSet):
+    '''
+    Agent set adding random amounts to a column.
+    '''
+    columns = {"total": float, "energy": float}
+
+    def step(self):
+        self["total"] += self.model.rng.random(len(self))
+
+
+class WalkerModel(Model):
+    '''
+    Model with walkers, an agent set and a data collector.
+    '''
+
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.grid = MultiGrid(10, 10, torus=True)
+        self.schedule = RandomActivation(self)
+        self.datacollector = DataCollector(
+            {"energy": lambda m: sum(a.energy for a in m.schedule.agents
+                                     if isinstance(a, Walker))},
+            {"energy": "energy"})
+        self.callback = lambda: None  # Cannot be pickled; left as it is.
+        self.counter = 0
+        leader = None
+        for i in range(20):
+            walker = Sprinter(i, self) if i % 5 == 0 else Walker(i, self)
+            if i % 3 == 1:
+                walker.leader = leader
+            leader = walker
+            self.grid.place_agent(walker, (i % 10, i // 10))
+            self.schedule.add(walker, period=2 if i == 7 else None)
+        for i in range(3):
+            stone = Stone(50 + i, self)
+            stone.owner = self.schedule.agents[i]
+            if i:
+                stone.label = "stone"
+            self.grid.place_agent(stone, (i, 5))
+            self.schedule.add(stone, period=3)
+        self.counters = Counters(self)
+        for i in range(3):
+            self.counters.add(100 + i)
+        self.schedule.add(self.counters)
+
+    def step(self):
+        self.schedule.step()
+        self.datacollector.collect(self)
+        self.counter += 1
+
+
+def describe(model):
+    '''
+    Return a comparable summary of a WalkerModel's state.
+    '''
+    walkers = sorted(model.schedule.agents, key=lambda a: a.unique_id)
+    return ([(a.unique_id, getattr(a, "pos", None), a.energy,
+              getattr(a, "history", None)) for a in walkers],
+            model.counters.values("total"),
+            model.datacollector.model_vars["energy"],
+            model.counter, model.schedule.steps)
+
+
+class TestSnapshot(TestCase):
+    '''
+    Test that a restored model continues exactly like the original.
+    '''
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "model.npz")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        '''
+        Test restoring agents, references, schedule, space and generators.
+        '''
+        model = WalkerModel(seed=1)
+        model.schedule.agents[3].sleep_until_woken()
+        for _ in range(5):
+            model.step()
+        model.snapshot(self.path)
+        for _ in range(5):
+            model.step()
+
+        restored = WalkerModel(seed=2)
+        restored.restore(self.path)
+        walkers = {a.unique_id: a for a in restored.schedule.agents}
+        assert walkers[4].leader is walkers[3]
+        assert walkers[5].speed == 2
+        assert restored.grid.position_of(4) == walkers[4].pos
+        assert restored.counters.model is restored
+        assert restored.schedule.is_asleep(walkers[3])
+        assert restored.schedule.get_agent_count() == 26
+        assert restored.get_agent(4) is walkers[4]
+        stones = [walkers[50 + i] for i in range(3)]
+        assert stones[1].owner is walkers[1] and stones[1].pos == (1, 5)
+        assert stones[2].label == "stone" and not hasattr(stones[0], "label")
+        for _ in range(5):
+            restored.step()
+        assert describe(restored) == describe(model)
+
+    def test_file_object(self):
+        '''
+        Test writing to a file object, with compression.
+        '''
+        model = WalkerModel(seed=1)
+        model.step()
+        f = io.BytesIO()
+        model.snapshot(f, compress=True)
+        f.seek(0)
+        restored = WalkerModel(seed=3).restore(f)
+        assert describe(restored) == describe(model)
+        assert restored.counter == 1
+
+    def test_columns(self):
+        '''
+        Test that simple attributes are stored as arrays.
+        '''
+        model = WalkerModel(seed=1)
+        model.snapshot(self.path)
+        with np.load(self.path) as data:
+            assert data["column.0.energy"].dtype == np.float64
+            assert data["column.0.pos"].shape == (4, 2)
+            assert data["column.1.leader"].dtype == np.int64
+            assert data["column.0.name"].dtype.kind == "U"
+
+    def test_other_schedules(self):
+        '''
+        Test restoring events and activation rates.
+        '''
+        model = Model(seed=4)
+        model.log = []
+        model.schedule = DiscreteEventScheduler(model)
+        agents = [Walker(i, model) for i in range(3)]
+        for agent in agents:
+            agent.step = agent.name.upper
+            model.schedule.add(agent)
+        model.schedule.schedule_at(3, agents[1])
+        model.schedule.schedule_at(2, agents[2], priority=1)
+        model.snapshot(self.path)
+        restored = Model(seed=5)
+        restored.schedule = DiscreteEventScheduler(restored)
+        restored.restore(self.path)
+        assert restored.schedule.next_time() == 2
+        assert [event[3].unique_id for event in restored.schedule._queue] == [
+            2, 1]
+
+        model.schedule = PoissonActivation(model)
+        for i, agent in enumerate(agents):
+            model.schedule.add(agent, rate=i)
+        model.snapshot(self.path)
+        restored = Model()
+        restored.schedule = PoissonActivation(restored)
+        restored.restore(self.path)
+        rates = {agent.unique_id: restored.schedule.get_rate(agent)
+                 for agent in restored.schedule.agents}
+        assert rates == {0: 0, 1: 1, 2: 2}
+
+    def test_continuous_space(self):
+        '''
+        Test restoring agents in a continuous space.
+        '''
+        model = Model(seed=4)
+        model.space = ContinuousSpace(10, 10, torus=True)
+        model.schedule = RandomActivation(model)
+        for i in range(4):
+            agent = Agent(i, model)
+            model.space.place_agent(agent, (i + 0.5, 2 * i + 0.25))
+            model.schedule.add(agent)
+        model.snapshot(self.path)
+        restored = Model()
+        with self.assertRaises(ValueError):
+            restored.restore(self.path)
+        restored.space = ContinuousSpace(10, 10, torus=True)
+        restored.schedule = RandomActivation(restored)
+        restored.restore(self.path)
+        agents = restored.schedule.agents
+        assert [agent.pos for agent in agents] == [
+            (i + 0.5, 2 * i + 0.25) for i in range(4)]
+        assert restored.space.get_neighbors((1.5, 2.25), 0.1) == [agents[1]]
@@ -1,9 +1,12 @@
 '''
 Test the Grid objects.
 '''
+from collections import OrderedDict
 import unittest
 
-from mesa.space import Grid, SingleGrid, MultiGrid
+import numpy as np
+
+from mesa.space import Grid, SingleGrid, MultiGrid, Grid3D, MultiGrid3D
 
 # Initial agent positions for testing
 #
@@ -147,6 +150,98 @@ class TestBaseGrid(unittest.TestCase):
         assert second[1] == 0
         assert second[2] == 1
 
+    def test_reverse_index(self):
+        '''
+        Test looking agents up, and removing them, through the grid's index.
+        '''
+        agent = self.agents[0]
+        assert self.grid.contains(agent)
+        assert self.grid.position_of(agent.unique_id) == agent.pos
+
+        ids = [a.unique_id for a in self.agents]
+        positions = self.grid.positions_of(ids)
+        assert positions.shape == (len(self.agents), 2)
+        assert [tuple(p) for p in positions] == [a.pos for a in self.agents]
+
+        # The index is used even if the pos attribute is tampered with.
+        x, y = agent.pos
+        agent.pos = None
+        self.grid.remove_agent(agent)
+        assert self.grid.is_cell_empty((x, y))
+        assert not self.grid.contains(agent)
+        with self.assertRaises(KeyError):
+            self.grid.position_of(agent.unique_id)
+        with self.assertRaises(KeyError):
+            self.grid.positions_of(ids)
+
+        all_ids, all_positions = self.grid.get_all_positions()
+        assert list(all_ids) == ids[1:]
+        assert [tuple(p) for p in all_positions] == [
+            a.pos for a in self.agents[1:]]
+
+    def test_reverse_index_sparse_ids(self):
+        '''
+        Test the reverse index with unique_ids that are not dense integers.
+        '''
+        a = MockAgent((3, 4), None)
+        self.grid.place_agent(a, (2, 4))
+        assert self.grid.position_of((3, 4)) == (2, 4)
+        assert self.grid.position_of(1) == self.agents[0].pos
+        positions = self.grid.positions_of([(3, 4), 1])
+        assert [tuple(p) for p in positions] == [(2, 4),
+                                                 self.agents[0].pos]
+        self.grid.move_agent(a, (2, 3))
+        all_ids, all_positions = self.grid.get_all_positions()
+        assert len(all_ids) == len(self.agents) + 1
+        assert all_ids[-1] == (3, 4)
+        assert tuple(all_positions[-1]) == (2, 3)
+
+    def test_flat_index(self):
+        '''
+        Test converting between positions and flat indices.
+        '''
+        assert self.grid.pos_to_index((0, 1)) == 1
+        assert self.grid.pos_to_index((2, 3)) == 13
+        idx = self.grid.pos_to_index([a.pos for a in self.agents])
+        assert idx.dtype == np.int32
+        positions = self.grid.index_to_pos(idx)
+        assert positions.dtype == np.int32
+        assert [tuple(p) for p in positions] == [a.pos for a in self.agents]
+        assert tuple(self.grid.index_to_pos(13)) == (2, 3)
+
+        # Flat indices follow the order of coord_iter.
+        for i, (_, x, y) in enumerate(self.grid.coord_iter()):
+            assert self.grid.pos_to_index((x, y)) == i
+
+    def test_flat_neighbors(self):
+        '''
+        Test that flat neighborhoods match the tuple-based ones.
+        '''
+        for moore in (True, False):
+            for radius in (1, 2):
+                for _, x, y in self.grid.coord_iter():
+                    idx = self.grid.pos_to_index((x, y))
+                    expected = self.grid.get_neighborhood(
+                        (x, y), moore, radius=radius)
+                    found = self.grid.neighbors_idx(idx, moore,
+                                                    radius=radius)
+                    assert found.dtype == np.int32
+                    assert sorted(found.tolist()) == sorted(
+                        self.grid.pos_to_index(expected).tolist())
+
+                    contents = self.grid.contents_at(found)
+                    assert set(contents) == set(self.grid.get_neighbors(
+                        (x, y), moore, radius=radius))
+
+        # Batched lookups give one row per cell, padded with -1.
+        idx = np.arange(self.grid.width * self.grid.height, dtype=np.int32)
+        rows = self.grid.neighbors_idx(idx, moore=False)
+        assert rows.shape == (len(idx), 4)
+        for i, row in enumerate(rows):
+            valid = row[row >= 0]
+            assert sorted(valid.tolist()) == sorted(
+                self.grid.neighbors_idx(i, moore=False).tolist())
+
 
 class TestBaseGridTorus(TestBaseGrid):
     '''
@@ -242,6 +337,18 @@ class TestSingleGrid(unittest.TestCase):
         with self.assertRaises(Exception):
             self.move_to_empty(self.agents[0])
 
+    def test_reverse_index(self):
+        '''
+        Test that moving agents to empty cells keeps the index up to date.
+        '''
+        a = MockAgent(100, None)
+        self.grid.position_agent(a)
+        self.grid.move_to_empty(a)
+        assert self.grid.position_of(100) == a.pos
+        self.grid.remove_agent(a)
+        assert not self.grid.contains(a)
+        assert len(self.grid.empties) == 9
+
 
 # Number of agents at each position for testing
 # Initial agent positions for testing
@@ -291,6 +398,39 @@ class TestMultiGrid(unittest.TestCase):
             x, y = agent.pos
             assert agent in self.grid[x][y]
 
+    def test_cell_order(self):
+        '''
+        Ensure that a cell lists its agents in the order they were placed.
+        '''
+        placed = self.agents[4:9]
+        assert isinstance(self.grid[1][2], OrderedDict)
+        assert self.grid.get_cell_list_contents([(1, 2)]) == placed
+        self.grid.move_agent(placed[0], (0, 0))
+        self.grid.move_agent(placed[0], (1, 2))
+        assert self.grid.get_cell_list_contents([(1, 2)]) == (
+            placed[1:] + placed[:1])
+
+    def test_contents_at(self):
+        '''
+        Test retrieving MultiGrid contents by flat index.
+        '''
+        idx = self.grid.pos_to_index([(1, 2), (2, 3), (0, 0)])
+        assert len(self.grid.contents_at(idx)) == 8
+        assert len(self.grid.contents_at([-1, idx[0]])) == 5
+
+    def test_remove_agent(self):
+        '''
+        Test removing agents from a MultiGrid cell.
+        '''
+        for agent in self.agents[4:7]:
+            assert agent.pos == (1, 2)
+            self.grid.remove_agent(agent)
+            assert agent not in self.grid[1][2]
+            assert agent.pos is None
+        assert len(self.grid[1][2]) == 2
+        ids, positions = self.grid.get_all_positions()
+        assert len(ids) == len(positions) == len(self.agents) - 3
+
     def test_neighbors(self):
         '''
         Test the toroidal MultiGrid neighborhood methods.
@@ -317,3 +457,161 @@ class TestMultiGrid(unittest.TestCase):
 
         neighbors = self.grid.get_neighbors((1, 3), moore=False, radius=2)
         assert len(neighbors) == 11
+
+
+class TestGrid3D(unittest.TestCase):
+    '''
+    Testing a non-toroidal three-dimensional grid.
+    '''
+
+    torus = False
+
+    def setUp(self):
+        '''
+        Create a test grid with the 2D test layout in its bottom layer.
+        '''
+        self.grid = Grid3D(3, 5, 4, self.torus)
+        self.agents = []
+        counter = 0
+        for x in range(3):
+            for y in range(5):
+                if TEST_GRID[x][y] == 0:
+                    continue
+                counter += 1
+                a = MockAgent(counter, None)
+                self.agents.append(a)
+                self.grid.place_agent(a, (x, y, 0))
+
+    def test_agent_positions(self):
+        '''
+        Ensure that the agents are all placed properly.
+        '''
+        for agent in self.agents:
+            x, y, z = agent.pos
+            assert self.grid[x][y][z] == agent
+            assert agent in self.grid.get_cell_list_contents(agent.pos)
+        assert len([cell for cell in self.grid if cell is not None]) == 6
+
+    def test_move_agent(self):
+        '''
+        Move an agent up a layer.
+        '''
+        agent = self.agents[0]
+        x, y, _ = agent.pos
+        self.grid.move_agent(agent, (x, y, 3))
+        assert self.grid.is_cell_empty((x, y, 0))
+        assert self.grid[x][y][3] == agent
+
+    def test_neighbors(self):
+        '''
+        Test the neighborhood methods on the non-toroid.
+        '''
+        neighborhood = self.grid.get_neighborhood((1, 1, 1), moore=True)
+        assert len(neighborhood) == 26
+
+        neighborhood = self.grid.get_neighborhood((1, 1, 1), moore=False)
+        assert len(neighborhood) == 6
+
+        neighborhood = self.grid.get_neighborhood((0, 0, 0), moore=True,
+                                                  include_center=True)
+        assert len(neighborhood) == 8
+
+        neighbors = self.grid.get_neighbors((1, 2, 0), moore=True)
+        assert len(neighbors) == 4
+
+        neighbors = self.grid.get_neighbors((1, 2, 1), moore=False)
+        assert len(neighbors) == 1
+
+    def test_coord_iter(self):
+        ci = self.grid.coord_iter()
+        assert next(ci) == (None, 0, 0, 0)
+        assert next(ci) == (None, 0, 0, 1)
+
+
+class TestGrid3DTorus(TestGrid3D):
+    '''
+    Testing a toroidal three-dimensional grid.
+    '''
+
+    torus = True
+
+    def test_neighbors(self):
+        '''
+        Test the neighborhood methods on the toroid.
+        '''
+        neighborhood = self.grid.get_neighborhood((0, 0, 0), moore=True)
+        assert len(neighborhood) == 26
+
+        neighborhood = self.grid.get_neighborhood((0, 0, 0), moore=False)
+        assert len(neighborhood) == 6
+
+        # The bottom layer wraps around to the top one.
+        neighbors = self.grid.get_neighbors((1, 4, 3), moore=False)
+        assert len(neighbors) == 0
+
+        neighbors = self.grid.get_neighbors((0, 1, 3), moore=False)
+        assert len(neighbors) == 1
+
+
+class TestMultiGrid3D(unittest.TestCase):
+    '''
+    Testing a toroidal three-dimensional MultiGrid.
+    '''
+
+    def setUp(self):
+        '''
+        Create a test grid with the 2D test layout in its middle layer.
+        '''
+        self.grid = MultiGrid3D(3, 5, 3, True)
+        self.agents = []
+        counter = 0
+        for x in range(3):
+            for y in range(5):
+                for i in range(TEST_MULTIGRID[x][y]):
+                    counter += 1
+                    a = MockAgent(counter, None)
+                    self.agents.append(a)
+                    self.grid.place_agent(a, (x, y, 1))
+
+    def test_agent_positions(self):
+        '''
+        Ensure that the agents are all placed properly on the MultiGrid.
+        '''
+        for agent in self.agents:
+            x, y, z = agent.pos
+            assert agent in self.grid[x][y][z]
+
+    def test_neighbors(self):
+        '''
+        Test the toroidal MultiGrid neighborhood methods.
+        '''
+        neighbors = self.grid.get_neighbors((1, 1, 1), moore=False,
+                                            include_center=True)
+        assert len(neighbors) == 7
+
+        neighbors = self.grid.get_neighbors((1, 2, 0), moore=False)
+        assert len(neighbors) == 5
+
+        neighbors = self.grid.get_neighbors((1, 4, 0), moore=True)
+        assert len(neighbors) == 5
+
+    def test_flat_index(self):
+        '''
+        Test the flat index methods on a three-dimensional MultiGrid.
+        '''
+        idx = self.grid.pos_to_index((1, 2, 1))
+        assert idx == (1 * 5 + 2) * 3 + 1
+        assert tuple(self.grid.index_to_pos(idx)) == (1, 2, 1)
+        assert len(self.grid.contents_at([idx])) == 5
+
+        neighbors = self.grid.neighbors_idx(idx, moore=False)
+        assert sorted(neighbors.tolist()) == sorted(self.grid.pos_to_index(
+            self.grid.get_neighborhood((1, 2, 1), moore=False)).tolist())
+        assert len(self.grid.contents_at(neighbors)) == 1
+
+    def test_cell_list_contents(self):
+        '''
+        Test retrieving contents from a tuple of positions.
+        '''
+        contents = self.grid.get_cell_list_contents(((1, 2, 1), (2, 3, 1)))
+        assert len(contents) == 8
@@ -0,0 +1,372 @@
+'''
+Test the Model class.
+'''
+import random
+from unittest import TestCase
+
+from mesa import Model, Agent
+from mesa.agent import SlottedAgent
+from mesa.agentset import AgentSet
+from mesa.space import SingleGrid, MultiGrid
+from mesa.time import RandomActivation
+
+
+class Gambler(Agent):
+    '''
+    Agent which bets a random amount each step.
+    '''
+
+    def __init__(self, unique_id, model):
+        super().__init__(unique_id, model)
+        self.wealth = 10
+
+    def step(self):
+        self.wealth += (self.model.rng.integers(-2, 3) +
+                        self.random.randint(-1, 1))
+
+
+class Casino(Model):
+    '''
+    Model of a few gamblers, who can be taxed.
+    '''
+
+    def __init__(self, seed=None):
+        super().__init__(seed)
+        self.schedule = RandomActivation(self)
+        self.tax = 0
+        for i in range(5):
+            self.schedule.add(Gambler(i, self))
+
+    def step(self):
+        self.schedule.step()
+        for agent in self.schedule.agents:
+            agent.wealth -= self.tax
+
+
+def intervene(model, i):
+    '''
+    Continue a casino with a tax of i for a few steps.
+    '''
+    model.tax = i
+    for _ in range(5):
+        model.step()
+    return [agent.wealth for agent in model.schedule.agents]
+
+
+class TestFork(TestCase):
+    '''
+    Test running continuations of a model.
+    '''
+
+    def setUp(self):
+        self.model = Casino(seed=7)
+        for _ in range(3):
+            self.model.step()
+        self.wealth = [agent.wealth for agent in self.model.schedule.agents]
+
+    def test_fork(self):
+        '''
+        Test that continuations run from the model's state, independently.
+        '''
+        results = self.model.fork(4, intervene, processes=2)
+        assert len(results) == 4
+        assert [agent.wealth for agent in self.model.schedule.agents] == (
+            self.wealth)
+        assert self.model.tax == 0 and self.model.schedule.steps == 3
+        assert len(set(tuple(result) for result in results)) == 4
+
+    def test_reproducible(self):
+        '''
+        Test that forking a model in the same state gives the same results,
+        in forked processes or on copies.
+        '''
+        other = Casino(seed=7)
+        for _ in range(3):
+            other.step()
+        state = random.getstate()
+        copied = other.fork(3, intervene, processes=0)
+        assert random.getstate() == state
+        assert self.model.fork(3, intervene) == copied
+
+
+class TestRandom(TestCase):
+    '''
+    Test the model's own random number generators.
+    '''
+
+    def test_independent(self):
+        '''
+        Test that models with the same seed draw the same streams, even when
+        run side by side, without touching the random module.
+        '''
+        state = random.getstate()
+        first, second = Casino(seed=3), Casino(seed=3)
+        for _ in range(4):
+            first.step()
+            random.random()
+            second.step()
+        assert [agent.wealth for agent in first.schedule.agents] == (
+            [agent.wealth for agent in second.schedule.agents])
+        assert Model(seed="a").random.random() == (
+            Model(seed="a").random.random())
+        assert Model(seed=-1).rng.random() == Model(seed=-1).rng.random()
+        assert Model(seed=-1).rng.random() != Model(seed=1).rng.random()
+        random.setstate(state)
+        Model(seed=3)
+        assert random.getstate() == state
+
+    def test_spawn_seeds(self):
+        '''
+        Test that spawned seeds are deterministic and independent.
+        '''
+        first, second = Model(seed=5), Model(seed=5)
+        first.rng.random()
+        seeds = first.spawn_seeds(3)
+        assert first.rng.random() == second.rng.random(2)[1]
+        assert [seed.entropy for seed in seeds] == [5] * 3
+        assert [s.spawn_key for s in seeds] == (
+            [s.spawn_key for s in second.spawn_seeds(3)])
+        assert first.spawn_seeds(1)[0].spawn_key == (3,)
+        first.reseed(seeds[0])
+        second.reseed(second.spawn_seeds(2)[1])
+        values = first.rng.random(), first.random.random()
+        assert values != (second.rng.random(), second.random.random())
+
+    def test_grid(self):
+        '''
+        Test that random placement on a grid draws from the agent's model.
+        '''
+        positions = []
+        for _ in range(2):
+            model = Model(seed=11)
+            grid = SingleGrid(10, 10, torus=False)
+            agents = [Agent(i, model) for i in range(5)]
+            for agent in agents:
+                grid.position_agent(agent)
+            grid.move_to_empty(agents[0])
+            positions.append([agent.pos for agent in agents])
+            random.random()
+        assert positions[0] == positions[1]
+
+
+class Plain(Agent):
+    '''
+    Agent with a few attributes in its __dict__.
+    '''
+
+    def __init__(self, unique_id, model):
+        super().__init__(unique_id, model)
+        self.wealth = 1.5
+        self.alive = True
+        self.pos = None
+
+
+class Slotted(SlottedAgent):
+    '''
+    Agent with the same attributes in slots.
+    '''
+    _fields = (("wealth", 1.5), ("alive", True))
+
+
+class Rows(AgentSet):
+    '''
+    Agent set with one column.
+    '''
+    columns = {"wealth": float}
+
+
+class TestMemoryReport(TestCase):
+    '''
+    Test estimating the memory taken by agents.
+    '''
+
+    def test_report(self):
+        '''
+        Test that the report counts agents per class, and that slotted
+        agents take less memory.
+        '''
+        model = Model()
+        model.schedule = RandomActivation(model)
+        for i in range(100):
+            model.schedule.add(Plain(i, model))
+            model.schedule.add(Slotted(100 + i, model))
+        rows = Rows(model)
+        for i in range(50):
+            rows.add(200 + i)
+        model.schedule.add(rows)
+        report = model.memory_report()
+        assert list(report.columns) == ["Agents", "Bytes", "Bytes per agent"]
+        assert report.loc["Plain", "Agents"] == 100
+        assert report.loc["Rows", "Agents"] == 50
+        per_agent = report["Bytes per agent"]
+        assert per_agent["Rows"] < per_agent["Slotted"] < per_agent["Plain"]
+
+
+class TestRegistry(TestCase):
+    '''
+    Test looking up agents by unique_id.
+    '''
+
+    def test_register(self):
+        '''
+        Test that schedules and spaces register their agents.
+        '''
+        model = Model()
+        model.schedule = RandomActivation(model)
+        model.grid = SingleGrid(5, 5, torus=False)
+        first, second = Plain(model.next_id(), model), Plain(1, model)
+        model.schedule.add(first)
+        model.grid.place_agent(second, (0, 0))
+        assert model.get_agent(0) is first
+        assert model.get_agent(1) is second
+        with self.assertRaises(KeyError):
+            model.get_agent(2)
+        model.schedule.add(second)
+        with self.assertRaises(ValueError):
+            model.schedule.add(Plain(1, model))
+        rows = Rows(model)
+        rows.add()
+        model.schedule.add(rows)
+        assert [model.next_id() for _ in range(2)] == [3, 4]
+
+    def test_weak(self):
+        '''
+        Test that agents referenced nowhere else are dropped.
+        '''
+        model = Model()
+        model.schedule = RandomActivation(model)
+        agent = Slotted(model.next_id(), model)
+        model.schedule.add(agent)
+        model.schedule.remove(agent)
+        assert model.get_agent(0) is agent
+        del agent
+        with self.assertRaises(KeyError):
+            model.get_agent(0)
+        assert model.next_id() == 1
+        agent = Plain(0, model)
+        model.register_agent(agent)
+        model.deregister_agent(agent)
+        model.register_agent(Plain(0, model))
+
+
+class Hopper(Agent):
+    '''
+    Agent which hops right, and leaves once it has hopped twice.
+    '''
+
+    def step(self):
+        x, y = self.pos
+        self.model.grid.move_agent(self, (x + 1, y))
+        if x == 1:
+            self.model.schedule.remove(self)
+
+
+class TestEvents(TestCase):
+    '''
+    Test subscribing to the events of a model.
+    '''
+
+    def test_events(self):
+        '''
+        Test that schedules and spaces emit events, which keep a count up to
+        date.
+        '''
+        model = Model()
+        model.grid = MultiGrid(5, 5, torus=False)
+        model.schedule = RandomActivation(model)
+        log = []
+        count = [0]
+
+        @model.on_agent_added
+        def added(agent):
+            count[0] += 1
+
+        model.on_agent_removed(lambda agent: log.append(
+            ("removed", agent.unique_id, count[0])))
+        model.on_agent_removed(lambda agent: count.__setitem__(
+            0, count[0] - 1))
+        moved = model.on_agent_moved(lambda agent, old, new: log.append(
+            ("moved", agent.unique_id, old, new)))
+        model.on_step_end(lambda m: log.append(("end", m.schedule.steps)))
+        for i in range(3):
+            agent = Hopper(i, model)
+            model.grid.place_agent(agent, (i, i))
+            model.schedule.add(agent)
+        model.schedule.add(agent)
+        assert count == [3]
+        model.schedule.step()
+        assert count == [2]
+        assert sorted(log[:-1]) == [("moved", 0, (0, 0), (1, 0)),
+                                    ("moved", 1, (1, 1), (2, 1)),
+                                    ("moved", 2, (2, 2), (3, 2)),
+                                    ("removed", 1, 3)]
+        assert log[-1] == ("end", 0)
+
+        del log[:]
+        model.unsubscribe("agent_moved", moved)
+        model.unsubscribe("agent_added", added)
+        model.schedule.add(Hopper(3, model))
+        model.schedule.remove(agent)
+        model.emit("custom", 1)
+        assert log == [("removed", 2, 2)] and count == [1]
+        assert sorted(model._event_handlers) == ["agent_removed", "step_end"]
+
+    def test_pending(self):
+        '''
+        Test that agents added and removed within a step get both events.
+        '''
+        model = Model()
+        model.schedule = RandomActivation(model)
+        log = []
+        model.on_agent_added(lambda agent: log.append(("added", agent)))
+        model.on_agent_removed(lambda agent: log.append(("removed", agent)))
+        parent, child = Plain(0, model), Plain(1, model)
+
+        def step():
+            model.schedule.add(child)
+            model.schedule.add(child)
+            model.schedule.remove(child)
+            model.schedule.remove(child)
+        parent.step = step
+        model.schedule.add(parent)
+        del log[:]
+        model.schedule.step()
+        assert log == [("added", child), ("removed", child)]
+        assert model.schedule.agents == [parent]
+
+
+class TestRunModel(TestCase):
+    '''
+    Test running a model with limits.
+    '''
+
+    def test_limits(self):
+        '''
+        Test stopping after a number of steps, or at once when out of time.
+        '''
+        model = Casino(seed=1)
+        assert model.run_model(max_steps=4) == 4
+        assert model.running and model.schedule.steps == 4
+        assert model.run_model(max_steps=10, max_seconds=0) == 0
+        timings = []
+        model.run_model(max_steps=3, on_step=lambda m, seconds: timings.append(
+            (m.schedule.steps, seconds >= 0)))
+        assert timings == [(5, True), (6, True), (7, True)]
+        with self.assertRaises(ValueError):
+            model.run_model(check_every=0)
+
+    def test_stop(self):
+        '''
+        Test that the end condition is only checked every few steps, and
+        ends the run.
+        '''
+        model = Casino(seed=1)
+        checks = []
+
+        def stop(m):
+            checks.append(m.schedule.steps)
+            return m.schedule.steps >= 7
+
+        assert model.run_model(stop=stop, check_every=3) == 9
+        assert checks == [3, 6, 9] and not model.running
+        assert model.run_model(max_steps=5) == 0
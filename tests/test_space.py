@@ -1,11 +1,34 @@
+import itertools
+import random
 import unittest
 
-from mesa.space import ContinuousSpace
+from mesa.space import ContinuousSpace, ContinuousSpace3D
 from test_grid import MockAgent
 
 TEST_AGENTS = [(-20, -20), (-20, -20.05), (65, 18)]
 
 
+def brute_force_segment(agents, sizes, p0, p1, width):
+    '''
+    Find the agents within width of the shortest toroidal segment from p0 to
+    p1 by measuring every image of every agent.
+    '''
+    delta = [(b - a + size / 2) % size - size / 2
+             for a, b, size in zip(p0, p1, sizes)]
+    length_sq = sum(d ** 2 for d in delta)
+    found = set()
+    for agent in agents:
+        for shift in itertools.product((-1, 0, 1), repeat=len(sizes)):
+            point = [q + k * size - a for q, k, size, a
+                     in zip(agent.pos, shift, sizes, p0)]
+            t = sum(p * d for p, d in zip(point, delta)) / length_sq
+            t = min(max(t, 0), 1)
+            dist_sq = sum((p - t * d) ** 2 for p, d in zip(point, delta))
+            if dist_sq <= width ** 2:
+                found.add(agent.unique_id)
+    return found
+
+
 class TestSpaceToroidal(unittest.TestCase):
     '''
     Testing a toroidal continuous space.
@@ -54,6 +77,22 @@ class TestSpaceToroidal(unittest.TestCase):
         neighbors_3 = self.space.get_neighbors((-30, -30), 10)
         assert len(neighbors_3) == 1
 
+    def test_reverse_index(self):
+        '''
+        Test looking agents up, and removing them, through the space's index.
+        '''
+        positions = self.space.positions_of([2, 0])
+        assert positions.tolist() == [[65, 18], [-20, -20]]
+
+        a = self.agents[2]
+        self.space.move_agent(a, (75, 25))
+        assert self.space.position_of(2) == (-25, -25)
+        self.space.remove_agent(a)
+        assert not self.space.contains(a)
+        assert len(self.space.get_neighbors((-25, -25), 1)) == 0
+        ids, positions = self.space.get_all_positions()
+        assert list(ids) == [0, 1]
+
 
 class TestSpaceNonToroidal(unittest.TestCase):
     '''
@@ -100,3 +139,154 @@ class TestSpaceNonToroidal(unittest.TestCase):
 
         neighbors_3 = self.space.get_neighbors((-30, -30), 10)
         assert len(neighbors_3) == 0
+
+
+class TestSpaceSegmentQuery(unittest.TestCase):
+    '''
+    Testing segment queries on continuous spaces.
+    '''
+
+    def setUp(self):
+        '''
+        Create a toroidal and a non-toroidal test space.
+        '''
+        self.spaces = [ContinuousSpace(70, 20, torus, -30, -30, 100, 100)
+                       for torus in (True, False)]
+        for space in self.spaces:
+            for i, pos in enumerate(TEST_AGENTS):
+                space.place_agent(MockAgent(i, None), pos)
+
+    def test_segment_retrieval(self):
+        '''
+        Test retrieval of agents close to a segment.
+        '''
+        for space in self.spaces:
+            found = space.query_segment((-25, -25), (-15, -15), 1)
+            assert sorted(a.unique_id for a in found) == [0, 1]
+
+            found = space.query_segment((-25, -25), (-15, -15), 0.01)
+            assert [a.unique_id for a in found] == [0]
+
+            found = space.query_segment((60, 18), (69, 18), 4)
+            assert [a.unique_id for a in found] == [2]
+
+            found = space.query_segment((0, 0), (40, 10), 5)
+            assert len(found) == 0
+
+    def test_degenerate_segment(self):
+        '''
+        A zero-length segment behaves like a point query.
+        '''
+        for space in self.spaces:
+            found = space.query_segment((-20, -19), (-20, -19), 1)
+            assert sorted(a.unique_id for a in found) == [0]
+
+    def test_toroidal_segment(self):
+        '''
+        Test that segments wrap around the edges of a toroidal space.
+        '''
+        torus, flat = self.spaces
+        # The shortest path from x=65 to x=-25 crosses the seam on a torus,
+        # so it misses the agents at x=-20 there.
+        found = torus.query_segment((65, -20), (-25, -20), 1)
+        assert len(found) == 0
+        found = flat.query_segment((65, -20), (-25, -20), 1)
+        assert sorted(a.unique_id for a in found) == [0, 1]
+
+        found = torus.query_segment((-25, 18), (65, 18), 0.5)
+        assert [a.unique_id for a in found] == [2]
+        found = torus.query_segment((-25, 18), (-29, 18), 6.5)
+        assert [a.unique_id for a in found] == [2]
+        found = flat.query_segment((-25, 18), (-29, 18), 6.5)
+        assert len(found) == 0
+
+    def test_toroidal_segment_images(self):
+        '''
+        Test long, wide segments on a small torus against brute force.
+        '''
+        space = ContinuousSpace(10, 8, True)
+        agents = [MockAgent(0, None)]
+        space.place_agent(agents[0], (4.8533, 2.6188))
+        found = space.query_segment((9.5008, 4.3492), (4.4923, 0.3213),
+                                    2.9615)
+        assert [a.unique_id for a in found] == [0]
+
+        rng = random.Random(1)
+        for i in range(1, 50):
+            agents.append(MockAgent(i, None))
+            space.place_agent(agents[-1],
+                              (rng.uniform(0, 10), rng.uniform(0, 8)))
+        for _ in range(200):
+            p0 = (rng.uniform(0, 10), rng.uniform(0, 8))
+            p1 = (rng.uniform(0, 10), rng.uniform(0, 8))
+            width = rng.uniform(0, 4)
+            found = space.query_segment(p0, p1, width)
+            expected = brute_force_segment(agents, (10, 8), p0, p1, width)
+            assert set(a.unique_id for a in found) == expected
+
+
+class TestSpace3D(unittest.TestCase):
+    '''
+    Testing a three-dimensional continuous space.
+    '''
+
+    def setUp(self):
+        '''
+        Create toroidal and non-toroidal spaces with the test agents lifted
+        into the third dimension.
+        '''
+        self.spaces = [ContinuousSpace3D(70, 20, 10, torus, -30, -30, -10)
+                       for torus in (True, False)]
+        for space in self.spaces:
+            for i, (x, y) in enumerate(TEST_AGENTS):
+                space.place_agent(MockAgent(i, None), (x, y, -9))
+
+    def test_distance_calculations(self):
+        '''
+        Test distance calculations.
+        '''
+        torus, flat = self.spaces
+        assert torus.get_distance((-30, -30, -10), (70, 20, 10)) == 0
+        assert flat.get_distance((0, 0, 0), (3, 4, 0)) == 5
+        assert flat.get_distance((0, 0, -10), (0, 0, 10)) == 20
+
+    def test_neighborhood_retrieval(self):
+        '''
+        Test neighborhood retrieval.
+        '''
+        torus, flat = self.spaces
+        for space in self.spaces:
+            assert len(space.get_neighbors((-20, -20, -9), 1)) == 2
+            assert len(space.get_neighbors((-20, -20, 0), 1)) == 0
+        # The bottom of the space wraps around to the top.
+        assert len(torus.get_neighbors((-20, -20, 10), 2)) == 2
+        assert len(flat.get_neighbors((-20, -20, 10), 2)) == 0
+
+    def test_move_and_segment(self):
+        '''
+        Test moving agents and querying segments through the volume.
+        '''
+        for space in self.spaces:
+            agent = space.get_neighbors((65, 18, -9), 0.1)[0]
+            space.move_agent(agent, (65, 18, 5))
+            assert len(space.get_neighbors((65, 18, -9), 1)) == 0
+            found = space.query_segment((65, 18, 0), (65, 18, 9), 0.5)
+            assert found == [agent]
+
+    def test_toroidal_segment_images(self):
+        '''
+        Test long, wide segments on a small torus against brute force.
+        '''
+        space = ContinuousSpace3D(10, 8, 6, True)
+        agents = [MockAgent(i, None) for i in range(50)]
+        rng = random.Random(1)
+        for agent in agents:
+            space.place_agent(agent, (rng.uniform(0, 10), rng.uniform(0, 8),
+                                      rng.uniform(0, 6)))
+        for _ in range(200):
+            p0 = (rng.uniform(0, 10), rng.uniform(0, 8), rng.uniform(0, 6))
+            p1 = (rng.uniform(0, 10), rng.uniform(0, 8), rng.uniform(0, 6))
+            width = rng.uniform(0, 3)
+            found = space.query_segment(p0, p1, width)
+            expected = brute_force_segment(agents, (10, 8, 6), p0, p1, width)
+            assert set(a.unique_id for a in found) == expected
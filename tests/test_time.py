@@ -2,11 +2,19 @@
 Test the advanced schedulers.
 '''
 
-from unittest import TestCase
+import gc
+import multiprocessing
+import random
+from unittest import TestCase, skipUnless
 from unittest.mock import patch
 from mesa import Model, Agent
 from mesa.time import (BaseScheduler, StagedActivation, RandomActivation,
-                       SimultaneousActivation)
+                       RandomActivationByBreed,
+                       SimultaneousActivation, SpatialActivation,
+                       DiscreteEventScheduler, PoissonActivation,
+                       ParallelSimultaneousActivation, hilbert_keys,
+                       morton_keys)
+from mesa.time import _FenwickTree, _TimerWheel
 
 RANDOM = 'random'
 STAGED = 'staged'
@@ -111,6 +119,87 @@ class TestStagedActivation(TestCase):
         assert agent not in model.schedule.agents
 
 
+class BatchedAgent(MockAgent):
+    '''
+    Agent whose first stage is run for all agents of its class at once.
+    '''
+
+    @classmethod
+    def stage_one(cls, agents):
+        agents[0].model.log.append(
+            "+".join(agent.unique_id for agent in agents) + "_1")
+
+
+class TestStagedDispatch(TestCase):
+    '''
+    Test the stage method cache and batched stages.
+    '''
+
+    def test_batched_stage(self):
+        '''
+        A classmethod stage is called once, after the per-agent stages.
+        '''
+        model = MockModel(shuffle=False)
+        for name in ["C", "D"]:
+            model.schedule.add(BatchedAgent(name, model))
+        model.step()
+        assert model.log == ["A_1", "B_1", "C+D_1",
+                             "A_2", "B_2", "C_2", "D_2"]
+        assert set(model.schedule._stage_methods["stage_two"]) == {
+            MockAgent, BatchedAgent}
+
+    def test_instance_stage(self):
+        '''
+        Stages which are not methods of the class are looked up on agents.
+        '''
+        model = MockModel(shuffle=False)
+        agent = Agent("E", model)
+        agent.stage_one = lambda: model.log.append("E_1")
+        agent.stage_two = lambda: model.log.append("E_2")
+        model.schedule.add(agent)
+        model.step()
+        assert model.log == ["A_1", "B_1", "E_1", "A_2", "B_2", "E_2"]
+
+    def test_overrides(self):
+        '''
+        Stages set on an agent, or changed on its class, are used once the
+        stage cache is cleared.
+        '''
+        model = MockModel(shuffle=False)
+        agent = BatchedAgent("C", model)
+        model.schedule.add(agent)
+        model.step()
+        agent.stage_one = lambda: model.log.append("C_own")
+        model.schedule.agents[0].stage_two = lambda: model.log.append("A_own")
+        model.log = []
+        model.step()
+        assert model.log == ["A_1", "B_1", "C_1", "A_2", "B_2", "C_2"]
+        model.schedule.clear_stage_cache()
+        model.log = []
+        model.step()
+        assert model.log == ["A_1", "B_1", "C_own", "A_own", "B_2", "C_2"]
+
+        class Patched(MockAgent):
+            pass
+        model.schedule.add(Patched("D", model))
+        model.step()
+        Patched.stage_two = lambda self: model.log.append("D_patched")
+        model.log = []
+        model.step()
+        assert model.log[-1] == "D_2"
+        model.schedule.clear_stage_cache()
+        model.log = []
+        model.step()
+        assert model.log[-1] == "D_patched"
+
+        # Adding an agent looks the stages of the classes up again.
+        Patched.stage_two = lambda self: model.log.append("D_repatched")
+        model.schedule.add(MockAgent("E", model))
+        model.log = []
+        model.step()
+        assert "D_repatched" in model.log
+
+
 class TestRandomActivation(TestCase):
     '''
     Test the random activation.
@@ -147,6 +236,134 @@ class TestRandomActivation(TestCase):
             # one step for each of 2 agents
             assert mock_agent_step.call_count == 2
 
+    def test_random_activation_uses_model_rng(self):
+        '''
+        Test that the order comes from the model's generator, and that the
+        schedule's own order is left alone.
+        '''
+        def run(seed, activation=RandomActivation):
+            model = Model(seed=seed)
+            model.log = []
+            model.schedule = activation(model)
+            for i in range(10):
+                model.schedule.add(KillerAgent(str(i), model))
+            order = model.schedule.agents
+            for _ in range(3):
+                model.schedule.step()
+            assert model.schedule.agents == order
+            return model.log
+
+        assert run(7) == run(7)
+        assert run(7) != run(8)
+        assert run(7, StagedActivation) != run(7)
+        with patch('mesa.time.random.shuffle') as mock_shuffle:
+            run(7)
+            run(7, lambda model: StagedActivation(model, shuffle=True))
+            assert mock_shuffle.call_count == 0
+
+
+class TestRandomActivationByBreed(TestCase):
+    '''
+    Test the random activation by breed.
+    '''
+
+    def make_model(self, **kwargs):
+        model = Model(seed=3)
+        model.log = []
+        model.schedule = RandomActivationByBreed(model, **kwargs)
+        for i in range(3):
+            model.schedule.add(KillerAgent("k" + str(i), model))
+            model.schedule.add(BreederAgent("b" + str(i), model))
+        return model
+
+    def test_breed_order(self):
+        '''
+        Each breed runs in turn, in the configured order.
+        '''
+        model = self.make_model()
+        model.schedule.step()
+        assert [name[0] for name in model.log] == list("kkkbbb")
+        assert model.schedule.get_breed_count(KillerAgent) == 6
+
+        model = self.make_model(breed_order=[BreederAgent])
+        model.schedule.step()
+        assert [name[0] for name in model.log] == list("bbbkkk")
+
+        model = self.make_model(breed_order="random")
+        orders = set()
+        for _ in range(10):
+            model.log = []
+            model.schedule.step()
+            orders.add(model.log[0][0])
+        assert orders == {"k", "b"}
+
+    def test_breed_counts(self):
+        '''
+        Breed counts follow additions and removals, during steps too.
+        '''
+        model = self.make_model()
+        schedule = model.schedule
+        killers = list(schedule.agents_by_breed[KillerAgent])
+        killers[0].victim = killers[1]
+        killers[1].victim = killers[2]
+        schedule._begin_step()
+        killers[0].step()
+        assert schedule.get_breed_count(KillerAgent) == 2
+        assert schedule.get_breed_counts() == {KillerAgent: 2,
+                                               BreederAgent: 3}
+        schedule._end_step()
+        assert schedule.get_breed_count(KillerAgent) == 2
+        assert schedule.get_breed_count(Agent) == 0
+        schedule.remove(killers[0])
+        assert schedule.get_breed_count(KillerAgent) == 1
+        assert schedule.get_agent_count() == 4
+
+    def test_custom_breeds(self):
+        '''
+        Breeds can be defined by a function of the agent.
+        '''
+        model = self.make_model(breed_of=lambda agent: agent.unique_id[1])
+        model.schedule.step()
+        assert [name[1] for name in model.log] == list("001122")
+        # Including the new child of breeder b0.
+        assert model.schedule.get_breed_count("0") == 3
+        model.log = []
+        model.schedule.step(by_breed=False)
+        assert len(model.log) == 9
+
+    def test_sleeping_breeds(self):
+        '''
+        Only the awake agents of each breed run, in the same order as when
+        all the agents of the breed were checked.
+        '''
+        class Filtering(RandomActivationByBreed):
+            def step_breed(self, breed):
+                agents = [agent for agent in self.agents_by_breed[breed]
+                          if agent in self._active]
+                self._activate(self._shuffled(agents))
+
+        logs = []
+        for schedule_class in (RandomActivationByBreed, Filtering):
+            model = Model(seed=5)
+            model.log = []
+            model.schedule = schedule_class(model)
+            agents = []
+            for i in range(20):
+                agents.append(SleepyAgent("s" + str(i), model, i % 4 or None))
+                agents.append(PeriodicAgent("p" + str(i), model))
+            for agent in agents:
+                model.schedule.add(agent)
+            rng = random.Random(1)
+            for step in range(12):
+                model.schedule.step()
+                for agent in rng.sample(agents, 5):
+                    model.schedule.wake(agent)
+                model.schedule.sleep(rng.choice(agents))
+                if step == 6:
+                    model.schedule.remove(agents.pop())
+            logs.append(model.log)
+        assert logs[0] == logs[1]
+
 
 class TestSimultaneousActivation(TestCase):
     '''
@@ -165,3 +382,769 @@ class TestSimultaneousActivation(TestCase):
             # one step for each of 2 agents
             assert mock_agent_step.call_count == 2
             assert mock_agent_advance.call_count == 2
+
+
+class KillerAgent(Agent):
+    '''
+    Agent which removes another agent from the schedule when it steps.
+    '''
+
+    def __init__(self, unique_id, model, victim=None):
+        super().__init__(unique_id, model)
+        self.victim = victim
+
+    def step(self):
+        self.model.log.append(self.unique_id)
+        if self.victim is not None:
+            self.model.schedule.remove(self.victim)
+
+
+class TestBaseScheduler(TestCase):
+    '''
+    Test adding and removing agents.
+    '''
+
+    def test_add_remove_contains(self):
+        '''
+        Agents keep their insertion order, and are stored at most once.
+        '''
+        model = MockModel(activation="base")
+        a, b = model.schedule.agents
+        c = MockAgent("C", model)
+        model.schedule.add(c)
+        model.schedule.add(a)
+        assert model.schedule.agents == [a, b, c]
+        assert model.schedule.get_agent_count() == 3
+
+        model.schedule.remove(b)
+        model.schedule.remove(b)
+        assert not model.schedule.contains(b)
+        assert model.schedule.contains(c)
+        assert model.schedule.agents == [a, c]
+
+    def test_removed_agents_do_not_step(self):
+        '''
+        An agent removed during a step is not activated afterwards.
+        '''
+        for activation in ("base", RANDOM):
+            model = MockModel(activation=activation)
+            model.log = []
+            victim = KillerAgent("victim", model)
+            killer = KillerAgent("killer", model, victim)
+            model.schedule.add(killer)
+            model.schedule.add(victim)
+            model.step()
+            if model.log[0] == "killer":
+                assert "victim" not in model.log
+            assert not model.schedule.contains(victim)
+            assert model.schedule.get_agent_count() == 3
+
+
+class BreederAgent(Agent):
+    '''
+    Agent which adds a new agent to the schedule when it steps.
+    '''
+
+    def step(self):
+        self.model.log.append(self.unique_id)
+        child = KillerAgent(
+            "{}_child{}".format(self.unique_id, self.model.schedule.steps),
+            self.model)
+        self.model.schedule.add(child)
+
+
+class TestDeferredChanges(TestCase):
+    '''
+    Test adding and removing agents in the middle of a step.
+    '''
+
+    def make_model(self, activation):
+        model = MockModel(activation=activation)
+        model.log = []
+        for agent in model.schedule.agents:
+            model.schedule.remove(agent)
+        return model
+
+    def test_added_agents_wait_for_next_step(self):
+        '''
+        Agents added during a step are first activated in the next one.
+        '''
+        for activation in ("base", RANDOM):
+            model = self.make_model(activation)
+            model.schedule.add(BreederAgent("A", model))
+            model.step()
+            assert model.log == ["A"]
+            assert model.schedule.get_agent_count() == 2
+            model.log = []
+            model.step()
+            assert sorted(model.log) == ["A", "A_child0"]
+            assert model.schedule.get_agent_count() == 3
+
+    def test_removed_agents_are_compacted(self):
+        '''
+        Agents removed during a step are skipped, and dropped at its end.
+        '''
+        model = self.make_model("base")
+        victim = KillerAgent("victim", model)
+        killer = KillerAgent("killer", model, victim)
+        model.schedule.add(killer)
+        model.schedule.add(victim)
+
+        model.schedule._begin_step()
+        killer.step()
+        assert not model.schedule.contains(victim)
+        assert model.schedule.agents == [killer]
+        assert model.schedule.get_agent_count() == 1
+        model.schedule._end_step()
+        assert model.schedule.agents == [killer]
+
+    def test_remove_and_readd(self):
+        '''
+        Changes made during a step are applied in the order they were made.
+        '''
+        model = self.make_model("base")
+        a, b = KillerAgent("A", model), KillerAgent("B", model)
+        model.schedule.add(a)
+        model.schedule.add(b)
+        model.schedule._begin_step()
+        model.schedule.remove(a)
+        model.schedule.add(a)
+        c = KillerAgent("C", model)
+        model.schedule.add(c)
+        model.schedule.remove(c)
+        model.schedule._end_step()
+        assert model.schedule.agents == [b, a]
+
+
+class PlacedAgent(Agent):
+    '''
+    Agent with a position, which logs its activation.
+    '''
+
+    def __init__(self, unique_id, model, pos):
+        super().__init__(unique_id, model)
+        self.pos = pos
+
+    def step(self):
+        self.model.log.append(self.unique_id)
+
+
+class TestSpatialActivation(TestCase):
+    '''
+    Test the space-filling curve activation.
+    '''
+
+    positions = [(1, 1), None, (0, 1), (1, 0), (0, 0), (3, 2)]
+
+    def make_model(self, **kwargs):
+        model = Model()
+        model.log = []
+        model.schedule = SpatialActivation(model, **kwargs)
+        for i, pos in enumerate(self.positions):
+            model.schedule.add(PlacedAgent(i, model, pos))
+        return model
+
+    def test_curve_keys(self):
+        '''
+        Test the curve indices of the cells of a 2x2 square.
+        '''
+        square = [(0, 0), (1, 0), (0, 1), (1, 1)]
+        assert list(morton_keys(square)) == [0, 1, 2, 3]
+        assert list(hilbert_keys(square)) == [0, 3, 1, 2]
+        assert list(morton_keys([(1, 0, 1), (0, 1, 1)])) == [5, 6]
+        keys = hilbert_keys([(x, y) for x in range(8) for y in range(8)])
+        assert sorted(keys) == list(range(64))
+
+    def test_morton_order(self):
+        '''
+        Agents are activated in Z-order, with unplaced agents last.
+        '''
+        model = self.make_model()
+        model.schedule.step()
+        assert model.log == [4, 3, 2, 0, 5, 1]
+        assert model.schedule.steps == 1
+
+    def test_hilbert_order(self):
+        '''
+        Agents are activated along the Hilbert curve.
+        '''
+        model = self.make_model(curve="hilbert")
+        model.schedule.step()
+        assert model.log[:4] == [4, 3, 0, 2]
+
+    def test_tiles(self):
+        '''
+        Agents in the same tile are shuffled, but tiles keep their order.
+        '''
+        model = self.make_model(tile_size=2)
+        for _ in range(20):
+            model.log = []
+            model.schedule.step()
+            assert sorted(model.log[:4]) == [0, 2, 3, 4]
+            assert model.log[4:] == [5, 1]
+
+
+class TimedAgent(Agent):
+    '''
+    Agent which logs the time it is activated at, and reschedules itself.
+    '''
+
+    def __init__(self, unique_id, model, interval=None):
+        super().__init__(unique_id, model)
+        self.interval = interval
+
+    def step(self):
+        self.model.log.append((self.unique_id, self.model.schedule.time))
+        if self.interval is not None:
+            self.model.schedule.schedule_in(self.interval, self)
+
+
+class TestDiscreteEventScheduler(TestCase):
+    '''
+    Test the discrete event scheduler.
+    '''
+
+    def setUp(self):
+        self.model = Model()
+        self.model.log = []
+        self.schedule = DiscreteEventScheduler(self.model)
+        self.model.schedule = self.schedule
+
+    def test_event_order(self):
+        '''
+        Events run in time order, then by priority, then first come first.
+        '''
+        agents = [TimedAgent(i, self.model) for i in range(4)]
+        for agent in agents:
+            self.schedule.add(agent)
+        self.schedule.schedule_at(2.5, agents[0])
+        self.schedule.schedule_at(1, agents[1])
+        self.schedule.schedule_at(1, agents[2], priority=-1)
+        self.schedule.schedule_at(1, agents[3])
+        self.schedule.schedule_at(
+            1.5, lambda: self.model.log.append(("callback", 1.5)))
+
+        self.schedule.step()
+        assert self.schedule.time == 1
+        assert self.model.log == [(2, 1), (1, 1), (3, 1)]
+        self.schedule.run_until(10)
+        assert self.model.log[3:] == [("callback", 1.5), (0, 2.5)]
+        assert self.schedule.time == 10
+        assert self.schedule.steps == 3
+
+    def test_recurring_events(self):
+        '''
+        Agents rescheduling themselves are activated at regular intervals.
+        '''
+        fast, slow = TimedAgent("fast", self.model, 1), TimedAgent(
+            "slow", self.model, 4)
+        for agent in (fast, slow):
+            self.schedule.add(agent)
+            self.schedule.schedule_at(0, agent)
+        self.schedule.run_until(8)
+        assert [t for name, t in self.model.log if name == "slow"] == [0, 4, 8]
+        assert len([name for name, _ in self.model.log
+                    if name == "fast"]) == 9
+        assert self.schedule.next_time() == 9
+
+    def test_cancel_and_remove(self):
+        '''
+        Cancelled events and events of removed agents are skipped.
+        '''
+        a, b = TimedAgent("A", self.model), TimedAgent("B", self.model)
+        self.schedule.add(a)
+        self.schedule.add(b)
+        events = [self.schedule.schedule_at(t, a) for t in range(1, 6)]
+        self.schedule.schedule_at(3, b)
+        for event in events[:4]:
+            self.schedule.cancel(event)
+        self.schedule.remove(b)
+        self.schedule.run_until(10)
+        assert self.model.log == [("A", 5)]
+
+        with self.assertRaises(ValueError):
+            self.schedule.schedule_at(5, a)
+
+    def test_cancel_after_run(self):
+        '''
+        Cancelling events which have already run does nothing.
+        '''
+        a = TimedAgent("A", self.model)
+        self.schedule.add(a)
+        done = [self.schedule.schedule_at(1, a) for _ in range(3)]
+        pending = [self.schedule.schedule_at(2, a) for _ in range(4)]
+        self.schedule.step()
+        for event in done:
+            self.schedule.cancel(event)
+        assert self.schedule._cancelled == 0
+        assert len(self.schedule._queue) == 4
+        self.schedule.cancel(pending[0])
+        self.schedule.step()
+        assert self.model.log == [("A", 1)] * 3 + [("A", 2)] * 3
+        assert self.schedule._cancelled == 0 and not self.schedule._queue
+
+
+class SleepyAgent(Agent):
+    '''
+    Agent which logs its activations, then sleeps for a given time.
+    '''
+
+    def __init__(self, unique_id, model, nap=None):
+        super().__init__(unique_id, model)
+        self.nap = nap
+
+    def step(self):
+        self.model.log.append(self.unique_id)
+        if self.nap is not None:
+            self.sleep(self.model.schedule.steps + self.nap)
+
+
+class TestSleepingAgents(TestCase):
+    '''
+    Test putting agents to sleep and waking them up.
+    '''
+
+    def make_model(self, *naps):
+        model = MockModel(activation="base")
+        for agent in model.schedule.agents:
+            model.schedule.remove(agent)
+        for i, nap in enumerate(naps):
+            model.schedule.add(SleepyAgent(str(i), model, nap))
+        return model
+
+    def run_model(self, model, steps):
+        logs = []
+        for _ in range(steps):
+            model.log = []
+            model.step()
+            logs.append("".join(model.log))
+        return logs
+
+    def test_sleep_until(self):
+        '''
+        Agents sleeping until a step are activated again in that step.
+        '''
+        model = self.make_model(None, 2, 3)
+        assert self.run_model(model, 7) == ["012", "0", "01", "02", "01",
+                                            "0", "012"]
+        assert model.schedule.get_agent_count() == 3
+        assert len(model.schedule.agents) == 3
+
+    def test_long_sleep(self):
+        '''
+        Sleeping for longer than the timer wheel's span works.
+        '''
+        model = self.make_model(None, 600)
+        logs = self.run_model(model, 1202)
+        assert [step for step, log in enumerate(logs) if "1" in log] == [
+            0, 600, 1200]
+
+    def test_sleep_until_woken(self):
+        '''
+        Agents sleeping until woken keep their place in the order.
+        '''
+        model = self.make_model(None, None, None)
+        first, second, third = model.schedule.agents
+        first.sleep_until_woken()
+        second.sleep_until_woken()
+        assert model.schedule.is_asleep(first)
+        assert model.schedule.contains(first)
+        assert self.run_model(model, 1) == ["2"]
+        second.wake()
+        first.wake()
+        assert not model.schedule.is_asleep(first)
+        assert self.run_model(model, 1) == ["012"]
+
+    def test_woken_during_step(self):
+        '''
+        Agents woken during a step are activated from the next step on, and
+        stale timed wake-ups are ignored.
+        '''
+        model = self.make_model(None, 5)
+        waker = KillerAgent("w", model)
+        sleepy = model.schedule.agents[1]
+        waker.step = lambda: sleepy.wake()
+        model.schedule.add(waker)
+        assert self.run_model(model, 3) == ["01", "01", "01"]
+        sleepy.nap = None
+        sleepy.sleep_until_woken()
+        waker.step = lambda: None
+        assert self.run_model(model, 6) == ["0"] * 6
+
+    def test_wake_order(self):
+        '''
+        Agents woken in any order are activated in the order they were
+        added in.
+        '''
+        model = self.make_model(*[None] * 30)
+        agents = model.schedule.agents
+        rng = random.Random(5)
+        for _ in range(20):
+            for agent in rng.sample(agents, 10):
+                if model.schedule.is_asleep(agent):
+                    agent.wake()
+                else:
+                    agent.sleep_until_woken()
+            awake = [agent.unique_id for agent in agents
+                     if not model.schedule.is_asleep(agent)]
+            assert self.run_model(model, 1) == ["".join(awake)]
+
+    def test_removed_while_asleep(self):
+        '''
+        Removing a sleeping agent forgets it.
+        '''
+        model = self.make_model(None, 2)
+        sleepy = model.schedule.agents[1]
+        model.step()
+        model.schedule.remove(sleepy)
+        assert not model.schedule.is_asleep(sleepy)
+        assert self.run_model(model, 3) == ["0", "0", "0"]
+
+    def test_timer_wheel(self):
+        '''
+        Test that the timer wheel returns items at their due time.
+        '''
+        wheel = _TimerWheel(size=4)
+        wheel.add("a", 2)
+        wheel.add("b", 9)
+        wheel.add("c", 3)
+        assert wheel.pop_due(1) == []
+        assert wheel.pop_due(3) == [("a", 2), ("c", 3)]
+        assert wheel.pop_due(8) == []
+        wheel.add("d", 9)
+        assert wheel.pop_due(9) == [("b", 9), ("d", 9)]
+
+    def test_hierarchical_timer_wheel(self):
+        '''
+        Test the timer wheel against a plain dictionary, across its levels
+        and its overflow list.
+        '''
+        rng = random.Random(3)
+        wheel = _TimerWheel(size=4, levels=2)
+        expected = {}
+        for now in range(200):
+            for _ in range(rng.randrange(3)):
+                due = now + rng.choice([1, 2, 5, 17, 40, 90])
+                item = (now, due, rng.random())
+                wheel.add(item, due)
+                expected.setdefault(due, []).append(item)
+            popped = wheel.pop_due(now)
+            assert sorted(popped) == sorted(
+                (item, now) for item in expected.pop(now, []))
+
+
+class PeriodicAgent(Agent):
+    '''
+    Agent which acts every third step, logging the step number.
+    '''
+
+    activation_period = 3
+    activation_phase = 1
+
+    def step(self):
+        self.model.log.append((self.unique_id, self.model.schedule.steps))
+
+    def advance(self):
+        pass
+
+
+class TestPeriodicAgents(TestCase):
+    '''
+    Test agents with activation periods.
+    '''
+
+    def make_model(self, activation="base"):
+        model = MockModel(activation=activation)
+        for agent in model.schedule.agents:
+            model.schedule.remove(agent)
+        model.log = []
+        return model
+
+    def test_periods(self):
+        '''
+        Agents act only in the steps matching their period and phase.
+        '''
+        for activation in ("base", RANDOM, SIMULTANEOUS):
+            model = self.make_model(activation)
+            model.schedule.add(PeriodicAgent("a", model))
+            model.schedule.add(PeriodicAgent("b", model), period=1)
+            model.schedule.add(PeriodicAgent("c", model), period=4, phase=6)
+            for _ in range(8):
+                model.step()
+            steps = {}
+            for name, step in model.log:
+                steps.setdefault(name, []).append(step)
+            assert steps == {"a": [1, 4, 7], "b": list(range(8)),
+                             "c": [2, 6]}
+            assert model.schedule.get_agent_count() == 3
+
+    def test_order_and_changes(self):
+        '''
+        Periodic agents keep their place in the order, can be added during a
+        step, and can be put to sleep and woken.
+        '''
+        model = self.make_model()
+        a, b = PeriodicAgent("a", model), PeriodicAgent("b", model)
+        b.activation_period = 1
+        adder = SleepyAgent("adder", model)
+        adder.step = lambda: model.schedule.add(a)
+        model.schedule.add(adder, period=100, phase=1)
+        model.schedule.add(b)
+        for _ in range(5):
+            model.step()
+        assert model.log == [("b", 0), ("b", 1), ("b", 2), ("b", 3),
+                             ("b", 4), ("a", 4)]
+        model.log = []
+        a.sleep_until_woken()
+        model.step()
+        model.step()
+        a.wake()
+        model.step()
+        model.step()
+        assert model.log == [("b", 5), ("b", 6), ("b", 7), ("a", 7),
+                             ("b", 8)]
+
+    def test_bad_period(self):
+        model = self.make_model()
+        with self.assertRaises(ValueError):
+            model.schedule.add(PeriodicAgent("a", model), period=0)
+
+
+class TestProfiling(TestCase):
+    '''
+    Test profiling the activations of a schedule.
+    '''
+
+    def test_profile_steps(self):
+        '''
+        Activations are recorded per step and agent class.
+        '''
+        model = MockModel(activation="base")
+        model.schedule.add(KillerAgent("K", model))
+        summaries = []
+        profiler = model.schedule.enable_profiling(callback=summaries.append)
+        model.step()
+        model.step()
+        df = profiler.get_dataframe()
+        assert len(df) == 4
+        assert set(df.Class) == {"MockAgent", "KillerAgent"}
+        calls = df.groupby(["Stage", "Class"]).Calls.sum()
+        assert calls["step", "MockAgent"] == 4
+        assert calls["step", "KillerAgent"] == 2
+        assert (df.Time >= 0).all()
+        assert list(profiler.get_step_dataframe().index) == [0, 1]
+        assert [summary["Step"] for summary in summaries] == [0, 1]
+        assert summaries[0]["Classes"]["step", "KillerAgent"]["Calls"] == 1
+
+        assert model.schedule.disable_profiling() is profiler
+        model.step()
+        assert len(profiler.step_records) == 2
+
+    def test_profile_stages(self):
+        '''
+        Stages are recorded separately, with batched stages counted once.
+        '''
+        model = MockModel(shuffle=True)
+        model.schedule.add(BatchedAgent("C", model))
+        model.schedule.add(BatchedAgent("D", model))
+        profiler = model.schedule.enable_profiling(memory=True)
+        model.step()
+        profiler.stop()
+        df = profiler.get_dataframe().set_index(["Stage", "Class"])
+        assert df.Calls.to_dict() == {
+            ("stage_one", "MockAgent"): 2, ("stage_one", "BatchedAgent"): 1,
+            ("stage_two", "MockAgent"): 2, ("stage_two", "BatchedAgent"): 2}
+        assert {"C+D_1", "D+C_1"} & set(model.log)
+
+    def test_profile_events(self):
+        '''
+        Event and Poisson schedules record their activations too.
+        '''
+        model = Model(seed=3)
+        model.schedule = DiscreteEventScheduler(model)
+        agent = CountingAgent(0, model)
+        model.schedule.add(agent)
+        model.schedule.schedule_at(1, agent)
+        model.schedule.schedule_at(1, agent.step)
+        profiler = model.schedule.enable_profiling()
+        model.schedule.step()
+        df = profiler.get_dataframe().set_index(["Stage", "Class"])
+        assert df.Calls.to_dict() == {("step", "CountingAgent"): 1,
+                                      ("event", "method"): 1}
+        assert agent.activations == 2
+
+        model.schedule = PoissonActivation(model)
+        model.schedule.add(agent, rate=5)
+        profiler = model.schedule.enable_profiling()
+        for _ in range(3):
+            model.schedule.step()
+        calls = profiler.get_dataframe().Calls.sum()
+        assert len(profiler.step_records) == 3
+        assert calls == agent.activations - 2 > 0
+
+
+class CountingAgent(Agent):
+    '''
+    Agent which counts its activations.
+    '''
+
+    activations = 0
+
+    def step(self):
+        self.activations += 1
+
+
+class TestPoissonActivation(TestCase):
+    '''
+    Test the Poisson activation.
+    '''
+
+    def test_fenwick_tree(self):
+        '''
+        Test sums and sampling against a plain list of weights.
+        '''
+        weights = [random.choice([0, 0.5, 1, 3]) for _ in range(37)]
+        tree = _FenwickTree(weights)
+        for _ in range(50):
+            i = random.randrange(len(weights))
+            delta = random.choice([-weights[i], 2])
+            weights[i] += delta
+            tree.add(i, delta)
+        assert abs(tree.total() - sum(weights)) < 1e-9
+        for i in range(len(weights)):
+            assert abs(tree.prefix_sum(i) - sum(weights[:i])) < 1e-9
+        for _ in range(100):
+            value = random.random() * sum(weights)
+            index = tree.find(value)
+            assert sum(weights[:index]) <= value < sum(weights[:index + 1])
+
+    def test_rates(self):
+        '''
+        Agents are activated in proportion to their rates.
+        '''
+        random.seed(1)
+        model = Model()
+        model.schedule = PoissonActivation(model)
+        agents = [CountingAgent(i, model) for i in range(40)]
+        for i, agent in enumerate(agents):
+            model.schedule.add(agent, rate=3 if i % 2 else None)
+        for _ in range(100):
+            model.schedule.step()
+        slow = sum(a.activations for a in agents[::2]) / 2000
+        fast = sum(a.activations for a in agents[1::2]) / 2000
+        assert 0.9 < slow < 1.1
+        assert 2.7 < fast < 3.3
+        assert model.schedule.steps == model.schedule.time == 100
+
+    def test_change_rates_and_remove(self):
+        '''
+        Agents with no rate, or removed ones, are not activated.
+        '''
+        model = Model()
+        model.schedule = PoissonActivation(model, default_rate=2)
+        agents = [CountingAgent(i, model) for i in range(60)]
+        for agent in agents:
+            model.schedule.add(agent)
+        assert model.schedule.get_rate(agents[0]) == 2
+        model.schedule.set_rate(agents[0], 0)
+        model.schedule.remove(agents[1])
+        model.schedule.add(CountingAgent(60, model), rate=5)
+        with self.assertRaises(ValueError):
+            model.schedule.set_rate(agents[2], -1)
+        for _ in range(20):
+            model.schedule.step()
+        assert agents[0].activations == agents[1].activations == 0
+        assert model.schedule.get_agent_count() == 60
+
+
+class RingAgent(Agent):
+    '''
+    Agent on a ring, whose next value depends on its neighbors' values.
+    '''
+
+    def __init__(self, unique_id, model):
+        super().__init__(unique_id, model)
+        self.value = unique_id
+        self._next_value = None
+
+    def step(self):
+        ring = self.model.ring
+        left = ring[self.unique_id - 1]
+        right = ring[(self.unique_id + 1) % len(ring)]
+        noise = random.randrange(2)
+        self._next_value = (left.value + right.value + noise) % 97
+
+    def advance(self):
+        self.value = self._next_value
+
+
+class TestParallelSimultaneousActivation(TestCase):
+    '''
+    Test the parallel simultaneous activation against the serial one.
+    '''
+
+    def run_ring(self, scheduler_cls, **kwargs):
+        model = Model(seed=5)
+        model.schedule = scheduler_cls(model, **kwargs)
+        model.ring = [RingAgent(i, model) for i in range(50)]
+        for agent in model.ring:
+            model.schedule.add(agent)
+        for _ in range(5):
+            model.schedule.step()
+        return [agent.value for agent in model.ring]
+
+    def test_thread_backend(self):
+        '''
+        Threads give the same result as serial stepping, up to randomness.
+        '''
+        model = Model()
+        model.schedule = ParallelSimultaneousActivation(model, workers=3)
+        model.ring = [RingAgent(i, model) for i in range(50)]
+        for agent in model.ring:
+            model.schedule.add(agent)
+        expected = [(model.ring[i - 1].value +
+                     model.ring[(i + 1) % 50].value) % 97 for i in range(50)]
+        model.schedule.step()
+        model.schedule.close()
+        for agent, value in zip(model.ring, expected):
+            assert agent.value - value in (0, 1, -96)
+        assert model.schedule.steps == 1
+
+    def test_thread_shutdown(self):
+        '''
+        The thread pool is shut down by a with block, or when the schedule
+        is collected.
+        '''
+        model = Model()
+        model.ring = [RingAgent(i, model) for i in range(4)]
+        with ParallelSimultaneousActivation(model, workers=2) as schedule:
+            for agent in model.ring:
+                schedule.add(agent)
+            schedule.step()
+            executor = schedule._executor
+        assert schedule._executor is None and executor._shutdown
+
+        schedule = ParallelSimultaneousActivation(model, workers=2)
+        schedule.add(model.ring[0])
+        schedule.step()
+        executor = schedule._executor
+        del schedule
+        gc.collect()
+        assert executor._shutdown
+
+    @skipUnless("fork" in multiprocessing.get_all_start_methods(),
+                "needs os.fork()")
+    def test_process_backend(self):
+        '''
+        Forked processes copy the staged values back, reproducibly.
+        '''
+        first = self.run_ring(ParallelSimultaneousActivation, workers=2,
+                              backend="process", staged=["_next_value"])
+        second = self.run_ring(ParallelSimultaneousActivation, workers=2,
+                               backend="process", staged=["_next_value"])
+        assert first == second
+        assert first != list(range(50))
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            ParallelSimultaneousActivation(Model(), backend="gpu")